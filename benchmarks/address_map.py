@@ -0,0 +1,60 @@
+"""Measure how fast addresses are mapped to the words of the eForth system.
+
+Assembles the eForth system, draws random addresses from its image and looks
+them up once by one with bisect and once as one NumPy array.
+"""
+import argparse
+import os
+import pathlib
+import sys
+import time
+
+repository = pathlib.Path(__file__).parent.parent
+sys.path.append(str(repository))
+
+from fbuilder.address_map import AddressMap  # noqa: E402
+from fbuilder.app import Assembler  # noqa: E402
+import numpy as np  # noqa: E402
+
+
+class Options:
+    format = "bin"
+    optimize = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--lookups", type=int, default=10_000_000,
+                        help="amount of addresses to look up")
+    args = parser.parse_args()
+
+    os.chdir(repository)
+    assembler = Assembler(Options())
+    image = assembler.assemble_source(
+        pathlib.Path("eforth/eforth_system.fvs").read_text())
+    address_map = AddressMap.from_assembler(assembler)
+
+    generator = np.random.default_rng(1)
+    addresses = generator.integers(0, len(image), args.lookups,
+                                   dtype=np.uint32)
+
+    start = time.perf_counter()
+    words = address_map.lookup_array(addresses)
+    vectorized = time.perf_counter() - start
+
+    single_lookups = min(args.lookups, 1_000_000)
+    single_addresses = addresses[:single_lookups].tolist()
+    start = time.perf_counter()
+    for address in single_addresses:
+        address_map.lookup(address)
+    single = time.perf_counter() - start
+
+    print(f"{len(address_map)} words, {len(image)} bytes, "
+          f"{np.count_nonzero(words >= 0)} of {args.lookups} addresses "
+          f"in words")
+    print(f"array:  {args.lookups / vectorized / 1e6:8.1f} M lookups/s")
+    print(f"bisect: {single_lookups / single / 1e6:8.1f} M lookups/s")
+
+
+if __name__ == "__main__":
+    main()
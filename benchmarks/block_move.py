@@ -0,0 +1,89 @@
+"""Measure the throughput of CMOVE and FILL for blocks of different sizes.
+
+For every block size an image is built that repeats the word on a block of
+that size until the requested amount of bytes is moved, and the VM run is
+timed. The result includes the threading overhead of the calling loop, so
+small blocks show the cost per call and large blocks the raw copy speed.
+"""
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+repository = pathlib.Path(__file__).parent.parent
+sys.path.append(str(repository))
+
+from fbuilder.app import Assembler  # noqa: E402
+
+
+class Options:
+    format = "bin"
+    optimize = False
+
+
+OPERATIONS = {
+    "CMOVE": "doLIT 0x4000 doLIT 0x5000 doLIT {size} CMOVE",
+    "FILL": "doLIT 0x5000 doLIT {size} doLIT 0x20 FILL",
+}
+
+
+def benchmark_program(operation, size, repetitions):
+    return "\n".join([
+        'include "eforth/vm_core.fvs"',
+        'include "eforth/eforth_basics.fvs"',
+        "codeblock",
+        "start_word:",
+        "    dt :benchmark_cfa",
+        "end",
+        'include "eforth/eforth_core.fvs"',
+        "def word(colon) BENCHMARK",
+        f"    doLIT {repetitions - 1} >R",
+        "move_loop:",
+        "    " + OPERATIONS[operation].format(size=size),
+        "    next :move_loop",
+        "    BYE",
+        "end",
+    ]) + "\n"
+
+
+def run_image(vm, binary):
+    with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as image:
+        image.write(binary)
+    try:
+        start = time.perf_counter()
+        subprocess.run([str(vm), "-i", image.name],
+                       stdout=subprocess.DEVNULL, check=True)
+        return time.perf_counter() - start
+    finally:
+        os.remove(image.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-b", "--bytes", type=int, default=64 * 1024 * 1024,
+                        help="amount of bytes to move per block size")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+",
+                        default=[4, 64, 1024, 4096],
+                        help="block sizes in bytes")
+    parser.add_argument("--vm", type=pathlib.Path,
+                        default=repository / "build-debug" / "forth-vm-sim",
+                        help="path to the VM executable")
+    args = parser.parse_args()
+
+    os.chdir(repository)
+    for operation in OPERATIONS:
+        for size in args.sizes:
+            repetitions = max(args.bytes // size, 1)
+            binary = Assembler(Options()).assemble_source(
+                benchmark_program(operation, size, repetitions))
+            duration = run_image(args.vm, binary)
+            rate = repetitions * size / duration
+            print(f"{operation:<6} {size:>6} bytes: "
+                  f"{rate / 1e6:8.1f} MB/s ({repetitions} calls)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare the terminal and the headless console when printing lots of text.
+
+Builds an image that prints the requested amount of text either one character
+at a time through EMIT or in blocks through TYPE, and times the VM run from
+start-up to exit with the default console and with `--headless`. The output
+goes to a pipe, as it does in batch runs.
+"""
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+repository = pathlib.Path(__file__).parent.parent
+sys.path.append(str(repository))
+
+from fbuilder.app import Assembler  # noqa: E402
+
+
+class Options:
+    format = "bin"
+    optimize = False
+
+
+BLOCK_SIZE = 1024
+
+OPERATIONS = {
+    "EMIT": ("doLIT 0x5000 doLIT {size} doLIT 0x41 FILL "
+             "doLIT {count} >R emit_loop: doLIT 0x41 EMIT next :emit_loop"),
+    "TYPE": ("doLIT 0x5000 doLIT {size} doLIT 0x41 FILL "
+             "doLIT {count} >R type_loop: doLIT 0x5000 doLIT {size} TYPE "
+             "next :type_loop"),
+}
+
+
+def benchmark_program(operation, size):
+    count = size if operation == "EMIT" else max(size // BLOCK_SIZE, 1)
+    return "\n".join([
+        'include "eforth/vm_core.fvs"',
+        'include "eforth/eforth_basics.fvs"',
+        "codeblock",
+        "start_word:",
+        "    dt :benchmark_cfa",
+        "end",
+        'include "eforth/eforth_core.fvs"',
+        "def word(colon) BENCHMARK",
+        "    " + OPERATIONS[operation].format(size=BLOCK_SIZE,
+                                              count=count - 1),
+        "    BYE",
+        "end",
+    ]) + "\n"
+
+
+def run_image(vm, binary, options):
+    with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as image:
+        image.write(binary)
+    try:
+        start = time.perf_counter()
+        result = subprocess.run([str(vm), *options, "-i", image.name],
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, check=True)
+        return time.perf_counter() - start, len(result.stdout)
+    finally:
+        os.remove(image.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-b", "--bytes", type=int, default=1024 * 1024,
+                        help="amount of text to print")
+    parser.add_argument("--vm", type=pathlib.Path,
+                        default=repository / "build-debug" / "forth-vm-sim",
+                        help="path to the VM executable")
+    args = parser.parse_args()
+
+    os.chdir(repository)
+    for operation in OPERATIONS:
+        binary = Assembler(Options()).assemble_source(
+            benchmark_program(operation, args.bytes))
+        for console, options in (("terminal", []),
+                                 ("headless", ["--headless"])):
+            duration, size = run_image(args.vm, binary, options)
+            print(f"{operation:<4} {console:<8}: {duration * 1e3:8.1f} ms "
+                  f"({size / duration / 1e6:.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Measure the memory used by the intermediate code of fbuilder.
+
+Assembles a synthetic program with a configurable number of colon and code
+words and reports the size of the intermediate code next to the peak memory
+needed for the whole assembly.
+"""
+import argparse
+import pathlib
+import sys
+import time
+import tracemalloc
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from fbuilder.app import Assembler  # noqa: E402
+
+
+class Options:
+    format = "bin"
+    optimize = False
+
+
+def synthetic_program(word_count):
+    lines = ["codeblock", "start:", "    jmp :start", "end"]
+    for index in range(word_count):
+        lines += [f"def asm(code) CODE{index}",
+                  "    popd %acc1",
+                  "    popd %acc2",
+                  "    add %acc1, %acc1, %acc2",
+                  "    pushd %acc1",
+                  "    mov %wp, [%ip++]",
+                  "    jmp [%wp]",
+                  "end",
+                  f"def word(colon) COLON{index}",
+                  f"    CODE{index}",
+                  f"    CODE{index // 2}",
+                  "end"]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--words", type=int, default=5000,
+                        help="number of code and colon words to generate")
+    args = parser.parse_args()
+
+    source = synthetic_program(args.words)
+    assembler = Assembler(Options())
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    binary = assembler.assemble_source(source)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ir = assembler.ir
+    usage = ir.memory_usage()
+    print(f"{len(source)} bytes of source assembled to {len(binary)} bytes "
+          f"in {duration:.2f} s")
+    print(f"{len(ir)} rows, {len(ir.fixup_targets)} fixups, "
+          f"{len(ir.label_names)} labels")
+    print(f"intermediate code: {usage} bytes "
+          f"({usage / len(ir):.1f} bytes per row)")
+    print(f"peak memory during assembly: {peak} bytes")
+
+
+if __name__ == "__main__":
+    main()
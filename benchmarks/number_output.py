@@ -0,0 +1,75 @@
+"""Measure how long the eForth system takes to print numbers with `.`.
+
+Builds an image that prints a range of numbers and runs it in the VM. Number
+formatting goes through `#`, `#S` and `UM/MOD`, so this mostly measures the
+speed of the multiply and divide words.
+"""
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+repository = pathlib.Path(__file__).parent.parent
+sys.path.append(str(repository))
+
+from fbuilder.app import Assembler  # noqa: E402
+
+
+class Options:
+    format = "bin"
+    optimize = False
+
+
+def benchmark_program(first, count):
+    return "\n".join([
+        'include "eforth/vm_core.fvs"',
+        'include "eforth/eforth_basics.fvs"',
+        "codeblock",
+        "start_word:",
+        "    dt :benchmark_cfa",
+        "end",
+        'include "eforth/eforth_core.fvs"',
+        "def word(colon) BENCHMARK",
+        f"    doLIT {count - 1} >R",
+        "print_loop:",
+        f"    R@ doLIT {first} + .",
+        "    next :print_loop",
+        "    BYE",
+        "end",
+    ]) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--numbers", type=int, default=20000,
+                        help="amount of numbers to print")
+    parser.add_argument("--first", type=int, default=-10000,
+                        help="first number to print")
+    parser.add_argument("--vm", type=pathlib.Path,
+                        default=repository / "build-debug" / "forth-vm-sim",
+                        help="path to the VM executable")
+    args = parser.parse_args()
+
+    os.chdir(repository)
+    binary = Assembler(Options()).assemble_source(
+        benchmark_program(args.first, args.numbers))
+    with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as image:
+        image.write(binary)
+
+    try:
+        start = time.perf_counter()
+        subprocess.run([str(args.vm), "-i", image.name],
+                       stdout=subprocess.DEVNULL, check=True)
+        duration = time.perf_counter() - start
+    finally:
+        os.remove(image.name)
+
+    print(f"printed {args.numbers} numbers in {duration:.2f} s "
+          f"({duration / args.numbers * 1e6:.1f} us per number)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Measure the speedup of assembling included files in worker processes.
+
+Writes a synthetic program of several included files, each with code and
+colon words calling words of the other files, and assembles it serially and
+with increasing numbers of worker processes. All builds must produce the
+same image.
+"""
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from fbuilder.app import Assembler  # noqa: E402
+from ir_memory import synthetic_program  # noqa: E402
+
+
+class Options:
+    format = "bin"
+    jobs = 1
+
+
+def write_program(directory, file_count, word_count):
+    includes = []
+    for index in range(file_count):
+        name = f"unit{index}.fvs"
+        source = synthetic_program(word_count)
+        # keep the names unique, words of the previous file are called
+        source = source.replace("CODE", f"CODE{index}_")
+        source = source.replace("COLON", f"COLON{index}_")
+        source = source.replace("start", f"start{index}")
+        if index > 0:
+            source += (f"def word(colon) LINK{index}\n"
+                       f"    COLON{index - 1}_0\n"
+                       "end\n")
+        (directory / name).write_text(source)
+        includes.append(f'include "{name}"')
+    return "\n".join(includes) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-f", "--files", type=int, default=8,
+                        help="number of included files to generate")
+    parser.add_argument("-n", "--words", type=int, default=500,
+                        help="number of code and colon words per file")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="largest number of worker processes to try")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        source = write_program(pathlib.Path(directory), args.files,
+                               args.words)
+
+        reference = None
+        serial = None
+        print(f"{args.files} files, {os.cpu_count()} cores")
+        for jobs in range(1, args.jobs + 1):
+            options = Options()
+            options.jobs = jobs
+            start = time.perf_counter()
+            binary = Assembler(options).assemble_source(source)
+            duration = time.perf_counter() - start
+            if reference is None:
+                reference, serial = binary, duration
+            elif binary != reference:
+                raise RuntimeError(f"{jobs} jobs built a different image")
+            print(f"{jobs:3} jobs: {duration:.2f} s, "
+                  f"speedup {serial / duration:.2f}")
+
+
+if __name__ == "__main__":
+    main()
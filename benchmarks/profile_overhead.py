@@ -0,0 +1,62 @@
+"""Measure the overhead of profiling words with `--profile`.
+
+Runs an image that prints numbers, like `number_output.py`, once without and
+once with the profiler and prints the words running most instructions.
+"""
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+
+repository = pathlib.Path(__file__).parent.parent
+sys.path.append(str(repository))
+
+from fbuilder.address_map import AddressMap  # noqa: E402
+from fbuilder.app import Assembler  # noqa: E402
+from fbuilder.word_profile import Profile  # noqa: E402
+from number_output import benchmark_program  # noqa: E402
+from trace_overhead import run_image  # noqa: E402
+
+
+class Options:
+    format = "bin"
+    optimize = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--numbers", type=int, default=20000,
+                        help="amount of numbers to print")
+    parser.add_argument("--vm", type=pathlib.Path,
+                        default=repository / "build-debug" / "forth-vm-sim",
+                        help="path to the VM executable")
+    args = parser.parse_args()
+
+    os.chdir(repository)
+    assembler = Assembler(Options())
+    binary = assembler.assemble_source(benchmark_program(-10000,
+                                                         args.numbers))
+    address_map = AddressMap.from_assembler(assembler)
+
+    with tempfile.TemporaryDirectory() as directory:
+        image = os.path.join(directory, "benchmark.bin")
+        profile_path = os.path.join(directory, "benchmark.prof")
+        with open(image, "wb") as image_file:
+            image_file.write(binary)
+
+        plain = run_image(args.vm, image, [])
+        profiled = run_image(args.vm, image, ["--profile", profile_path])
+        profile = Profile.from_file(profile_path)
+
+    instructions = sum(profile.instructions)
+    print(f"plain run:    {plain:.2f} s")
+    print(f"profiled run: {profiled:.2f} s ({instructions} instructions, "
+          f"{len(profile)} call paths, "
+          f"{(profiled - plain) / plain * 100:+.0f}%)")
+    for entry in profile.word_statistics(address_map)[:5]:
+        print(f"    {entry.name:<12} {entry.instructions / instructions:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+// Measure symbol lookups for a large symbol table.
+//
+// Adds the requested amount of symbols of 12 bytes each, every 16 bytes, and
+// looks up pseudo random addresses once one by one, once as a stream with a
+// few hot addresses like a trace would have, and once by a linear scan over
+// all symbols for comparison.
+#include "symbols.h"
+#include <chrono>
+#include <cstdlib>
+#include <fmt/core.h>
+#include <random>
+#include <vector>
+
+namespace {
+
+template <typename Function>
+double seconds(const Function& function) {
+    auto start = std::chrono::steady_clock::now();
+    function();
+    std::chrono::duration<double> duration = std::chrono::steady_clock::now() - start;
+    return duration.count();
+}
+
+}
+
+int main(int argc, char* argv[])
+{
+    size_t symbol_count = argc > 1 ? std::strtoul(argv[1], nullptr, 0) : 10000;
+    size_t lookups = argc > 2 ? std::strtoul(argv[2], nullptr, 0) : 1000000;
+
+    Symbols symbols;
+    std::vector<std::pair<size_t, size_t>> ranges;
+    for (size_t word=0; word<symbol_count; word++) {
+        symbols.addSymbol(fmt::format("word{}", word), word * 16, word * 16 + 12);
+        ranges.emplace_back(word * 16, word * 16 + 12);
+    }
+    symbols.symbolAtAddress(0);
+
+    std::mt19937 generator(1);
+    std::uniform_int_distribution<uint32_t> any_address(0, symbol_count * 16);
+    std::vector<uint32_t> addresses(lookups);
+    for (auto& address: addresses) {
+        address = any_address(generator);
+    }
+    std::vector<uint32_t> trace(lookups);
+    for (size_t i=0; i<lookups; i++) {
+        trace[i] = (i % 4) ? addresses[i % 64] : addresses[i];
+    }
+
+    size_t found = 0;
+    auto single = seconds([&] {
+        for (auto address: addresses) {
+            found += symbols.symbolAtAddress(address) != Symbols::NO_SYMBOL;
+        }
+    });
+    auto stream = seconds([&] {
+        found += symbols.symbolsAtAddresses(trace).size();
+    });
+    size_t linear_lookups = std::min<size_t>(lookups, 10000);
+    auto linear = seconds([&] {
+        for (size_t i=0; i<linear_lookups; i++) {
+            for (const auto& range: ranges) {
+                found += (addresses[i] >= range.first) && (addresses[i] < range.second);
+            }
+        }
+    });
+
+    fmt::print("{} symbols, {} lookups (checksum {})\n", symbol_count, lookups, found);
+    fmt::print("index:  {:8.1f} ns per lookup\n", single / lookups * 1e9);
+    fmt::print("stream: {:8.1f} ns per lookup\n", stream / lookups * 1e9);
+    fmt::print("linear: {:8.1f} ns per lookup\n", linear / linear_lookups * 1e9);
+    return 0;
+}
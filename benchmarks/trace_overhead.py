@@ -0,0 +1,79 @@
+"""Measure the overhead of the binary instruction trace and its decoding.
+
+Runs an image that prints numbers, like `number_output.py`, once without
+and once with `--trace-file`, then decodes the trace and maps every program
+counter to its word.
+"""
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+repository = pathlib.Path(__file__).parent.parent
+sys.path.append(str(repository))
+
+from fbuilder.address_map import AddressMap  # noqa: E402
+from fbuilder.app import Assembler  # noqa: E402
+from fbuilder.trace import TraceReader, symbolize  # noqa: E402
+from number_output import benchmark_program  # noqa: E402
+
+
+class Options:
+    format = "bin"
+    optimize = False
+
+
+def run_image(vm, image, options):
+    start = time.perf_counter()
+    subprocess.run([str(vm), "-i", image, *options],
+                   stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--numbers", type=int, default=20000,
+                        help="amount of numbers to print")
+    parser.add_argument("--records", type=int, default=1 << 20,
+                        help="capacity of the trace in instructions")
+    parser.add_argument("--vm", type=pathlib.Path,
+                        default=repository / "build-debug" / "forth-vm-sim",
+                        help="path to the VM executable")
+    args = parser.parse_args()
+
+    os.chdir(repository)
+    assembler = Assembler(Options())
+    binary = assembler.assemble_source(benchmark_program(-10000,
+                                                         args.numbers))
+    address_map = AddressMap.from_assembler(assembler)
+
+    with tempfile.TemporaryDirectory() as directory:
+        image = os.path.join(directory, "benchmark.bin")
+        trace_path = os.path.join(directory, "benchmark.trc")
+        with open(image, "wb") as image_file:
+            image_file.write(binary)
+
+        plain = run_image(args.vm, image, [])
+        traced = run_image(args.vm, image,
+                           ["--trace-file", trace_path,
+                            "--trace-records", str(args.records)])
+
+        start = time.perf_counter()
+        trace = TraceReader(trace_path)
+        words = 0
+        for records in trace.chunks():
+            words += len(symbolize(records, address_map))
+        decoding = time.perf_counter() - start
+
+    print(f"plain run:  {plain:.2f} s")
+    print(f"traced run: {traced:.2f} s ({trace.total} instructions, "
+          f"{(traced - plain) / plain * 100:+.0f}%)")
+    print(f"decoding:   {decoding:.2f} s "
+          f"({words / decoding / 1e6:.1f} M records/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+// Measure the instructions per second of the VM for typical workloads.
+//
+// Every program runs once by calling singleStep in a loop, which also counts
+// the instructions, and through interpret: without breakpoints, with an
+// empty set of breakpoints and with a breakpoint never reached, which checks
+// every instruction. The programs are
+//  - alu:      a counted loop of register arithmetic,
+//  - threaded: a colon definition called through doLIST, NEXT and EXIT over
+//              and over, like compiled Forth code,
+//  - memory:   summing and writing back a 16 KiB buffer word by word.
+#include "vm.h"
+#include <chrono>
+#include <cstdlib>
+#include <fmt/core.h>
+#include <functional>
+#include <vector>
+
+namespace {
+
+// Registers as encoded in instructions
+enum : uint8_t { IP, WP, RSP, DSP, ACC1, ACC2, RET };
+
+class Program {
+public:
+    uint32_t here() const { return code.size(); }
+
+    void bytes(std::initializer_list<uint8_t> values) {
+        code.insert(code.end(), values);
+    }
+
+    void word(uint32_t value) {
+        bytes({static_cast<uint8_t>(value), static_cast<uint8_t>(value >> 8),
+               static_cast<uint8_t>(value >> 16), static_cast<uint8_t>(value >> 24)});
+    }
+
+    void movi(uint8_t opcode, uint32_t value) {
+        bytes({opcode});
+        word(value);
+    }
+
+    // short relative jump to a target before the jump
+    void jump_back(uint8_t opcode, uint32_t target) {
+        bytes({opcode, static_cast<uint8_t>(target - (here() + 2))});
+    }
+
+    // mov.t %wp,[%ip++]; jmp %wp
+    void next() { bytes({0x24, (WP << 3) | IP, 0x69}); }
+
+    void terminate() { bytes({0xfe, 0xf0, 0x00}); }
+
+    std::vector<uint8_t> code;
+};
+
+Program alu_loop(uint32_t iterations) {
+    Program program;
+    program.movi(0x26, iterations);         // mov %acc1, iterations
+    program.movi(0x27, 1);                  // mov %acc2, 1
+    auto loop = program.here();
+    program.bytes({0x30, (RET << 4) | RET, ACC1});      // add %ret, %ret, %acc1
+    program.bytes({0x38, (WP << 4) | WP, RET});         // xor %wp, %wp, %ret
+    program.bytes({0x3e, (WP << 5) | 1});               // sll %wp, 1
+    program.bytes({0x32, (ACC1 << 4) | ACC1, ACC2});    // sub %acc1, %acc1, %acc2
+    program.bytes({0x75, 0x02});                        // jz.s +2
+    program.jump_back(0x74, loop);
+    program.terminate();
+    return program;
+}
+
+Program threaded_loop(uint32_t iterations) {
+    Program program;
+    program.movi(0x26, iterations);         // mov %acc1, iterations
+    program.movi(0x27, 0);                  // mov %acc2, thread, patched below
+    auto thread_operand = program.here() - 4;
+    program.bytes({0x20, (IP << 4) | ACC2});            // mov %ip, %acc2
+    program.movi(0x27, 1);                  // mov %acc2, 1
+    program.next();
+
+    auto nop_cfa = program.here();
+    program.next();
+    auto decrement_cfa = program.here();
+    program.bytes({0x32, (ACC1 << 4) | ACC1, ACC2});    // sub %acc1, %acc1, %acc2
+    program.next();
+    // branch to the address in the next cell unless %acc1 is 0
+    auto again_cfa = program.here();
+    program.bytes({0x75, 0x05});                        // jz.s +5
+    program.bytes({0x20, (IP << 4) | 0x08 | IP});       // mov %ip, [%ip]
+    program.next();
+    program.bytes({0x24, (WP << 3) | IP});              // mov.t %wp, [%ip++]
+    program.next();
+    auto bye_cfa = program.here();
+    program.terminate();
+    auto dolist_cfa = program.here();
+    program.bytes({0xb0});                              // pushr %ip
+    program.bytes({0x20, (IP << 4) | RET});             // mov %ip, %ret
+    program.next();
+    auto exit_cfa = program.here();
+    program.bytes({0xb8});                              // popr %ip
+    program.next();
+
+    auto word_cfa = program.here();
+    program.movi(0x73, dolist_cfa);                     // call :dolist_cfa
+    for (auto cfa: {nop_cfa, nop_cfa, decrement_cfa, exit_cfa}) {
+        program.word(cfa);
+    }
+
+    auto thread = program.here();
+    for (auto cfa: {word_cfa, again_cfa, thread, bye_cfa}) {
+        program.word(cfa);
+    }
+    for (int i=0; i<4; i++) {
+        program.code[thread_operand + i] = static_cast<uint8_t>(thread >> (8 * i));
+    }
+    return program;
+}
+
+Program memory_loop(uint32_t iterations) {
+    const uint32_t buffer = 0x1000;
+    const uint32_t buffer_words = 0x1000;
+
+    Program program;
+    program.movi(0x26, iterations / buffer_words + 1);  // mov %acc1, rounds
+    program.bytes({0x20, (RSP << 4) | ACC1});           // mov %rsp, %acc1
+    program.movi(0x26, 1);                              // mov %acc1, 1
+    program.bytes({0x20, (IP << 4) | ACC1});            // mov %ip, %acc1
+    auto round = program.here();
+    program.movi(0x27, buffer);                         // mov %acc2, buffer
+    program.movi(0x26, buffer_words);                   // mov %acc1, buffer_words
+    auto loop = program.here();
+    program.bytes({0x24, (WP << 3) | ACC2});            // mov.t %wp, [%acc2++]
+    program.bytes({0x30, (RET << 4) | RET, WP});        // add %ret, %ret, %wp
+    program.bytes({0x20, 0x80 | (ACC2 << 4) | RET});    // mov [%acc2], %ret
+    program.bytes({0x32, (ACC1 << 4) | ACC1, IP});      // sub %acc1, %acc1, %ip
+    program.bytes({0x75, 0x02});                        // jz.s +2
+    program.jump_back(0x74, loop);
+    program.bytes({0x32, (RSP << 4) | RSP, IP});        // sub %rsp, %rsp, %ip
+    program.bytes({0x20, (ACC1 << 4) | RSP});           // mov %acc1, %rsp
+    program.bytes({0x75, 0x02});                        // jz.s +2
+    program.jump_back(0x74, round);
+    program.terminate();
+    return program;
+}
+
+double seconds(const std::function<void()>& function) {
+    auto start = std::chrono::steady_clock::now();
+    function();
+    std::chrono::duration<double> duration = std::chrono::steady_clock::now() - start;
+    return duration.count();
+}
+
+void measure(const char* name, const Program& program) {
+    Memory memory;
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    memory.loadImageFromIterator(program.code.begin(), program.code.end());
+    Vm stepping{memory, data_stack, return_stack, symbols};
+    uint64_t instructions = 0;
+    auto stepping_time = seconds([&] {
+        while (Vm::Success == stepping.singleStep()) {
+            instructions++;
+        }
+    });
+    instructions++;
+
+    auto interpret_time = [&](Breakpoints* breakpoints) {
+        memory.loadImageFromIterator(program.code.begin(), program.code.end());
+        Vm interpreting{memory, data_stack, return_stack, symbols};
+        if (nullptr != breakpoints) {
+            interpreting.setBreakpoints(*breakpoints);
+        }
+        return seconds([&] {
+            interpreting.interpret(false);
+        });
+    };
+    Breakpoints no_breakpoints;
+    Breakpoints unreached_breakpoint;
+    unreached_breakpoint.add(0x7fff);
+
+    fmt::print("{:<10} {:>12} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}\n", name, instructions,
+               instructions / stepping_time / 1e6,
+               instructions / interpret_time(nullptr) / 1e6,
+               instructions / interpret_time(&no_breakpoints) / 1e6,
+               instructions / interpret_time(&unreached_breakpoint) / 1e6);
+}
+
+}
+
+int main(int argc, char* argv[])
+{
+    uint32_t iterations = argc > 1 ? std::strtoul(argv[1], nullptr, 0) : 10000000;
+
+    fmt::print("{:<10} {:>12} {:>12} {:>12} {:>12} {:>12}\n", "program", "instructions", "step MIPS", "MIPS",
+               "no break", "break MIPS");
+    measure("alu", alu_loop(iterations));
+    measure("threaded", threaded_loop(iterations));
+    measure("memory", memory_loop(iterations));
+    return 0;
+}
@@ -1,14 +1,20 @@
 from fbuilder.app import Assembler
-import keyboard
-import time
 import typing
 
 from dataclasses import dataclass
 import json
 import os
 import subprocess
+import sys
 import tempfile
 
+# runs the images within the test process when the forth_vm module was built
+sys.path.append("build-debug")
+try:
+    import forth_vm
+except ImportError:
+    forth_vm = None
+
 
 # Forth constants
 TRUE = -1
@@ -26,11 +32,13 @@ def assemble(source: str) -> tuple[str, dict]:
     @dataclass
     class DefaultOptions:
         format: str = "bin"
+        thread_cells: int = int(os.environ.get("EFORTH_THREAD_CELLS", "32"))
+        short_branches: bool = os.environ.get("EFORTH_SHORT_BRANCHES") == "1"
     asm = Assembler(DefaultOptions())
     return asm.assemble_source(source), asm.symbol_table
 
 
-def build_vm_image(word_under_test: str, test_data) -> tuple[typing.IO, dict]:
+def assemble_vm_image(word_under_test: str, test_data) -> tuple[bytes, dict]:
     with open("eforth/test_word.fvs", "r") as source_file:
         source = source_file.read()
 
@@ -41,7 +49,11 @@ def build_vm_image(word_under_test: str, test_data) -> tuple[typing.IO, dict]:
                                          test_data))
         source = source.replace("%TEST_DATA%", test_data_source)
 
-        binary, symbols = assemble(source)
+        return assemble(source)
+
+
+def build_vm_image(word_under_test: str, test_data) -> tuple[typing.IO, dict]:
+    binary, symbols = assemble_vm_image(word_under_test, test_data)
     tmp = tempfile.NamedTemporaryFile(suffix=".bin", delete=False)
     tmp.write(binary)
     tmp.close()
@@ -49,31 +61,48 @@ def build_vm_image(word_under_test: str, test_data) -> tuple[typing.IO, dict]:
 
 
 def get_stack(text_output):
-    lines = text_output.split(b"\r")
-    state = json.loads(lines[-2])
+    lines = text_output.splitlines()
+    state = json.loads(lines[-1])
     stack = state["dataStack"]
     return stack
 
 
-def run_vm_image(word_under_test, input_data=None, test_data=[]):
+def run_vm(word_under_test, input_data=None, test_data=[]):
+    """Returns the data stack, the symbols and the console output"""
+    if forth_vm is None:
+        return run_vm_process(word_under_test, input_data, test_data)
+
+    binary, symbols = assemble_vm_image(word_under_test, test_data)
+    vm = forth_vm.Vm()
+    vm.memory.load_image(binary)
+    vm.add_input((input_data or "").encode())
+    if vm.interpret() == forth_vm.Result.IllegalInstruction:
+        raise RuntimeError("VM execution failed")
+    # signed like the state dumped by forth-vm-sim
+    stack = [entry - (1 << 32) if entry & 0x80000000 else entry
+             for entry in vm.data_stack_entries()]
+    return stack, symbols, vm.take_output()
+
+
+def run_vm_process(word_under_test, input_data=None, test_data=[]):
     image, symbols = build_vm_image(word_under_test, test_data)
     with subprocess.Popen(["build-debug/forth-vm-sim",
+                           "--headless",
                            "--dump-state",
                            "-i", image.name],
                           stdin=subprocess.PIPE,
                           stdout=subprocess.PIPE) as proc:
-        if input_data:
-            for ch in input_data:
-                if ch == "\n":
-                    keyboard.press_and_release('enter')
-                else:
-                    keyboard.press_and_release(ch)
-                time.sleep(0.00001)
-        output = proc.stdout.read()
+        output, _ = proc.communicate((input_data or "").encode())
         if "Vm hit illegal instruction" in output.decode(encoding="utf-8"):
             raise RuntimeError("VM execution failed")
     os.remove(image.name)
-    return get_stack(output), symbols
+    console_output = output.split(b"Byte code interpretation successful")[0]
+    return get_stack(output), symbols, console_output
+
+
+def run_vm_image(word_under_test, input_data=None, test_data=[]):
+    stack, symbols, _ = run_vm(word_under_test, input_data, test_data)
+    return stack, symbols
 
 
 # ---------------------------------------------
@@ -458,6 +487,60 @@ def test_ummod_calculates_correctly(me):
     assert stack[0] == 2        # reminder
 
 
+@passmein
+def test_ummod_returns_minus_one_on_overflow(me):
+    """doLIT 0 doLIT 5 doLIT 5 UM/MOD"""
+    stack, _ = run_vm_image(me.__doc__)
+
+    assert len(stack) == 2
+    assert stack[1] == -1
+    assert stack[0] == -1
+
+
+@passmein
+def test_mmod_divides_negative_double_floored(me):
+    """doLIT -7 doLIT -1 doLIT 2 M/MOD"""
+    stack, _ = run_vm_image(me.__doc__)
+
+    assert len(stack) == 2
+    assert stack[1] == -4       # quotient
+    assert stack[0] == 1        # reminder
+
+
+@passmein
+def test_mmod_negates_double_with_zero_low_word(me):
+    """doLIT 0 doLIT 1 doLIT -2 M/MOD"""
+    stack, _ = run_vm_image(me.__doc__)
+
+    assert len(stack) == 2
+    assert stack[1] == -0x80000000
+    assert stack[0] == 0
+
+
+@passmein
+def test_slash_mod_rounds_towards_negative_infinity(me):
+    """doLIT -7 doLIT 2 /MOD doLIT 7 doLIT -2 /MOD doLIT -7 doLIT -2 /MOD"""
+    stack, _ = run_vm_image(me.__doc__)
+
+    assert stack == [1, -4, -1, -4, -1, 3]
+
+
+@passmein
+def test_mod_takes_the_sign_of_the_divisor(me):
+    """doLIT -7 doLIT 2 MOD doLIT 7 doLIT -2 MOD"""
+    stack, _ = run_vm_image(me.__doc__)
+
+    assert stack == [1, -1]
+
+
+@passmein
+def test_slash_returns_floored_quotient(me):
+    """doLIT 42 doLIT 5 / doLIT 7 doLIT -2 /"""
+    stack, _ = run_vm_image(me.__doc__)
+
+    assert stack == [8, -4]
+
+
 # ------------------------
 # Multiply
 @passmein
@@ -519,6 +602,16 @@ def test_multiply_mod_works_correctly(me):
     assert stack[0] == 36       # modulus
 
 
+@passmein
+def test_multiply_mod_with_negative_values(me):
+    """doLIT -3252 doLIT 2349 doLIT -342 */MOD"""
+    stack, _ = run_vm_image(me.__doc__)
+
+    assert len(stack) == 2
+    assert stack[1] == 22336    # quotient
+    assert stack[0] == -36      # modulus
+
+
 # ------------------------
 # Bits & Bytes
 @passmein
@@ -633,6 +726,26 @@ def test_cmove_non_overlapping(me):
     assert stack[0] == 0x34
 
 
+@passmein
+def test_cmove_overlapping_repeats_first_bytes(me):
+    """PRE_INIT_DATA PRE_INIT_DATA doLIT 1 + doLIT 3 CMOVE
+    PRE_INIT_DATA doLIT 1 + C@
+    PRE_INIT_DATA doLIT 2 + C@
+    PRE_INIT_DATA doLIT 3 + C@
+    """
+    stack, _ = run_vm_image(me.__doc__, test_data=[0x34, 0x53, 0xd8, 0x11])
+    assert stack == [0x34, 0x34, 0x34]
+
+
+@passmein
+def test_cmove_without_bytes_changes_nothing(me):
+    """PRE_INIT_DATA doLIT 28500 doLIT 0 CMOVE
+    doLIT 28500 C@
+    """
+    stack, _ = run_vm_image(me.__doc__, test_data=[0x34])
+    assert stack == [0]
+
+
 @passmein
 def test_fill_puts_character_in_memory_block(me):
     """PRE_INIT_DATA doLIT 3 doLIT 10 FILL
@@ -649,6 +762,17 @@ def test_fill_puts_character_in_memory_block(me):
     assert stack[3] == 0
 
 
+@passmein
+def test_erase_puts_zeros_in_memory_block(me):
+    """PRE_INIT_DATA doLIT 2 ERASE
+    PRE_INIT_DATA C@
+    PRE_INIT_DATA doLIT 1 + C@
+    PRE_INIT_DATA doLIT 2 + C@
+    """
+    stack, _ = run_vm_image(me.__doc__, test_data=3*[0x5a])
+    assert stack == [0, 0, 0x5a]
+
+
 @passmein
 def test_mtrailing_removes_leading_whitespace(me):
     """PRE_INIT_DATA doLIT 4 -TRAILING PRE_INIT_DATA
@@ -748,18 +872,26 @@ def test_print_right_justified_number(me):
     # TODO: capture stdout to check for '  123'
 
 
+@passmein
+def test_type_consumes_address_and_count(me):
+    """PRE_INIT_DATA doLIT 3 TYPE"""
+    stack, _, output = run_vm(me.__doc__, test_data="abc")
+    assert stack == []
+    assert output == b"abc"
+
+
 @passmein
 def test_dot_outputs_unsigned_number_with_space_in_front(me):
     """doLIT 4352 ."""
-    run_vm_image(me.__doc__)
-    # TODO: capture stdout to check for ' 4352'
+    _, _, output = run_vm(me.__doc__)
+    assert output == b" 4352"
 
 
 @passmein
 def test_dot_outputs_signed_number_with_space_and_sign_in_front(me):
     """doLIT -4352 ."""
-    run_vm_image(me.__doc__)
-    # TODO: capture stdout to check for ' -4352'
+    _, _, output = run_vm(me.__doc__)
+    assert output == b" -4352"
 
 
 # ------------------------
@@ -953,6 +1085,15 @@ def test_expect_returns_the_address_and_the_amount_of_read_chars(me):
     assert stack[0] == 12000
 
 
+@passmein
+def test_accept_stores_the_line_and_echoes_it(me):
+    """doLIT 12000 doLIT 80 accept doLIT 12000 C@ doLIT 12004 C@"""
+    stack, _, output = run_vm(me.__doc__, "hello\nworld\n")
+
+    assert stack == [12000, 5, ord("h"), ord("o")]
+    assert output == b"hello"
+
+
 @passmein
 def test_same_on_equal_strings_returns_true(me):
     """PRE_INIT_DATA DUP doLIT 5 + doLIT 4 SAME? PRE_INIT_DATA"""
@@ -6,7 +6,7 @@ if __name__ == "__main__" or __package__ is None:
     module_path = my_path.parent
     sys.path.append(str(module_path))
 
-from fbuilder import app
+from fbuilder import app, watch
 import argparse
 import pathlib
 
@@ -27,8 +27,44 @@ def main():
     parser.add_argument('--sym', dest='symbol_table', action='store_true',
                         default=False,
                         help="flag to indicate whether a symbol table should be emitted in addition to the regular output")
+    parser.add_argument('--sym-format', dest='symbol_format',
+                        choices=['bin', 'csv'], default="bin",
+                        help="format of the symbol table, the sorted binary format or the CSV format")
+    parser.add_argument('-O', '--optimize', dest='optimize',
+                        action='store_true', default=False,
+                        help="run the peephole optimizer over the assembled instructions")
+    parser.add_argument('--short-branches', dest='short_branches',
+                        action='store_true', default=False,
+                        help="use short relative jumps and calls wherever the target is in reach")
+    parser.add_argument('--thread-cells', dest='thread_cells', type=int,
+                        choices=[16, 32], default=32,
+                        help="size in bits of the cells in threaded code")
+    parser.add_argument('--stats', dest='statistics', action='store_true',
+                        default=False,
+                        help="print statistics about the assembled code")
+    parser.add_argument('--listing', dest='listing', action='store_true',
+                        default=False,
+                        help="write the disassembly listing next to the output file, with the suffix .lst")
+    parser.add_argument('--cache', dest='cache_directory',
+                        type=pathlib.Path, default=None,
+                        help="directory of the build cache, reusing the outputs of identical builds, the default is the directory in FBUILDER_CACHE")
+    parser.add_argument('--cache-size', dest='cache_size',
+                        type=lambda size: int(size) * 1024 * 1024,
+                        default=64 * 1024 * 1024,
+                        help="size in MiB up to which the build cache grows")
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help="number of worker processes assembling the included files in parallel")
+    parser.add_argument('--watch', dest='watch', action='store_true',
+                        default=False,
+                        help="keep running and build again whenever the input file or any included file changes")
 
     args = parser.parse_args()
+    if args.watch:
+        try:
+            watch.WatchBuilder(args).watch()
+        except KeyboardInterrupt:
+            pass
+        return
     compiler = app.Assembler(args)
     compiler.assemble_file()
 
@@ -0,0 +1,153 @@
+"""Map addresses of an assembled image to the words containing them.
+
+Tools working on traces, dumps or profiles of the VM use this to turn
+addresses into words and the fields of their definition. Words are kept in
+parallel arrays sorted by start address, so single addresses are looked up
+with bisect and whole NumPy arrays of addresses with `searchsorted`.
+
+Every word definition starts with its link field, followed by the name field
+starting at the `_nfa` label and the code field starting at the `_cfa` label,
+and ends right before the `_end` label.
+"""
+from .symbol_file import SymbolFile, is_symbol_file
+from array import array
+from bisect import bisect_right
+import csv
+
+# fields of a word definition
+LINK = 0
+NAME = 1
+CODE = 2
+FIELD_SUFFIXES = ("_lfa", "_nfa", "_cfa")
+
+LINK_SIZE = 4
+NO_WORD = -1
+
+
+class AddressMap:
+    """Words of an image as sorted, array-backed address ranges.
+
+    Ranges may be nested as long as they don't partially overlap; addresses
+    resolve to the innermost word. Several names for the same range, like
+    aliases, are merged into one word, the first name being the primary one.
+    """
+    def __init__(self, word_ranges):
+        ordered = sorted(enumerate(word_ranges),
+                         key=lambda item: (item[1][1], -item[1][2], item[0]))
+
+        self.names = []
+        self.aliases = []
+        self.starts = array("I")
+        self.ends = array("I")
+        self.parents = array("i")
+        open_words = []
+        for _, (name, start, end) in ordered:
+            if self.names and self.starts[-1] == start \
+                    and self.ends[-1] == end:
+                self.aliases[-1].append(name)
+                continue
+
+            while open_words and self.ends[open_words[-1]] <= start:
+                open_words.pop()
+            if open_words and self.ends[open_words[-1]] < end:
+                raise ValueError(f"Word {name} partially overlaps word "
+                                 f"{self.names[open_words[-1]]}")
+
+            self.names.append(name)
+            self.aliases.append([])
+            self.starts.append(start)
+            self.ends.append(end)
+            self.parents.append(open_words[-1] if open_words else NO_WORD)
+            open_words.append(len(self.names) - 1)
+
+        self.nfas = array("I", (start + LINK_SIZE for start in self.starts))
+        self.cfas = array("I", (nfa + 1 + len(name.encode("utf-8"))
+                                for nfa, name in zip(self.nfas, self.names)))
+        self._numpy_arrays = None
+
+    @classmethod
+    def from_assembler(cls, assembler):
+        return cls(assembler.symbols.word_ranges)
+
+    @classmethod
+    def from_file(cls, file_path):
+        """Load a symbol file in the binary or the CSV format"""
+        with open(file_path, "rb") as symbol_file:
+            binary = is_symbol_file(symbol_file.read(4))
+        if binary:
+            with SymbolFile(file_path) as symbols:
+                return cls([(symbols.name(record), symbols.starts()[record],
+                             symbols.ends()[record])
+                            for record in range(len(symbols))])
+        with open(file_path, newline="") as symbol_file:
+            return cls([(name, int(start), int(end))
+                        for name, start, end in csv.reader(symbol_file)])
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, address):
+        """Return the index of the innermost word containing the address"""
+        word = bisect_right(self.starts, address) - 1
+        while word != NO_WORD and self.ends[word] <= address:
+            word = self.parents[word]
+        return word
+
+    def field(self, word, address):
+        if address >= self.cfas[word]:
+            return CODE
+        if address >= self.nfas[word]:
+            return NAME
+        return LINK
+
+    def describe(self, address):
+        """Return the address as label of the field and offset into it,
+        e.g. `dup_cfa+0x4`"""
+        word = self.lookup(address)
+        if word == NO_WORD:
+            return f"{address:#x}"
+        field = self.field(word, address)
+        base = (self.starts, self.nfas, self.cfas)[field][word]
+        label = self.names[word] + FIELD_SUFFIXES[field]
+        if address == base:
+            return label
+        return f"{label}+{address - base:#x}"
+
+    def lookup_array(self, addresses):
+        """Return the word indices for a NumPy array of addresses, NO_WORD
+        where an address is outside of all words"""
+        import numpy as np
+
+        if self._numpy_arrays is None:
+            self._numpy_arrays = tuple(
+                np.frombuffer(column, dtype=column.typecode)
+                for column in (self.starts, self.ends, self.parents))
+        starts, ends, parents = self._numpy_arrays
+
+        addresses = np.asarray(addresses)
+        words = np.searchsorted(starts, addresses, side="right") - 1
+        # walk up to the enclosing words for addresses behind nested words;
+        # one round per nesting level
+        outside = words >= 0
+        outside[outside] = ends[words[outside]] <= addresses[outside]
+        while outside.any():
+            words[outside] = parents[words[outside]]
+            outside &= words >= 0
+            outside[outside] = ends[words[outside]] <= addresses[outside]
+        return words
+
+    def fields_array(self, words, addresses):
+        """Return the fields of a NumPy array of addresses in their words"""
+        import numpy as np
+
+        words = np.asarray(words)
+        addresses = np.asarray(addresses)
+        valid = words >= 0
+        nfas = np.frombuffer(self.nfas, dtype=self.nfas.typecode)
+        cfas = np.frombuffer(self.cfas, dtype=self.cfas.typecode)
+        fields = np.full(words.shape, LINK, dtype=np.int8)
+        if not self.names:
+            return fields
+        fields[valid & (addresses >= nfas[words])] = NAME
+        fields[valid & (addresses >= cfas[words])] = CODE
+        return fields
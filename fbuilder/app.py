@@ -1,9 +1,20 @@
+import contextlib
+import functools
+import os
 import pathlib
-from lark import Lark
+import threading
+from lark import Lark, Transformer, Tree
 from lark.lexer import Lexer, LexerState
 from .assembler import VmForthAssembler
-from .emitter import MachineCodeEmitter, DisassemblyEmitter
+from .backends import generate_machine_code, generate_listing, \
+    collect_statistics
+from .ir import IRBuilder
+from .peephole import PeepholeOptimizer
+from .relaxation import BranchRelaxation
 from .debug_symbols import WordCollection
+from .parallel import ParallelBuild
+from .sources import grammar
+from .build_cache import BuildCache, CacheEntry, DEFAULT_MAX_BYTES
 
 
 # Recursive lexer idea copied from
@@ -36,48 +47,205 @@ class RecursiveLexerThread:
                 yield token  # The parser still expects this token either way
 
 
+class DefinitionStream(Transformer):
+    """Hands every definition to the assembler of the current thread as soon
+    as the parser has read it, so only one definition is held as tree at a
+    time instead of the tree of the whole program"""
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+
+    def definition(self, children):
+        self.local.assembler.visit(Tree("definition", children))
+
+    def start(self, children):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def source_parser():
+    """Parser reading included files as part of the source and streaming
+    the definitions to the assembler, built once"""
+    stream = DefinitionStream()
+    parser = Lark(grammar(), parser='lalr', transformer=stream,
+                  _plugins={"LexerThread": RecursiveLexerThread})
+    return parser, stream
+
+
+@contextlib.contextmanager
+def replaced_atomically(path):
+    """Yield a temporary path to write to, which then replaces path, so
+    readers never see a partially written file"""
+    temporary_path = path.with_name(path.name + ".tmp")
+    try:
+        yield temporary_path
+        os.replace(temporary_path, path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+
 class Assembler:
     def __init__(self, options=None):
         self.options = options
         self.symbols = WordCollection()
+        self.optimizer = None
+        self.relaxation = None
+        self.ir = None
+        self.listing = None
+        # whether the last program came from the build cache
+        self.cached = False
 
     def assemble_file(self):
         source_code = self.options.input.read_text()
 
         output = self.assemble_source(source_code)
+        if self.optimizer is not None:
+            print(f"Peephole optimizer removed "
+                  f"{self.optimizer.instructions_removed} instructions "
+                  f"and saved {self.optimizer.bytes_saved} bytes")
+        if self.relaxation is not None:
+            print(f"Branch relaxation shortened "
+                  f"{self.relaxation.branches_shortened} branches "
+                  f"and saved {self.relaxation.bytes_saved} bytes")
+        if getattr(self.options, "statistics", False):
+            self.print_statistics()
+        self.write_outputs(output)
+
+    def write_outputs(self, output):
         if self.options.format == "carray":
             output = ", ".join(map(hex, output))
 
         file_mode = "w"
         if self.options.format == "bin":
             file_mode += "b"
-        with open(self.options.output, file_mode) as output_file:
-            output_file.write(output)
+        with replaced_atomically(self.options.output) as output_path:
+            with open(output_path, file_mode) as output_file:
+                output_file.write(output)
 
         if self.options.symbol_table:
-            self.symbols.dump_to_file(self.options.output.with_suffix(".sym"))
+            symbol_path = self.options.output.with_suffix(".sym")
+            with replaced_atomically(symbol_path) as temporary_path:
+                if getattr(self.options, "symbol_format", "bin") == "csv":
+                    self.symbols.dump_to_file(temporary_path)
+                else:
+                    self.symbols.dump_to_binary_file(temporary_path)
+
+        if getattr(self.options, "listing", False):
+            listing_path = self.options.output.with_suffix(".lst")
+            with replaced_atomically(listing_path) as temporary_path:
+                temporary_path.write_text(self.listing_text())
+
+    def listing_text(self):
+        if self.listing is None:
+            self.listing = generate_listing(self.ir)
+        return self.listing
+
+    def build_cache(self):
+        """The build cache in the directory of the options or in
+        FBUILDER_CACHE, None without any"""
+        directory = getattr(self.options, "cache_directory", None) or \
+            os.environ.get("FBUILDER_CACHE")
+        # statistics are collected from the intermediate code
+        if not directory or getattr(self.options, "statistics", False):
+            return None
+        return BuildCache(directory, getattr(self.options, "cache_size",
+                                             DEFAULT_MAX_BYTES))
 
     def assemble_source(self, source_code):
-        script_dir = pathlib.Path(__file__).parent
-        lark_grammar_path = script_dir / "grammar.lark"
-        grammar = lark_grammar_path.read_text()
-        lark_parser = Lark(grammar, parser='lalr',
-                           _plugins={"LexerThread": RecursiveLexerThread})
+        cache = self.build_cache()
+        if cache is None:
+            return self._assemble(source_code)
 
-        parse_tree = lark_parser.parse(source_code)
+        key = cache.key(source_code, self.options)
+        entry = cache.load(key)
+        if entry is not None:
+            self.optimizer = None
+            self.relaxation = None
+            self.ir = None
+            self.symbols.clear()
+            for word_range in entry.word_ranges:
+                self.symbols.add_word(*word_range)
+            self.symbol_table = entry.labels
+            self.listing = entry.listing
+            self.cached = True
+            return entry.output
 
-        if self.options.format == "disassembly":
-            emitter = DisassemblyEmitter()
+        output = self._assemble(source_code)
+        if getattr(self.options, "listing", False):
+            self.listing_text()
+        cache.store(key, CacheEntry(output, list(self.symbols.word_ranges),
+                                    self.symbol_table, self.listing))
+        return output
+
+    def _assemble(self, source_code):
+        jobs = getattr(self.options, "jobs", 1)
+        if jobs > 1:
+            return self.assemble_parallel(source_code, jobs)
+        return self.assemble_stream(source_code)
+
+    def assemble_parallel(self, source_code, jobs):
+        """Assemble the included files in jobs worker processes, then lay out
+        and link the whole program"""
+        builder, assembler = self._start_assembly()
+        assembler.begin()
+        ParallelBuild(assembler, jobs).build(source_code)
+        assembler.finish()
+        return self._finish_assembly(builder)
+
+    def assemble_stream(self, source_code):
+        """Assemble every definition right when it was parsed"""
+        parser, stream = source_parser()
+        builder, assembler = self._start_assembly()
+        assembler.begin()
+        stream.local.assembler = assembler
+        try:
+            parser.parse(source_code)
+        finally:
+            stream.local.assembler = None
+        assembler.finish()
+        return self._finish_assembly(builder)
+
+    def assemble_tree(self, parse_tree):
+        builder, assembler = self._start_assembly()
+        assembler.visit(parse_tree)
+        return self._finish_assembly(builder)
+
+    def _start_assembly(self):
+        self.listing = None
+        self.cached = False
+        if getattr(self.options, "optimize", False):
+            self.optimizer = PeepholeOptimizer()
+        else:
+            self.optimizer = None
+        if getattr(self.options, "short_branches", False):
+            self.relaxation = BranchRelaxation()
         else:
-            emitter = MachineCodeEmitter()
+            self.relaxation = None
+        builder = IRBuilder(self.optimizer, self.relaxation)
 
         self.symbols.clear()
-        assembler = VmForthAssembler(emitter, self.symbols)
-        assembler.visit(parse_tree)
+        thread_cells = getattr(self.options, "thread_cells", 32)
+        assembler = VmForthAssembler(builder, self.symbols, thread_cells // 8)
+        return builder, assembler
 
+    def _finish_assembly(self, builder):
+        self.ir = builder.ir
+        self.symbol_table = builder.labels
         if self.options.format == "disassembly":
-            self.symbol_table = {}
-            return assembler.emitter.disassembly
+            return generate_listing(self.ir)
         else:
-            self.symbol_table = assembler.emitter.labels
-            return assembler.emitter.binary_code
+            return generate_machine_code(self.ir)
+
+    def print_statistics(self):
+        statistics = collect_statistics(self.ir)
+        print(f"{statistics['instructions']} instructions "
+              f"({statistics['instruction_bytes']} bytes), "
+              f"{statistics['data_bytes']} bytes of data, "
+              f"{statistics['labels']} labels, "
+              f"{statistics['fixups']} fixups")
+        for mnemonic, count in statistics["mnemonics"].most_common():
+            print(f"    {mnemonic:<8} {count}")
+        print(f"Intermediate code uses {self.ir.memory_usage()} bytes "
+              f"for {len(self.ir)} rows")
@@ -1,10 +1,11 @@
 from fbuilder.operands import (Operand, StringOperand, NumberOperand,
-                               RegisterOperand, JumpOperand, ExpressionOperand,
-                               FlagList)
+                               JumpOperand, ExpressionOperand, FlagList,
+                               OperandError, register_operand, INDIRECT,
+                               PREFIX, POSTFIX, INCREMENT, DECREMENT)
 from fbuilder.operands import JMP_COND_ZERO, JMP_COND_CARRY
 #from fbuilder.emitter import *
 
-from lark import Token
+from lark import Token, Tree
 from lark.visitors import Interpreter
 
 
@@ -23,32 +24,119 @@ class MacroDefinition:
 
 
 class VmForthAssembler(Interpreter):
-    def __init__(self, emitter, symbol_table):
-        self.constants = {}
+    def __init__(self, emitter, symbol_table, thread_cell_size=4):
+        # size in bytes of the cells in threaded code
+        self.thread_cell_size = thread_cell_size
+        self.constants = {"THREADCELL": thread_cell_size}
         self.macros = {}
         self.macro_call_number = 0
         self.macro_scope = {}
 
         self.word_addresses = {}
+        self.word_ranges = []
+        self.definition_count = 0
+        self.current_address_count = 0
         self.previous_word_start = 0x0
 
         self.emitter = emitter
         self.symbol_table = symbol_table
-        self.labels = set()
+        # label name -> line it was marked on
+        self.labels = {}
+        # rule name -> method visiting its nodes
+        self._handlers = {}
+
+    def visit(self, tree):
+        # Lark looks up the method of every node by its rule name, a token
+        # that compares much slower than a string against the names of the
+        # methods. All nodes of a rule share the same token, so the methods
+        # are found by identity in the cache instead.
+        try:
+            handler = self._handlers[tree.data]
+        except KeyError:
+            handler = self._handlers[tree.data] = getattr(self, tree.data)
+        return handler(tree)
+
+    def visit_children(self, tree):
+        return [self.visit(child) if isinstance(child, Tree) else child
+                for child in tree.children]
 
     def _get_cfa_from_word(self, word):
         if word in self.word_addresses:
             return self.word_addresses[word]
         else:
-            return 0x0
+            return None
+
+    def _emit_thread_cell(self, data):
+        if self.thread_cell_size == 2:
+            self.emitter.emit_data_16(data)
+        else:
+            self.emitter.emit_data_32(data)
+
+    def _definition_label(self, word_name, field):
+        # Labels unique to one definition. References to words, back-links
+        # and symbol ranges use these instead of plain addresses, so that
+        # later stages can still move code around and words that get
+        # redefined keep resolving to the definition visible at the time.
+        return f"__{word_name.lower()}_{field}_{self.definition_count}"
+
+    def _macro_label(self, label_name):
+        # labels starting with ' are local to the expansion of a macro
+        if label_name[0] == "'":
+            label_name += f"_{self.macro_call_number}"
+        return label_name
+
+    def _current_address_label(self):
+        label_name = f"__here_{self.current_address_count}"
+        self.current_address_count += 1
+        return label_name
+
+    @staticmethod
+    def _word_names(tree):
+        """Return the name and the alias of a word definition, the alias is
+        empty for words without one"""
+        # the type of the definition, the alias with its separator if there
+        # is one and the name are the only tokens of a definition
+        tokens = [child for child in tree.children if isinstance(child, Token)]
+        if len(tokens) == 4:
+            return str(tokens[3]), str(tokens[2])
+        return str(tokens[1]), ""
+
+    def declare(self, definition):
+        """Take over the constants, macros and words of a definition without
+        assembling it, so the definitions following it can be assembled on
+        their own"""
+        if definition.data in ("constant_definition", "macro_definition"):
+            self.visit(definition)
+        elif definition.data in ("assembly_definition",
+                                 "general_word_definition"):
+            word_name, alias_name = self._word_names(definition)
+            lfa_label = self._definition_label(word_name, "lfa")
+            cfa_label = self._definition_label(word_name, "cfa")
+            self.definition_count += 1
+            self.previous_word_start = JumpOperand(lfa_label)
+            self.word_addresses[word_name] = cfa_label
+            if alias_name != "":
+                self.word_addresses[alias_name] = cfa_label
 
     def start(self, tree):
+        self.begin()
+        self.visit_children(tree)
+        self.finish()
+
+    def begin(self):
         self.emitter.mark_label("__last_cfa")
         self.emitter.mark_label("__last_end")
-        self.visit_children(tree)
 
+    def finish(self):
         self.emitter.finalize()
 
+        # add symbols to symbol table, now that all addresses are final
+        labels = self.emitter.labels
+        for word_name, start_label, end_label in self.word_ranges:
+            self.symbol_table.add_word(word_name,
+                                       labels[start_label],
+                                       labels[end_label])
+
     def assembly_definition(self, tree):
         flags = 0x0
         next_index = 0
@@ -61,18 +149,23 @@ class VmForthAssembler(Interpreter):
         custom_def = tree.children[next_index]
         next_index += 1
 
-        current_position = self.emitter.get_current_code_address()
-        # Append back-link
-        self.emitter.emit_data_32(self.previous_word_start)
-        self.previous_word_start = current_position
-
-        # Append length and word text
         alias_name = ""
         if tree.children[next_index].type == "ALIAS_SEP":
             alias_name = str(tree.children[next_index + 1])
             word_name = str(tree.children[next_index + 2])
         else:
             word_name = str(tree.children[next_index])
+        lfa_label = self._definition_label(word_name, "lfa")
+        cfa_label = self._definition_label(word_name, "cfa")
+        end_label = self._definition_label(word_name, "end")
+        self.definition_count += 1
+
+        # Append back-link
+        self.emitter.mark_label(lfa_label)
+        self.emitter.emit_data_32(self.previous_word_start)
+        self.previous_word_start = JumpOperand(lfa_label)
+
+        # Append length and word text
         self.emitter.mark_label(word_name.lower() + "_nfa")
         self.emitter.mark_label("__last_nfa")
         self.emitter.emit_data_8(len(word_name) | flags)
@@ -81,12 +174,11 @@ class VmForthAssembler(Interpreter):
         # creating a label for the word and the alias
         self.emitter.mark_label(word_name.lower() + "_cfa")
         self.emitter.mark_label("__last_cfa")
-        self.word_addresses[word_name] = \
-            self.emitter.get_current_code_address()
+        self.emitter.mark_label(cfa_label)
+        self.word_addresses[word_name] = cfa_label
         if alias_name != "":
             self.emitter.mark_label(alias_name.lower() + "_cfa")
-            self.word_addresses[alias_name] = \
-                self.emitter.get_current_code_address()
+            self.word_addresses[alias_name] = cfa_label
 
         # Append CFA field which is just the current address +4 for code words
         custom_type_macro = f"__DEF{custom_def.upper()}_CFA"
@@ -98,19 +190,15 @@ class VmForthAssembler(Interpreter):
         # creating a label for address after word
         self.emitter.mark_label(word_name.lower() + "_end")
         self.emitter.mark_label("__last_end")
+        self.emitter.mark_label(end_label)
         if alias_name != "":
             self.emitter.mark_label(alias_name.lower() + "_end")
 
-        # add symbol to symbol table
-        self.symbol_table.add_word(
-            word_name.lower(),
-            current_position,
-            self.emitter.get_current_code_address())
+        # remember the symbol for the symbol table
+        self.word_ranges.append((word_name.lower(), lfa_label, end_label))
         if alias_name != "":
-            self.symbol_table.add_word(
-                alias_name.lower(),
-                current_position,
-                self.emitter.get_current_code_address())
+            self.word_ranges.append((alias_name.lower(), lfa_label,
+                                     end_label))
 
     def general_word_definition(self, tree):
         flags = 0x0
@@ -124,18 +212,23 @@ class VmForthAssembler(Interpreter):
         custom_def = tree.children[next_index]
         next_index += 1
 
-        current_position = self.emitter.get_current_code_address()
-        # Append back-link
-        self.emitter.emit_data_32(self.previous_word_start)
-        self.previous_word_start = current_position
-
-        # Append length and word text
         alias_name = ""
         if tree.children[next_index].type == "ALIAS_SEP":
             alias_name = str(tree.children[next_index + 1])
             word_name = str(tree.children[next_index + 2])
         else:
             word_name = str(tree.children[next_index])
+        lfa_label = self._definition_label(word_name, "lfa")
+        cfa_label = self._definition_label(word_name, "cfa")
+        end_label = self._definition_label(word_name, "end")
+        self.definition_count += 1
+
+        # Append back-link
+        self.emitter.mark_label(lfa_label)
+        self.emitter.emit_data_32(self.previous_word_start)
+        self.previous_word_start = JumpOperand(lfa_label)
+
+        # Append length and word text
         self.emitter.mark_label(word_name.lower() + "_nfa")
         self.emitter.mark_label("__last_nfa")
         self.emitter.emit_data_8(len(word_name) | flags)
@@ -144,12 +237,11 @@ class VmForthAssembler(Interpreter):
         # creating a label for the word and the alias
         self.emitter.mark_label(word_name.lower() + "_cfa")
         self.emitter.mark_label("__last_cfa")
-        self.word_addresses[word_name] = \
-            self.emitter.get_current_code_address()
+        self.emitter.mark_label(cfa_label)
+        self.word_addresses[word_name] = cfa_label
         if alias_name != "":
             self.emitter.mark_label(alias_name.lower() + "_cfa")
-            self.word_addresses[alias_name] = \
-                self.emitter.get_current_code_address()
+            self.word_addresses[alias_name] = cfa_label
 
         # Append CFA field which is just the current address +4 for code words
         custom_type_macro = f"__DEF{custom_def.upper()}_CFA"
@@ -161,13 +253,12 @@ class VmForthAssembler(Interpreter):
         # creating a label for address after word
         self.emitter.mark_label(word_name.lower() + "_end")
         self.emitter.mark_label("__last_end")
+        self.emitter.mark_label(end_label)
         if alias_name != "":
             self.emitter.mark_label(alias_name.lower() + "_end")
 
-        # add symbol to symbol table
-        self.symbol_table.add_word(word_name.lower(),
-                                   current_position,
-                                   self.emitter.get_current_code_address())
+        # remember the symbol for the symbol table
+        self.word_ranges.append((word_name.lower(), lfa_label, end_label))
 
     def macro_definition(self, tree):
         macro_name = str(tree.children[0])
@@ -197,52 +288,74 @@ class VmForthAssembler(Interpreter):
                               in tree.children[1:]][0]
         else:
             parameters = []
-        if mnemonic == "add":
-            self.emitter.emit_add(parameters[0], parameters[1], parameters[2])
-        elif mnemonic == "and":
-            self.emitter.emit_and(parameters[0], parameters[1], parameters[2])
-        elif mnemonic == "call":
-            self.emitter.emit_call(parameters[0])
-        elif mnemonic == "sub":
-            self.emitter.emit_sub(parameters[0], parameters[1], parameters[2])
-        elif mnemonic == "or":
-            self.emitter.emit_or(parameters[0], parameters[1], parameters[2])
-        elif mnemonic == "xor":
-            self.emitter.emit_xor(parameters[0], parameters[1], parameters[2])
-        elif mnemonic == "sra":
-            self.emitter.emit_sra(parameters[0], parameters[1])
-        elif mnemonic == "sll":
-            self.emitter.emit_sll(parameters[0], parameters[1])
-        elif mnemonic == "db":
-            if isinstance(parameters[0], StringOperand):
-                self.emitter.emit_data_string(parameters[0].string)
-            else:
+        if suffix == "t":
+            # thread cell sized, depending on the image format
+            suffix = "h" if self.thread_cell_size == 2 else "w"
+        try:
+            if mnemonic == "add":
+                self.emitter.emit_add(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "and":
+                self.emitter.emit_and(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "call":
+                self.emitter.emit_call(parameters[0])
+            elif mnemonic == "sub":
+                self.emitter.emit_sub(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "or":
+                self.emitter.emit_or(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "xor":
+                self.emitter.emit_xor(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "mul":
+                self.emitter.emit_mul(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "divmod":
+                self.emitter.emit_divmod(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "bmove":
+                self.emitter.emit_bmove(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "bfill":
+                self.emitter.emit_bfill(parameters[0], parameters[1], parameters[2])
+            elif mnemonic == "sra":
+                self.emitter.emit_sra(parameters[0], parameters[1])
+            elif mnemonic == "sll":
+                self.emitter.emit_sll(parameters[0], parameters[1])
+            elif mnemonic == "db":
+                if isinstance(parameters[0], StringOperand):
+                    self.emitter.emit_data_string(parameters[0].string)
+                else:
+                    if isinstance(parameters[0], NumberOperand) and \
+                            parameters[0].number > 0xff:
+                        raise ValueError(f"constant 0x{parameters[0].number:x} is too big for db on line {tree.children[0].line}")
+                    self.emitter.emit_data_8(parameters[0])
+            elif mnemonic == "dh":
                 if isinstance(parameters[0], NumberOperand) and \
-                        parameters[0].number > 0xff:
-                    raise ValueError(f"constant 0x{parameters[0].number:x} is too big for db on line {tree.children[0].line}")
-                self.emitter.emit_data_8(parameters[0])
-        elif mnemonic == "dw":
-            self.emitter.emit_data_32(parameters[0])
-        elif mnemonic == "ifkt":
-            self.emitter.emit_ifkt(parameters[0])
-        elif mnemonic == "jc":
-            self.emitter.emit_conditional_jump(JMP_COND_CARRY, parameters[0])
-        elif mnemonic == "jmp":
-            self.emitter.emit_jump(parameters[0])
-        elif mnemonic == "jz":
-            self.emitter.emit_conditional_jump(JMP_COND_ZERO, parameters[0])
-        elif mnemonic == "mov":
-            self.emitter.emit_mov(suffix, parameters[0], parameters[1])
-        elif mnemonic in ["pushd", "pushr", "popd", "popr"]:
-            if suffix == "b":
-                raise ValueError(f"{mnemonic} only supports word-sized mode on line {tree.children[0].line}")
-            self.emitter.emit_stack_op(mnemonic[:-1], mnemonic[-1], parameters[0])
-        elif mnemonic == "nop":
-            self.emitter.emit_nop()
-        elif mnemonic == "illegal":
-            self.emitter.emit_illegal()
-        else:
-            raise ValueError(f"Opcode '{mnemonic}' currently not implemented on line {tree.children[0].line}")
+                        parameters[0].number > 0xffff:
+                    raise ValueError(f"constant 0x{parameters[0].number:x} is too big for dh on line {tree.children[0].line}")
+                self.emitter.emit_data_16(parameters[0])
+            elif mnemonic == "dw":
+                self.emitter.emit_data_32(parameters[0])
+            elif mnemonic == "dt":
+                self._emit_thread_cell(parameters[0])
+            elif mnemonic == "ifkt":
+                self.emitter.emit_ifkt(parameters[0])
+            elif mnemonic == "jc":
+                self.emitter.emit_conditional_jump(JMP_COND_CARRY, parameters[0])
+            elif mnemonic == "jmp":
+                self.emitter.emit_jump(parameters[0])
+            elif mnemonic == "jz":
+                self.emitter.emit_conditional_jump(JMP_COND_ZERO, parameters[0])
+            elif mnemonic == "mov":
+                self.emitter.emit_mov(suffix, parameters[0], parameters[1])
+            elif mnemonic in ["pushd", "pushr", "popd", "popr"]:
+                if suffix in ("b", "h"):
+                    raise ValueError(f"{mnemonic} only supports word-sized mode on line {tree.children[0].line}")
+                self.emitter.emit_stack_op(mnemonic[:-1], mnemonic[-1], parameters[0])
+            elif mnemonic == "nop":
+                self.emitter.emit_nop()
+            elif mnemonic == "illegal":
+                self.emitter.emit_illegal()
+            else:
+                raise ValueError(f"Opcode '{mnemonic}' currently not implemented on line {tree.children[0].line}")
+        except OperandError as error:
+            raise ValueError(f"{error} on line {tree.children[0].line}") \
+                from None
 
     def macro_call(self, tree):
         macro_name = str(tree.children[0])
@@ -271,27 +384,26 @@ class VmForthAssembler(Interpreter):
         return self.visit(tree.children[0])
 
     def register(self, tree):
-        return RegisterOperand(tree.children[0])
+        return register_operand(tree.children[0])
 
     def register_indirect(self, tree):
         return self.visit(tree.children[0])
 
     def register_plain_indirect(self, tree):
-        return RegisterOperand(tree.children[0], "indirect")
+        return register_operand(tree.children[0], INDIRECT)
 
     def register_indirect_prefix(self, tree):
-        operation = "increment"
+        operation = INCREMENT
         if self.visit(tree.children[0]) == "--":
-            operation = "decrement"
-        return RegisterOperand(tree.children[1], "indirect", "prefix",
-                               operation)
+            operation = DECREMENT
+        return register_operand(tree.children[1], INDIRECT | PREFIX | operation)
 
     def register_indirect_postfix(self, tree):
-        operation = "increment"
+        operation = INCREMENT
         if self.visit(tree.children[1]) == "--":
-            operation = "decrement"
-        return RegisterOperand(tree.children[0], "indirect", "postfix",
-                               operation)
+            operation = DECREMENT
+        return register_operand(tree.children[0],
+                                INDIRECT | POSTFIX | operation)
 
     def immediate_number(self, tree):
         number_node = tree.children[0]
@@ -306,23 +418,21 @@ class VmForthAssembler(Interpreter):
         return StringOperand(string_node[1:-1])
 
     def label(self, tree):
-        label_name = str(tree.children[0])
-        if label_name[0] == "'":
-            label_name += f"_{self.macro_call_number}"
+        label_name = self._macro_label(str(tree.children[0]))
         if label_name in self.labels:
             raise ValueError(f"duplicate label '{label_name}' on line {tree.children[0].line}")
         else:
-            self.labels.add(label_name)
+            self.labels[label_name] = tree.children[0].line
         self.emitter.mark_label(label_name)
 
     def word(self, tree):
         word = str(tree.children[0])
         cfa = self._get_cfa_from_word(word)
-        if cfa == 0:
+        if cfa is None:
             if word.endswith(":"):
                 self.emitter.mark_label(word[:-1])
             elif word.startswith(":"):
-                self.emitter.emit_label_target(word[1:])
+                self._emit_thread_cell(JumpOperand(word[1:]))
             elif word.startswith("#0x"):
                 self.emitter.emit_data_32(int(word[3:], 16))
             elif word.startswith("0x"):
@@ -336,13 +446,10 @@ class VmForthAssembler(Interpreter):
             else:
                 raise ValueError(f"Word '{word}' not found in current dictionary on line {tree.children[0].line}")
         else:
-            self.emitter.emit_data_32(cfa)
+            self._emit_thread_cell(JumpOperand(cfa))
 
     def jump_target(self, tree):
-        label_name = tree.children[0]
-        if label_name[0] == "'":
-            label_name += f"_{self.macro_call_number}"
-        return JumpOperand(label_name)
+        return JumpOperand(self._macro_label(str(tree.children[0])))
 
     def expression(self, tree):
         def local_visit(node):
@@ -353,19 +460,18 @@ class VmForthAssembler(Interpreter):
                 return self.visit(node)
         elements = [local_visit(node) for node in tree.children]
 
-        if all(isinstance(element, Operand) and element.is_constant() for element in elements):
-            value = self.visit(tree.children[0])
-            expression_rest = tree.children[1:]
-            for operator, value_node in zip(expression_rest[::2],
-                                            expression_rest[1::2]):
-                operand = self.visit(value_node)
-                if str(operator) == "+":
-                    value.number += operand.number
-                else:
-                    value.number -= operand.number
-            return value
-        else:
-            return ExpressionOperand(elements)
+        if len(elements) == 1 and elements[0].is_constant():
+            return elements[0]
+        try:
+            expression = ExpressionOperand(elements)
+        except ValueError as error:
+            # only expressions with operators fail
+            raise ValueError(f"{error} on line {elements[1].line}") \
+                from None
+        value = expression.constant_value()
+        if value is not None:
+            return NumberOperand(value)
+        return expression
 
     def term(self, tree):
         return self.visit(tree.children[0])
@@ -377,7 +483,9 @@ class VmForthAssembler(Interpreter):
         return self.visit(self.macro_scope[parameter_name])
 
     def current_address(self, tree):
-        return NumberOperand(self.emitter.get_current_code_address())
+        label_name = self._current_address_label()
+        self.emitter.mark_label(label_name)
+        return JumpOperand(label_name)
 
     def decrement_increment(self, tree):
         return str(tree.children[0])
@@ -0,0 +1,259 @@
+from fbuilder.emitter import (NOP, MOVR_W, MOVR_B, MOVR_H, MOVS_ID_W,
+                              MOVS_ID_B, MOVS_ID_H, MOVS_DI_W, MOVS_DI_B,
+                              MOVS_DI_H, MOVI_ACC1, MOVI_ACC2,
+                              ADDR_W, SUBR_W, ORR_W, ANDR_W, XORR_W, SRA_W,
+                              SLLR_W, MULR_W, DIVMODR_W, BMOVE, BFILL,
+                              JMPI_R, JMPD_R,
+                              JMPD, JZ, JC, CALL, JMPD_S, JZ_S, JC_S, CALL_S,
+                              PUSHRD_W, POPRD_W, PUSHRR_W, POPRR_W, IFTK,
+                              ILLEGAL)
+from fbuilder.ir import INSTRUCTION, DATA, STRING
+from fbuilder.operands import reg_encoding, evaluate_expressions
+from collections import Counter
+import struct
+
+_register_names = {encoding: f"%{name}"
+                   for name, encoding in reg_encoding.items()}
+
+_alu_mnemonics = {
+    ADDR_W: "add",
+    SUBR_W: "sub",
+    ORR_W: "or",
+    ANDR_W: "and",
+    XORR_W: "xor",
+}
+
+_double_word_mnemonics = {
+    MULR_W: "mul",
+    DIVMODR_W: "divmod",
+}
+
+_block_mnemonics = {
+    BMOVE: "bmove",
+    BFILL: "bfill",
+}
+
+_move_suffixes = {
+    MOVR_W: "w",
+    MOVR_B: "b",
+    MOVR_H: "h",
+    MOVS_ID_W: "w",
+    MOVS_ID_B: "b",
+    MOVS_ID_H: "h",
+    MOVS_DI_W: "w",
+    MOVS_DI_B: "b",
+    MOVS_DI_H: "h",
+}
+
+_data_directives = {
+    1: "db",
+    2: "dh",
+    4: "dw",
+}
+
+_jump_mnemonics = {
+    JMPD: "jmp",
+    JZ: "jz",
+    JC: "jc",
+    CALL: "call",
+    JMPD_S: "jmp",
+    JZ_S: "jz",
+    JC_S: "jc",
+    CALL_S: "call",
+}
+
+_stack_mnemonics = {
+    PUSHRD_W: "pushd",
+    POPRD_W: "popd",
+    PUSHRR_W: "pushr",
+    POPRR_W: "popr",
+}
+
+
+def generate_machine_code(ir):
+    """Lay out all rows of the intermediate code and resolve the fixups"""
+    addresses = ir.addresses()
+    labels = ir.resolve_labels(addresses)
+    code = bytearray()
+
+    for row in range(len(ir)):
+        size = ir.sizes[row]
+        kind = ir.kinds[row]
+        if kind == STRING:
+            code += ir.strings[ir.operands[row]]
+        elif kind == DATA:
+            code += ir.operands[row].to_bytes(size, "little")
+        else:
+            code.append(ir.opcodes[row])
+            code += ir.operands[row].to_bytes(size - 1, "little")
+
+    # all expressions are evaluated at once, now that labels are final
+    expression_fixups = [fixup for fixup in ir.fixups if fixup >= 0 and
+                         not isinstance(ir.fixup_targets[fixup], str)]
+    expression_values = dict(zip(expression_fixups, evaluate_expressions(
+        [ir.fixup_targets[fixup] for fixup in expression_fixups], labels)))
+
+    for row, fixup in enumerate(ir.fixups):
+        if fixup < 0:
+            continue
+        target = ir.fixup_targets[fixup]
+        if isinstance(target, str):
+            value = labels[target]
+        else:
+            value = expression_values[fixup]
+        address = addresses[row] + ir.fixup_offsets[fixup]
+        if ir.fixup_relative[fixup]:
+            value -= addresses[row + 1]
+            if not -0x80 <= value <= 0x7f:
+                raise ValueError(f"distance {value} to '{target}' doesn't fit into a short branch")
+            code[address:address+1] = struct.pack("b", value)
+        elif ir.fixup_sizes[fixup] == 1:
+            code[address:address+1] = struct.pack("B", value)
+        elif ir.fixup_sizes[fixup] == 2:
+            if value > 0xffff:
+                raise ValueError(f"address 0x{value:x} of '{target}' doesn't fit into a 16-bit cell")
+            code[address:address+2] = struct.pack("<H", value)
+        else:
+            code[address:address+4] = struct.pack("<I", value)
+
+    return bytes(code)
+
+
+def _fixup_text(ir, row):
+    target = ir.fixup_targets[ir.fixups[row]]
+    if isinstance(target, str):
+        return f":{target}"
+    return str(target)
+
+
+def _indirect(register, operand):
+    name = _register_names[register]
+    if operand & 0x80:
+        operation = "--"
+    else:
+        operation = "++"
+    if operand & 0x40:
+        return f"[{operation}{name}]"
+    return f"[{name}{operation}]"
+
+
+def _instruction_text(ir, row):
+    opcode = ir.opcodes[row]
+    operand = ir.operands[row]
+
+    if opcode == NOP:
+        return "nop"
+    if opcode == ILLEGAL:
+        return "illegal"
+    if opcode == IFTK:
+        return f"ifkt #0x{operand:x}"
+    if opcode in (MOVR_W, MOVR_B, MOVR_H):
+        suffix = _move_suffixes[opcode]
+        target = _register_names[(operand >> 4) & 0x7]
+        source = _register_names[operand & 0x7]
+        if operand & 0x80:
+            target = f"[{target}]"
+        if operand & 0x08:
+            source = f"[{source}]"
+        return f"mov.{suffix} {target}, {source}"
+    if opcode in _move_suffixes:
+        suffix = _move_suffixes[opcode]
+        target = (operand >> 3) & 0x7
+        source = operand & 0x7
+        if opcode in (MOVS_ID_W, MOVS_ID_B, MOVS_ID_H):
+            return f"mov.{suffix} {_indirect(target, operand)}, " \
+                   f"{_register_names[source]}"
+        return f"mov.{suffix} {_register_names[target]}, " \
+               f"{_indirect(source, operand)}"
+    if opcode in (MOVI_ACC1, MOVI_ACC2):
+        target = "%acc1" if opcode == MOVI_ACC1 else "%acc2"
+        if ir.fixups[row] >= 0:
+            return f"mov.w {target}, {_fixup_text(ir, row)}"
+        return f"mov.w {target}, #0x{operand:x}"
+    if opcode in _alu_mnemonics:
+        target = _register_names[(operand >> 4) & 0x7]
+        source1 = _register_names[operand & 0x7]
+        source2 = _register_names[(operand >> 8) & 0x7]
+        return f"{_alu_mnemonics[opcode]} {target}, {source1}, {source2}"
+    if opcode in _double_word_mnemonics:
+        low = _register_names[(operand >> 4) & 0x7]
+        high = _register_names[operand & 0x7]
+        source = _register_names[(operand >> 8) & 0x7]
+        return f"{_double_word_mnemonics[opcode]} {low}, {high}, {source}"
+    if opcode in _block_mnemonics:
+        target = _register_names[(operand >> 4) & 0x7]
+        source = _register_names[operand & 0x7]
+        count = _register_names[(operand >> 8) & 0x7]
+        return f"{_block_mnemonics[opcode]} {target}, {source}, {count}"
+    if opcode in (SRA_W, SLLR_W):
+        mnemonic = "sra" if opcode == SRA_W else "sll"
+        return f"{mnemonic} {_register_names[operand >> 5]}, " \
+               f"#{operand & 0x1f}"
+    if JMPI_R <= opcode < JMPI_R + 8:
+        return f"jmp [{_register_names[opcode - JMPI_R]}]"
+    if JMPD_R <= opcode < JMPD_R + 8:
+        return f"jmp {_register_names[opcode - JMPD_R]}"
+    if opcode in _jump_mnemonics:
+        return f"{_jump_mnemonics[opcode]} {_fixup_text(ir, row)}"
+    if (opcode & 0xf8) in _stack_mnemonics:
+        return f"{_stack_mnemonics[opcode & 0xf8]} " \
+               f"{_register_names[opcode & 0x7]}"
+    return f"unknown #0x{opcode:02x}"
+
+
+def _row_text(ir, row):
+    kind = ir.kinds[row]
+    if kind == STRING:
+        text = ir.strings[ir.operands[row]].decode("utf-8")
+        return f"ds \"{text}\""
+    if kind == DATA:
+        directive = _data_directives[ir.sizes[row]]
+        if ir.fixups[row] >= 0:
+            return f"{directive} {_fixup_text(ir, row)}"
+        return f"{directive} #0x{ir.operands[row]:x}"
+    return _instruction_text(ir, row)
+
+
+def generate_listing(ir):
+    """Return the disassembly listing of the intermediate code including the
+    resolved machine code of every row"""
+    addresses = ir.addresses()
+    code = generate_machine_code(ir)
+
+    listing = []
+    label = 0
+    for row in range(len(ir)):
+        while label < len(ir.label_rows) and ir.label_rows[label] == row:
+            listing.append(f"    {ir.label_names[label]}:\n")
+            label += 1
+        address = addresses[row]
+        machine_code = " ".join(
+            f"{n:02x}" for n in code[address:address + ir.sizes[row]])
+        listing.append(f"{address:08x}: {machine_code:<18} "
+                       f"{_row_text(ir, row)}\n")
+    for name in ir.label_names[label:]:
+        listing.append(f"    {name}:\n")
+
+    return "".join(listing)
+
+
+def collect_statistics(ir):
+    """Count rows and bytes per kind and how often each instruction is
+    used"""
+    statistics = {
+        "instructions": 0,
+        "instruction_bytes": 0,
+        "data_bytes": 0,
+        "labels": len(ir.label_names),
+        "fixups": sum(1 for fixup in ir.fixups if fixup >= 0),
+        "mnemonics": Counter(),
+    }
+    for row in range(len(ir)):
+        if ir.kinds[row] == INSTRUCTION:
+            statistics["instructions"] += 1
+            statistics["instruction_bytes"] += ir.sizes[row]
+            mnemonic = _instruction_text(ir, row).split()[0]
+            statistics["mnemonics"][mnemonic] += 1
+        else:
+            statistics["data_bytes"] += ir.sizes[row]
+    return statistics
@@ -0,0 +1,128 @@
+"""On-disk cache of assembled programs.
+
+Programs are found by a hash of everything their output depends on: the
+source, every file it includes, the options and the grammar and sources of
+the FBuilder itself. Included files are found by searching the text for
+include statements instead of parsing it, an include within a comment only
+adds the file to the hash. Entries not used for the longest time are removed
+once the cache grows beyond its size.
+"""
+from dataclasses import dataclass
+import functools
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import re
+
+INCLUDE_PATTERN = re.compile(r'\binclude\s+"([^"]*)"')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# options changing the output of the assembler
+KEY_OPTIONS = ("format", "thread_cells", "optimize", "short_branches",
+               "listing")
+
+
+@functools.lru_cache(maxsize=None)
+def fbuilder_version():
+    """Hash of the grammar and the sources of the FBuilder"""
+    digest = hashlib.sha256()
+    package = pathlib.Path(__file__).parent
+    paths = sorted(package.glob("*.py")) + [package / "grammar.lark"]
+    for path in paths:
+        if not path.name.startswith("test_"):
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def included_files(source_code):
+    """Yield the name and text of every file the source includes directly
+    or indirectly, None as text for files that can't be read"""
+    pending = INCLUDE_PATTERN.findall(source_code)
+    seen = set()
+    while pending:
+        name = pending.pop(0)
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            text = pathlib.Path(name).read_text()
+        except OSError:
+            yield name, None
+            continue
+        yield name, text
+        pending += INCLUDE_PATTERN.findall(text)
+
+
+@dataclass
+class CacheEntry:
+    output: object
+    word_ranges: list
+    labels: dict
+    listing: str = None
+
+
+class BuildCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+
+    def key(self, source_code, options):
+        """Hash of the source with all files it includes, read relative to
+        the working directory like the assembler does, and the options"""
+        digest = hashlib.sha256(fbuilder_version().encode())
+        key_options = {name: getattr(options, name, None)
+                       for name in KEY_OPTIONS}
+        digest.update(json.dumps(key_options, sort_keys=True).encode())
+        digest.update(source_code.encode())
+
+        for name, text in included_files(source_code):
+            digest.update(b"\0" + name.encode() + b"\0")
+            if text is None:
+                digest.update(b"\0missing")
+            else:
+                digest.update(text.encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.directory / (key + ".pickle")
+
+    def load(self, key):
+        """Return the entry stored for key, None if there is none"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                entry = pickle.load(entry_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError):
+            path.unlink(missing_ok=True)
+            return None
+        # recently used entries are evicted last
+        os.utime(path)
+        return entry
+
+    def store(self, key, entry):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as entry_file:
+            pickle.dump(entry, entry_file)
+        os.replace(temporary_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.directory.glob("*.pickle"):
+            try:
+                status = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((status.st_mtime_ns, status.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
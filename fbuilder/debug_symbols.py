@@ -1,3 +1,6 @@
+from .symbol_file import write_symbol_file
+
+
 class WordCollection:
     def __init__(self):
         self.word_ranges = []
@@ -12,3 +15,6 @@ class WordCollection:
         with open(file_path, "w") as dump_file:
             for word_range in self.word_ranges:
                 dump_file.write(f"\"{word_range[0]}\",{word_range[1]},{word_range[2]}\n")
+
+    def dump_to_binary_file(self, file_path):
+        write_symbol_file(file_path, self.word_ranges)
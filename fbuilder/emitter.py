@@ -1,5 +1,5 @@
-from fbuilder.operands import JMP_COND_ZERO
-from fbuilder.operands import ExpressionOperand, JumpOperand, NumberOperand, RegisterOperand
+from fbuilder.operands import ExpressionOperand, JumpOperand, NumberOperand, RegisterOperand, \
+    OperandError, DECREMENT, PREFIX
 import struct
 
 NOP = 0x00
@@ -11,6 +11,9 @@ MOVS_DI_W = 0x24    # direct <-- indirect move
 MOVS_DI_B = 0x25    # direct <-- indirect move (byte)
 MOVI_ACC1 = 0x26
 MOVI_ACC2 = 0x27
+MOVR_H = 0x28
+MOVS_ID_H = 0x29    # indirect <-- direct move (halfword)
+MOVS_DI_H = 0x2A    # direct <-- indirect move (halfword)
 ADDR_W = 0x30
 SUBR_W = 0x32
 ORR_W = 0x34
@@ -18,12 +21,20 @@ ANDR_W = 0x36
 XORR_W = 0x38
 SRA_W = 0x3c
 SLLR_W = 0x3e
+MULR_W = 0x40
+DIVMODR_W = 0x42
+BMOVE = 0x44
+BFILL = 0x46
 JMPI_R = 0x60
 JMPD_R = 0x68
 JMPD = 0x70
 JZ = 0x71
 JC = 0x72
 CALL = 0x73
+JMPD_S = 0x74     # jumps with a signed 8-bit displacement
+JZ_S = 0x75
+JC_S = 0x76
+CALL_S = 0x77
 PUSHRD_W = 0xA0
 POPRD_W = 0xA8
 PUSHRR_W = 0xB0
@@ -43,29 +54,23 @@ class MachineCodeEmitter:
         self.jumps = {}
 
     def finalize(self):
-        code_buffer = self.binary_code
+        code_buffer = bytearray(self.binary_code)
 
         for address, label in self.jumps.items():
-            changed_code = code_buffer[:address]
-            changed_code += struct.pack("<I", self.labels[label])
-            changed_code += code_buffer[address+4:]
-
-            code_buffer = changed_code
+            code_buffer[address:address+4] = \
+                struct.pack("<I", self.labels[label])
 
         for address, expression in self.expressions.items():
             value = expression.evaluate(self.labels)
 
-            changed_code = code_buffer[:address]
             if expression.operand_size == 8:
-                changed_code += struct.pack("B", value)
-                changed_code += code_buffer[address+1:]
+                code_buffer[address:address+1] = struct.pack("B", value)
+            elif expression.operand_size == 16:
+                code_buffer[address:address+2] = struct.pack("<H", value)
             else:
-                changed_code += struct.pack("<I", value)
-                changed_code += code_buffer[address+4:]
-
-            code_buffer = changed_code
+                code_buffer[address:address+4] = struct.pack("<I", value)
 
-        self.binary_code = code_buffer
+        self.binary_code = bytes(code_buffer)
 
     def get_current_code_address(self):
         return len(self.binary_code)
@@ -82,6 +87,8 @@ class MachineCodeEmitter:
         self.expressions[self.get_current_code_address()] = expression
         if operand_size == 8:
             self.binary_code += struct.pack("B", 0x0)
+        elif operand_size == 16:
+            self.binary_code += struct.pack("<H", 0x0)
         else:
             self.binary_code += struct.pack("<I", 0x0)
 
@@ -151,6 +158,50 @@ class MachineCodeEmitter:
 
         self.binary_code += struct.pack("BBB", opcode, operand1, operand2)
 
+    def emit_mul(self, low_reg, high_reg, source_reg):
+        opcode = MULR_W
+        operand1 = 0x0
+        operand2 = 0x0
+
+        operand1 |= (low_reg.encoding << 4)
+        operand1 |= high_reg.encoding
+        operand2 |= source_reg.encoding
+
+        self.binary_code += struct.pack("BBB", opcode, operand1, operand2)
+
+    def emit_divmod(self, low_reg, high_reg, source_reg):
+        opcode = DIVMODR_W
+        operand1 = 0x0
+        operand2 = 0x0
+
+        operand1 |= (low_reg.encoding << 4)
+        operand1 |= high_reg.encoding
+        operand2 |= source_reg.encoding
+
+        self.binary_code += struct.pack("BBB", opcode, operand1, operand2)
+
+    def emit_bmove(self, target_reg, source_reg, count_reg):
+        opcode = BMOVE
+        operand1 = 0x0
+        operand2 = 0x0
+
+        operand1 |= (target_reg.encoding << 4)
+        operand1 |= source_reg.encoding
+        operand2 |= count_reg.encoding
+
+        self.binary_code += struct.pack("BBB", opcode, operand1, operand2)
+
+    def emit_bfill(self, target_reg, value_reg, count_reg):
+        opcode = BFILL
+        operand1 = 0x0
+        operand2 = 0x0
+
+        operand1 |= (target_reg.encoding << 4)
+        operand1 |= value_reg.encoding
+        operand2 |= count_reg.encoding
+
+        self.binary_code += struct.pack("BBB", opcode, operand1, operand2)
+
     def emit_sra(self, reg, value):
         opcode = SRA_W
         operand = value.number & 0x1F
@@ -180,6 +231,17 @@ class MachineCodeEmitter:
         else:
             self.binary_code += struct.pack("B", data)
 
+    def emit_data_16(self, data):
+        if isinstance(data, ExpressionOperand):
+            self._insert_expression_marker(data, operand_size=16)
+        elif isinstance(data, JumpOperand):
+            self._insert_expression_marker(ExpressionOperand([data]),
+                                           operand_size=16)
+        elif isinstance(data, NumberOperand):
+            self.binary_code += struct.pack("<H", data.number)
+        else:
+            self.binary_code += struct.pack("<H", data)
+
     def emit_data_32(self, data):
         if isinstance(data, ExpressionOperand):
             self._insert_expression_marker(data)
@@ -208,7 +270,7 @@ class MachineCodeEmitter:
             elif target.name == "acc2":
                 self.binary_code += struct.pack("<B", MOVI_ACC2)
             else:
-                raise ValueError(f"label can only be moved to acc1 or acc2 on line {target.line_no}")
+                raise OperandError("label can only be moved to acc1 or acc2")
             self._insert_jump_marker(source.jump_target)
         elif isinstance(source, ExpressionOperand):
             if target.name == "acc1":
@@ -216,7 +278,7 @@ class MachineCodeEmitter:
             elif target.name == "acc2":
                 self.binary_code += struct.pack("<B", MOVI_ACC2)
             else:
-                raise ValueError(f"label can only be moved to acc1 or acc2 on line {target.line_no}")
+                raise OperandError("label can only be moved to acc1 or acc2")
             self._insert_expression_marker(source)
         elif isinstance(source, NumberOperand):
             if target.name == "acc1":
@@ -226,28 +288,31 @@ class MachineCodeEmitter:
                 self.binary_code += struct.pack("<BI", MOVI_ACC2,
                                                 source.number)
             else:
-                raise ValueError(f"immediate value can only be moved to acc1 or acc2 on line {target.line_no}")
-        elif target.is_("increment") or target.is_("decrement") or \
-                source.is_("increment") or source.is_("decrement"):
+                raise OperandError("immediate value can only be moved to acc1 or acc2")
+        elif target.is_incrementing or source.is_incrementing:
             if target.is_indirect:
                 if source.is_indirect:
-                    raise ValueError(f"only one argument can be register indirect for movs on line {target.line_no}")
+                    raise OperandError("only one argument can be register indirect for movs")
                 if suffix == "b":
                     opcode = MOVS_ID_B
+                elif suffix == "h":
+                    opcode = MOVS_ID_H
                 else:
                     opcode = MOVS_ID_W
-                if target.is_("decrement"):
+                if target.mode & DECREMENT:
                     operand |= 0x80
-                if target.is_("prefix"):
+                if target.mode & PREFIX:
                     operand |= 0x40
             else:
                 if suffix == "b":
                     opcode = MOVS_DI_B
+                elif suffix == "h":
+                    opcode = MOVS_DI_H
                 else:
                     opcode = MOVS_DI_W
-                if source.is_("decrement"):
+                if source.mode & DECREMENT:
                     operand |= 0x80
-                if source.is_("prefix"):
+                if source.mode & PREFIX:
                     operand |= 0x40
             operand |= (target.encoding << 3)
             operand |= source.encoding
@@ -255,6 +320,8 @@ class MachineCodeEmitter:
         else:
             if suffix == "b":
                 opcode = MOVR_B
+            elif suffix == "h":
+                opcode = MOVR_H
             else:
                 opcode = MOVR_W
             indirect_target = 0x0
@@ -295,235 +362,3 @@ class MachineCodeEmitter:
             self.binary_code += struct.pack("B", JMPD)
             self._insert_expression_marker(target)
 
-
-class DisassemblyEmitter:
-    def __init__(self):
-        self.disassembly = ""
-
-        self.binary_emitter = MachineCodeEmitter()
-
-    def finalize(self):
-        self.binary_emitter.finalize()
-        for label, address in self.binary_emitter.labels.items():
-            assembly = struct.pack("<I", address)
-            self.disassembly = self.disassembly.replace(
-                f"@@@@{label}@@@@",
-                " ".join(map(lambda n: f"{n:02x}", assembly))
-            )
-
-    def get_current_code_address(self):
-        return self.binary_emitter.get_current_code_address()
-
-    def mark_label(self, label):
-        self.disassembly += f"    {label}:\n"
-        self.binary_emitter.mark_label(label)
-
-    def emit_add(self, target_reg, source1_reg, source2_reg):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_add(target_reg, source1_reg, source2_reg)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} add {target_reg}, {source1_reg}, {source2_reg}\n"
-
-    def emit_call(self, target):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_call(target)
-
-        self.disassembly += f"{previous_pos:08x}: "
-        self.disassembly += f"{CALL:2x} @@@@{target}@@@@     call {target}\n"
-
-    def emit_sub(self, target_reg, source1_reg, source2_reg):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_sub(target_reg, source1_reg, source2_reg)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} sub {target_reg}, {source1_reg}, {source2_reg}\n"
-
-    def emit_or(self, target_reg, source1_reg, source2_reg):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_or(target_reg, source1_reg, source2_reg)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} or {target_reg}, {source1_reg}, {source2_reg}\n"
-
-    def emit_and(self, target_reg, source1_reg, source2_reg):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_and(target_reg, source1_reg, source2_reg)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} and {target_reg}, {source1_reg}, {source2_reg}\n"
-
-    def emit_xor(self, target_reg, source1_reg, source2_reg):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_xor(target_reg, source1_reg, source2_reg)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} xor {target_reg}, {source1_reg}, {source2_reg}\n"
-
-    def emit_sra(self, reg, value):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_sra(reg, value)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} sra {reg}, {value}\n"
-
-    def emit_sll(self, reg, value):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_sll(reg, value)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} sll {reg}, {value}\n"
-
-    def emit_conditional_jump(self, condition, target):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_conditional_jump(condition, target)
-
-        self.disassembly += f"{previous_pos:08x}: "
-        if condition == JMP_COND_ZERO:
-            self.disassembly += f"{JZ:2x} @@@@{target}@@@@     jz {target}\n"
-        else:
-            self.disassembly += f"{JC:2x} @@@@{target}@@@@     jc {target}\n"
-
-    def emit_data_8(self, data):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_data_8(data)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        if isinstance(data, ExpressionOperand):
-            self.disassembly += f"{18*' '} db {data}\n"
-        elif isinstance(data, NumberOperand):
-            self.disassembly += f"{machine_code:<18} db #0x{data.number:x}\n"
-        else:
-            self.disassembly += f"{machine_code:<18} db #0x{data:x}\n"
-
-    def emit_data_32(self, data):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_data_32(data)
-
-        self.disassembly += f"{previous_pos:08x}: "
-
-        if isinstance(data, ExpressionOperand):
-            self.disassembly += f"{18*' '} dw {data}\n"
-        elif isinstance(data, JumpOperand):
-            self.disassembly += f"@@@@{data.jump_target}@@@@        dw {data.jump_target}\n"
-        else:
-            new_pos = self.get_current_code_address()
-            new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-            machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-            if not isinstance(data, NumberOperand):
-                data = f"#{data:x}"
-            self.disassembly += f"{machine_code:<18} dw {data}\n"
-
-    def emit_data_string(self, data):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_data_string(data)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} ds \"{data}\"\n"
-
-    def emit_ifkt(self, function_number):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_ifkt(function_number)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} ifkt {function_number}\n"
-
-    def emit_illegal(self):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_illegal()
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} illegal\n"
-
-    def emit_jump(self, target):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_jump(target)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-
-        if isinstance(target, RegisterOperand):
-            machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-            self.disassembly += f"{machine_code:<18} jmp {target}\n"
-        else:
-            self.disassembly += f"{JMPD:2x} @@@@{target}@@@@     jmp {target}\n"
-
-    def emit_label_target(self, label_text):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_label_target(label_text)
-
-        self.disassembly += f"{previous_pos:08x}: "
-        self.disassembly += f"@@@@{label_text}@@@@        dw {label_text}\n"
-
-    def emit_mov(self, suffix, target, source):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_mov(suffix, target, source)
-
-        self.disassembly += f"{previous_pos:08x}: "
-
-        if isinstance(source, JumpOperand):
-            if target.name == "acc1":
-                self.disassembly += f"{MOVI_ACC1:2x} @@@@{source.jump_target}@@@@     mov.w %acc1, {source.jump_target}\n"
-            else:
-                self.disassembly += f"{MOVI_ACC2:2x} @@@@{source.jump_target}@@@@     mov.w %acc1, {source.jump_target}\n"
-        else:
-            new_pos = self.get_current_code_address()
-            new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-            machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-            self.disassembly += f"{machine_code:<18} mov.{suffix} {target}, {source}\n"
-
-    def emit_stack_op(self, operation: str, stack: str, register):
-        previous_pos = self.get_current_code_address()
-        self.binary_emitter.emit_stack_op(operation, stack, register)
-        new_pos = self.get_current_code_address()
-
-        self.disassembly += f"{previous_pos:08x}: "
-        new_assembly = self.binary_emitter.binary_code[previous_pos:new_pos]
-        machine_code = " ".join(map(lambda n: f"{n:02x}", new_assembly))
-
-        self.disassembly += f"{machine_code:<18} {operation}{stack} {register}\n"
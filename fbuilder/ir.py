@@ -0,0 +1,294 @@
+from fbuilder.emitter import MachineCodeEmitter
+from fbuilder.operands import JumpOperand
+from array import array
+import sys
+
+# kinds of rows in the intermediate code
+INSTRUCTION = 0
+DATA = 1
+STRING = 2
+
+_DATA_METHODS = {"emit_data_8", "emit_data_16", "emit_data_32",
+                 "emit_label_target"}
+
+
+class IntermediateCode:
+    """Column oriented representation of an assembled program.
+
+    Every emitted instruction or data item is one row, stored across parallel
+    arrays. Instructions keep their opcode separately and all bytes following
+    the opcode as one little-endian number. Data rows only use the operand
+    column, strings refer to an entry in the string table. Bytes that depend on
+    label addresses are described in the fixup table, labels are kept in a
+    label table pointing to the row they are placed in front of.
+    """
+    def __init__(self):
+        self.kinds = array("B")
+        self.opcodes = array("B")
+        self.operands = array("I")
+        self.sizes = array("I")
+        self.fixups = array("i")
+
+        # fixup table; the target is either a label name or an expression.
+        # Relative fixups store the distance from the end of their row.
+        self.fixup_targets = []
+        self.fixup_offsets = array("B")
+        self.fixup_sizes = array("B")
+        self.fixup_relative = array("B")
+
+        self.strings = []
+
+        # label table in the order labels were marked
+        self.label_names = []
+        self.label_rows = array("I")
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append_row(self, kind, opcode, operand, size, fixup=-1):
+        self.kinds.append(kind)
+        self.opcodes.append(opcode)
+        self.operands.append(operand)
+        self.sizes.append(size)
+        self.fixups.append(fixup)
+
+    def add_fixup(self, target, offset, size, relative=False):
+        self.fixup_targets.append(target)
+        self.fixup_offsets.append(offset)
+        self.fixup_sizes.append(size)
+        self.fixup_relative.append(relative)
+        return len(self.fixup_targets) - 1
+
+    def add_string(self, data):
+        self.strings.append(data)
+        return len(self.strings) - 1
+
+    def mark_label(self, label):
+        self.label_names.append(label)
+        self.label_rows.append(len(self))
+
+    def extend(self, other, rename):
+        """Append the rows of another program, renaming its labels by the
+        function rename"""
+        rows = len(self)
+        fixups = len(self.fixup_targets)
+        strings = len(self.strings)
+
+        self.kinds.extend(other.kinds)
+        self.opcodes.extend(other.opcodes)
+        self.operands.extend(operand + strings if kind == STRING else operand
+                             for kind, operand
+                             in zip(other.kinds, other.operands))
+        self.sizes.extend(other.sizes)
+        self.fixups.extend(fixup + fixups if fixup >= 0 else fixup
+                           for fixup in other.fixups)
+
+        self.fixup_targets.extend(
+            rename(target) if isinstance(target, str)
+            else target.renamed(rename)
+            for target in other.fixup_targets)
+        self.fixup_offsets.extend(other.fixup_offsets)
+        self.fixup_sizes.extend(other.fixup_sizes)
+        self.fixup_relative.extend(other.fixup_relative)
+
+        self.strings.extend(other.strings)
+
+        self.label_names.extend(map(rename, other.label_names))
+        self.label_rows.extend(row + rows for row in other.label_rows)
+
+    def fixup_label(self, row):
+        """Return the label a row refers to, if its fixup is a plain label"""
+        fixup = self.fixups[row]
+        if fixup < 0:
+            return None
+        target = self.fixup_targets[fixup]
+        if isinstance(target, str):
+            return target
+        return None
+
+    def label_positions(self):
+        """Map each label to the row it points to. Labels marked several
+        times point to the row of their last mark."""
+        return dict(zip(self.label_names, self.label_rows))
+
+    def addresses(self):
+        """Return the address of every row plus the address after the last
+        row"""
+        addresses = array("I", [0])
+        address = 0
+        for size in self.sizes:
+            address += size
+            addresses.append(address)
+        return addresses
+
+    def resolve_labels(self, addresses=None):
+        if addresses is None:
+            addresses = self.addresses()
+        return {label: addresses[row]
+                for label, row in zip(self.label_names, self.label_rows)}
+
+    def remove_rows(self, removed):
+        """Remove all rows for which `removed` is set and move labels to the
+        next remaining row"""
+        new_index = array("I")
+        kept = 0
+        for row in range(len(self)):
+            new_index.append(kept)
+            if not removed[row]:
+                kept += 1
+        new_index.append(kept)
+
+        for name in ("kinds", "opcodes", "operands", "sizes", "fixups"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode,
+                                      (value for row, value
+                                       in enumerate(column)
+                                       if not removed[row])))
+        self.label_rows = array("I", (new_index[row]
+                                      for row in self.label_rows))
+
+    def memory_usage(self):
+        """Return the approximate amount of bytes used by the representation"""
+        columns = [self.kinds, self.opcodes, self.operands, self.sizes,
+                   self.fixups, self.fixup_offsets, self.fixup_sizes,
+                   self.fixup_relative, self.label_rows]
+        usage = sum(sys.getsizeof(column) for column in columns)
+
+        tables = [self.fixup_targets, self.strings, self.label_names]
+        usage += sum(sys.getsizeof(table) for table in tables)
+        strings = {id(entry): entry for table in tables for entry in table
+                   if isinstance(entry, (str, bytes))}
+        usage += sum(sys.getsizeof(entry) for entry in strings.values())
+        return usage
+
+class IRBuilder:
+    """Emitter that records everything the assembler emits as intermediate
+    code. The encoding of single instructions is left to the
+    MachineCodeEmitter."""
+    def __init__(self, optimizer=None, relaxation=None):
+        self.ir = IntermediateCode()
+        self.optimizer = optimizer
+        self.relaxation = relaxation
+        self.labels = {}
+
+        self.encoder = MachineCodeEmitter()
+        self.code_address = 0
+
+    def _encode(self, method, *args):
+        encoder = self.encoder
+        encoder.binary_code = b""
+        encoder.jumps = {}
+        encoder.expressions = {}
+        getattr(encoder, method)(*args)
+        code = encoder.binary_code
+
+        # every row has room for a single fixup only
+        if len(encoder.jumps) + len(encoder.expressions) > 1:
+            raise ValueError(f"{method} refers to more than one label")
+        fixup = -1
+        for offset, label in encoder.jumps.items():
+            fixup = self.ir.add_fixup(str(label), offset, 4)
+        for offset, expression in encoder.expressions.items():
+            target = expression
+            if len(expression.expression) == 1 and \
+                    isinstance(expression.expression[0], JumpOperand):
+                target = str(expression.expression[0].jump_target)
+            fixup = self.ir.add_fixup(target, offset,
+                                      expression.operand_size // 8)
+
+        if method == "emit_data_string":
+            self.ir.append_row(STRING, 0, self.ir.add_string(code),
+                               len(code))
+        elif method in _DATA_METHODS:
+            self.ir.append_row(DATA, 0, int.from_bytes(code, "little"),
+                               len(code), fixup)
+        else:
+            self.ir.append_row(INSTRUCTION, code[0],
+                               int.from_bytes(code[1:], "little"),
+                               len(code), fixup)
+        self.code_address += len(code)
+
+    def finalize(self):
+        if self.optimizer is not None:
+            self.optimizer.optimize(self.ir)
+        if self.relaxation is not None:
+            self.relaxation.optimize(self.ir)
+        self.labels = self.ir.resolve_labels()
+
+    def get_current_code_address(self):
+        return self.code_address
+
+    def mark_label(self, label_text):
+        self.ir.mark_label(label_text)
+
+    def emit_label_target(self, label_text):
+        self._encode("emit_label_target", label_text)
+
+    def emit_add(self, target_reg, source1_reg, source2_reg):
+        self._encode("emit_add", target_reg, source1_reg, source2_reg)
+
+    def emit_call(self, target):
+        self._encode("emit_call", target)
+
+    def emit_sub(self, target_reg, source1_reg, source2_reg):
+        self._encode("emit_sub", target_reg, source1_reg, source2_reg)
+
+    def emit_or(self, target_reg, source1_reg, source2_reg):
+        self._encode("emit_or", target_reg, source1_reg, source2_reg)
+
+    def emit_and(self, target_reg, source1_reg, source2_reg):
+        self._encode("emit_and", target_reg, source1_reg, source2_reg)
+
+    def emit_xor(self, target_reg, source1_reg, source2_reg):
+        self._encode("emit_xor", target_reg, source1_reg, source2_reg)
+
+    def emit_mul(self, low_reg, high_reg, source_reg):
+        self._encode("emit_mul", low_reg, high_reg, source_reg)
+
+    def emit_divmod(self, low_reg, high_reg, source_reg):
+        self._encode("emit_divmod", low_reg, high_reg, source_reg)
+
+    def emit_bmove(self, target_reg, source_reg, count_reg):
+        self._encode("emit_bmove", target_reg, source_reg, count_reg)
+
+    def emit_bfill(self, target_reg, value_reg, count_reg):
+        self._encode("emit_bfill", target_reg, value_reg, count_reg)
+
+    def emit_sra(self, reg, value):
+        self._encode("emit_sra", reg, value)
+
+    def emit_sll(self, reg, value):
+        self._encode("emit_sll", reg, value)
+
+    def emit_conditional_jump(self, condition, target):
+        self._encode("emit_conditional_jump", condition, target)
+
+    def emit_data_8(self, data):
+        self._encode("emit_data_8", data)
+
+    def emit_data_16(self, data):
+        self._encode("emit_data_16", data)
+
+    def emit_data_32(self, data):
+        self._encode("emit_data_32", data)
+
+    def emit_data_string(self, data):
+        self._encode("emit_data_string", data)
+
+    def emit_ifkt(self, function_number):
+        self._encode("emit_ifkt", function_number)
+
+    def emit_illegal(self):
+        self._encode("emit_illegal")
+
+    def emit_mov(self, suffix, target, source):
+        self._encode("emit_mov", suffix, target, source)
+
+    def emit_stack_op(self, operation: str, stack: str, register):
+        self._encode("emit_stack_op", operation, stack, register)
+
+    def emit_nop(self):
+        self._encode("emit_nop")
+
+    def emit_jump(self, target):
+        self._encode("emit_jump", target)
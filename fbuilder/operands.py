@@ -1,3 +1,5 @@
+import operator
+
 reg_encoding = {
     "ip": 0x0,
     "wp": 0x1,
@@ -14,33 +16,50 @@ JMP_COND_ZERO = 0x0
 JMP_COND_CARRY = 0x1
 
 
+class OperandError(ValueError):
+    """Operands not allowed for an instruction, the assembler adds the line
+    of the instruction to the message"""
+
+
+# addressing modes of register operands
+INDIRECT = 0x1
+PREFIX = 0x2
+POSTFIX = 0x4
+INCREMENT = 0x8
+DECREMENT = 0x10
+
+
 class Operand:
+    __slots__ = ()
+
     def is_constant(self):
         return True
 
 
 class RegisterOperand(Operand):
-    def __init__(self, mnemonic_node, *args):
-        self.mnemonic_name = str(mnemonic_node)
-        self.name = self.mnemonic_name[1:]
-        self.encoding = reg_encoding[self.name]
-        self.line_no = mnemonic_node.line
-        self.args = args
-        self.is_indirect = "indirect" in self.args
-
-    def is_(self, property):
-        return property in self.args
+    """Register in one addressing mode. There is only one instance for every
+    register and mode, get them with register_operand()."""
+    __slots__ = ("mnemonic_name", "name", "encoding", "mode", "is_indirect",
+                 "is_incrementing")
+
+    def __init__(self, name, mode=0):
+        self.mnemonic_name = "%" + name
+        self.name = name
+        self.encoding = reg_encoding[name]
+        self.mode = mode
+        self.is_indirect = bool(mode & INDIRECT)
+        self.is_incrementing = bool(mode & (INCREMENT | DECREMENT))
 
     def __str__(self):
-        if self.is_("decrement"):
+        if self.mode & DECREMENT:
             pre_operation = "--"
-        elif self.is_("increment"):
+        elif self.mode & INCREMENT:
             pre_operation = "++"
         else:
             pre_operation = ""
         post_operation = ""
 
-        if self.is_("postfix"):
+        if self.mode & POSTFIX:
             pre_operation, post_operation = post_operation, pre_operation
 
         if self.is_indirect:
@@ -53,8 +72,26 @@ class RegisterOperand(Operand):
             s += " (indirect)"
         return s
 
+    def __reduce__(self):
+        return register_operand, (self.mnemonic_name, self.mode)
+
+
+REGISTER_MODES = (0, INDIRECT,
+                  INDIRECT | PREFIX | INCREMENT, INDIRECT | PREFIX | DECREMENT,
+                  INDIRECT | POSTFIX | INCREMENT,
+                  INDIRECT | POSTFIX | DECREMENT)
+_register_operands = {("%" + name, mode): RegisterOperand(name, mode)
+                      for name in reg_encoding for mode in REGISTER_MODES}
+
+
+def register_operand(mnemonic_name, mode=0):
+    """Return the operand of a register, like "%acc1", in a mode"""
+    return _register_operands[(str(mnemonic_name), mode)]
+
 
 class JumpOperand(Operand):
+    __slots__ = ("jump_target",)
+
     def __init__(self, jump_target):
         self.jump_target = jump_target
 
@@ -71,21 +108,120 @@ class JumpOperand(Operand):
         return f"Jump to {self.jump_target}"
 
 
+def _divide(dividend, divisor):
+    if divisor == 0:
+        raise ValueError("division by zero in expression")
+    quotient = abs(dividend) // abs(divisor)
+    return quotient if (dividend < 0) == (divisor < 0) else -quotient
+
+
+# precedence and function of the operators in expressions, like in C
+BINARY_OPERATORS = {
+    "*": (5, operator.mul),
+    "/": (5, _divide),
+    "+": (4, operator.add),
+    "-": (4, operator.sub),
+    "<<": (3, operator.lshift),
+    ">>": (3, operator.rshift),
+    "&": (2, operator.and_),
+    "|": (1, operator.or_),
+}
+
+# instructions of compiled expressions
+PUSH_CONSTANT = 0
+PUSH_LABEL = 1
+APPLY = 2
+
+
+def compile_expression(elements):
+    """Compile operands separated by operator tokens into a postfix program
+    and the names of the labels it refers to. Operations on constants only
+    are done right away, labels are referred to by their index."""
+    program = []
+    label_names = []
+
+    def label_index(name):
+        if name not in label_names:
+            label_names.append(name)
+        return label_names.index(name)
+
+    def push(operand):
+        if isinstance(operand, JumpOperand):
+            program.append((PUSH_LABEL, label_index(operand.jump_target)))
+        elif isinstance(operand, NumberOperand):
+            program.append((PUSH_CONSTANT, operand.number))
+        elif isinstance(operand, ExpressionOperand):
+            # expressions passed to macros are calculated as a whole
+            for instruction, argument in operand.program:
+                if instruction == PUSH_LABEL:
+                    argument = label_index(operand.label_names[argument])
+                program.append((instruction, argument))
+        else:
+            raise ValueError(f"'{operand}' can't be used in an expression")
+
+    def apply(operator_text):
+        function = BINARY_OPERATORS[operator_text][1]
+        # the last two values pushed are the operands
+        if program[-1][0] == PUSH_CONSTANT and \
+                program[-2][0] == PUSH_CONSTANT:
+            right = program.pop()[1]
+            left = program.pop()[1]
+            program.append((PUSH_CONSTANT, function(left, right)))
+        else:
+            program.append((APPLY, function))
+
+    pending = []
+    push(elements[0])
+    for operator_token, operand in zip(elements[1::2], elements[2::2]):
+        precedence = BINARY_OPERATORS[str(operator_token)][0]
+        while pending and BINARY_OPERATORS[pending[-1]][0] >= precedence:
+            apply(pending.pop())
+        pending.append(str(operator_token))
+        push(operand)
+    while pending:
+        apply(pending.pop())
+    return tuple(program), tuple(label_names)
+
+
+def run_expression(program, values):
+    """Run a compiled expression with the values of its labels"""
+    stack = []
+    for instruction, argument in program:
+        if instruction == PUSH_CONSTANT:
+            stack.append(argument)
+        elif instruction == PUSH_LABEL:
+            stack.append(values[argument])
+        else:
+            right = stack.pop()
+            stack[-1] = argument(stack[-1], right)
+    return stack[-1]
+
+
+def evaluate_expressions(expressions, labels):
+    """Return the values of all expressions for the final label addresses"""
+    run = run_expression
+    return [run(expression.program,
+                [labels[name] for name in expression.label_names])
+            for expression in expressions]
+
+
 class ExpressionOperand(Operand):
+    __slots__ = ("expression", "operand_size", "program", "label_names")
+
     def __init__(self, expression):
         self.expression = expression
         self.operand_size = 32
+        self.program, self.label_names = compile_expression(expression)
 
     def evaluate(self, labels):
-        value = self.expression[0].evaluate(labels)
-        expression_rest = self.expression[1:]
-        for operator, value_node in zip(expression_rest[::2],
-                                        expression_rest[1::2]):
-            if str(operator) == "+":
-                value += value_node.evaluate(labels)
-            else:
-                value -= value_node.evaluate(labels)
-        return value
+        return run_expression(self.program,
+                              [labels[name] for name in self.label_names])
+
+    def constant_value(self):
+        """The value of expressions without labels, None for others"""
+        if len(self.program) == 1 and self.program[0][0] == PUSH_CONSTANT:
+            return self.program[0][1]
+        return None
 
     def __repr__(self):
         return "".join(map(str, self.expression))
@@ -93,8 +229,25 @@ class ExpressionOperand(Operand):
     def is_constant(self):
         return False
 
+    def renamed(self, rename):
+        """Return a copy referring to the labels renamed by the function
+        rename"""
+        copy = ExpressionOperand.__new__(ExpressionOperand)
+        copy.expression = [
+            JumpOperand(rename(element.jump_target))
+            if isinstance(element, JumpOperand) else
+            element.renamed(rename)
+            if isinstance(element, ExpressionOperand) else element
+            for element in self.expression]
+        copy.operand_size = self.operand_size
+        copy.program = self.program
+        copy.label_names = [rename(name) for name in self.label_names]
+        return copy
+
 
 class NumberOperand(Operand):
+    __slots__ = ("number",)
+
     def __init__(self, number):
         self.number = number
 
@@ -106,6 +259,8 @@ class NumberOperand(Operand):
 
 
 class StringOperand(Operand):
+    __slots__ = ("string",)
+
     def __init__(self, string):
         self.string = string
 
@@ -117,6 +272,8 @@ class StringOperand(Operand):
 
 
 class FlagList:
+    __slots__ = ("flag_list",)
+
     def __init__(self, flag_list):
         self.flag_list = flag_list
 
@@ -0,0 +1,255 @@
+"""Assemble the files of a program in worker processes.
+
+The definitions of a file between its include statements form a segment.
+Worker processes parse the files and report what the definitions of every
+segment declare: constants, macros and the names of words. From these the
+main process knows the constants, macros and words visible at the start of
+every segment, so the workers can assemble all segments to intermediate code
+at the same time. The main process appends the intermediate code of the
+segments in the order of the program. Optimizing, laying out the addresses
+and resolving the labels then run on the whole program like after a serial
+build, which makes the image the same.
+
+Labels of macro expansions and of the current address are numbered through
+the whole program, but a worker only knows its own segment. Workers number
+them within their segment under names no source can contain, which the main
+process numbers again when appending the segment.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import gc
+from lark import Token, Tree
+from .assembler import VmForthAssembler
+from .ir import IRBuilder, IntermediateCode
+from .sources import unit_parser
+
+# names of labels a segment numbers itself start with this character
+_SEGMENT_LABEL = "\0"
+
+
+@dataclass
+class SegmentCode:
+    """Intermediate code of a segment, as a worker returns it"""
+    ir: IntermediateCode
+    word_ranges: list
+    # label name -> line it was marked on
+    labels: dict
+    macro_calls: int
+    current_addresses: int
+
+
+class SegmentAssembler(VmForthAssembler):
+    """Assembler of a single segment, numbering the labels of macro
+    expansions and current addresses from 0 within the segment"""
+
+    def _macro_label(self, label_name):
+        if label_name[0] == "'":
+            return (f"{_SEGMENT_LABEL}m{self.macro_call_number}"
+                    f"{_SEGMENT_LABEL}{label_name}")
+        return label_name
+
+    def _current_address_label(self):
+        label_name = f"{_SEGMENT_LABEL}h{self.current_address_count}"
+        self.current_address_count += 1
+        return label_name
+
+
+def _declaration(definition):
+    """Return the part of a definition the following definitions depend
+    on, None if there is none"""
+    if definition.data in ("constant_definition", "macro_definition"):
+        return definition
+    if definition.data in ("assembly_definition", "general_word_definition"):
+        # only the names of words are needed, not their code
+        return Tree(definition.data, [child for child in definition.children
+                                      if isinstance(child, Token)])
+    return None
+
+
+# state of a worker process: the parse trees of its files split into
+# segments, the declarations of the whole program and the assembler holding
+# the first few of them
+_segments = {}
+_declarations = []
+_environment = None
+
+
+def _scan(key, source_code):
+    """Parse a file, returning the paths it includes and the declarations
+    of each of its segments"""
+    tree, includes = unit_parser().parse(source_code)
+    segments = [[]]
+    for definition in tree.children:
+        if definition.children:
+            segments[-1].append(definition)
+        else:
+            segments.append([])
+    _segments[key] = segments
+    # the trees live as long as the worker, collecting garbage would only
+    # scan them over and over
+    gc.freeze()
+    declarations = [[declaration for declaration
+                     in map(_declaration,
+                            (definition.children[0]
+                             for definition in segment))
+                     if declaration is not None]
+                    for segment in segments]
+    return includes, declarations
+
+
+def _share(declarations, thread_cell_size):
+    """Take the declarations of the whole program for assembling segments"""
+    global _declarations, _environment
+    _declarations = declarations
+    _environment = (VmForthAssembler(None, None, thread_cell_size), 0)
+
+
+def _assemble(key, segment, start, thread_cell_size):
+    """Assemble a segment, which starts after the first start declarations
+    of the program"""
+    global _environment
+    environment, declared = _environment
+    if declared > start:
+        environment, declared = VmForthAssembler(None, None,
+                                                 thread_cell_size), 0
+    for declaration in _declarations[declared:start]:
+        environment.declare(declaration)
+    _environment = (environment, start)
+
+    builder = IRBuilder()
+    assembler = SegmentAssembler(builder, None, thread_cell_size)
+    assembler.constants = dict(environment.constants)
+    assembler.macros = dict(environment.macros)
+    assembler.word_addresses = dict(environment.word_addresses)
+    assembler.definition_count = environment.definition_count
+    assembler.previous_word_start = environment.previous_word_start
+    for definition in _segments[key][segment]:
+        assembler.visit(definition)
+    return SegmentCode(builder.ir, assembler.word_ranges, assembler.labels,
+                       assembler.macro_call_number,
+                       assembler.current_address_count)
+
+
+@dataclass
+class _File:
+    includes: list
+    declarations: list
+    # worker process holding the parse tree
+    worker: int
+
+
+@dataclass
+class _Segment:
+    key: object
+    index: int
+    # number of declarations of the program before the segment
+    start: int
+    worker: int
+    code: SegmentCode = None
+
+
+def _renumbering(macro_calls, current_addresses):
+    def renumbered(label):
+        if label[:1] != _SEGMENT_LABEL:
+            return label
+        parts = label.split(_SEGMENT_LABEL)
+        number = int(parts[1][1:])
+        if parts[1][0] == "m":
+            return f"{parts[2]}_{number + macro_calls}"
+        return f"__here_{number + current_addresses}"
+    return renumbered
+
+
+class ParallelBuild:
+    """Assembles a program in jobs worker processes. Every worker keeps the
+    parse trees of the files it parsed, so the segments of a file are
+    assembled by the worker that parsed it."""
+
+    def __init__(self, assembler, jobs):
+        self.assembler = assembler
+        self.jobs = jobs
+        self.files = {}
+        self.segments = []
+        self.declarations = []
+
+    def build(self, source_code):
+        """Assemble the program of the main source into the emitter of the
+        assembler"""
+        # forked workers inherit the parser
+        unit_parser()
+        executors = [ProcessPoolExecutor(1) for _ in range(self.jobs)]
+        try:
+            self._scan(executors, source_code)
+            self._lay_out(None, [])
+            self._assemble(executors)
+        finally:
+            for executor in executors:
+                executor.shutdown(cancel_futures=True)
+        self._append()
+
+    def _scan(self, executors, source_code):
+        """Parse all files, the files included by the files parsed last at
+        the same time"""
+        # every file goes to the worker with the least source to parse
+        loads = [0] * len(executors)
+        workers = {}
+
+        def submit(key, text):
+            worker = workers[key] = loads.index(min(loads))
+            loads[worker] += len(text)
+            return executors[worker].submit(_scan, key, text)
+
+        pending = {None: submit(None, source_code)}
+        while pending:
+            included = []
+            for key, future in pending.items():
+                includes, declarations = future.result()
+                self.files[key] = _File(includes, declarations, workers[key])
+                included += [path for path in includes
+                             if path not in workers and path not in included]
+            pending = {path: submit(path, path.read_text())
+                       for path in included}
+
+    def _lay_out(self, key, including):
+        """Put the segments of a file and the files it includes in the order
+        of the program"""
+        if key in including:
+            raise ValueError(f"{key} includes itself")
+        source_file = self.files[key]
+        for index, declarations in enumerate(source_file.declarations):
+            if index > 0:
+                self._lay_out(source_file.includes[index - 1],
+                              including + [key])
+            self.segments.append(_Segment(key, index, len(self.declarations),
+                                          source_file.worker))
+            self.declarations += declarations
+
+    def _assemble(self, executors):
+        thread_cell_size = self.assembler.thread_cell_size
+        for executor in executors:
+            executor.submit(_share, self.declarations, thread_cell_size)
+        futures = [executors[segment.worker].submit(
+                       _assemble, segment.key, segment.index, segment.start,
+                       thread_cell_size)
+                   for segment in self.segments]
+        for segment, future in zip(self.segments, futures):
+            segment.code = future.result()
+
+    def _append(self):
+        """Append the code of all segments in the order of the program"""
+        assembler = self.assembler
+        ir = assembler.emitter.ir
+        for segment in self.segments:
+            code = segment.code
+            for label, line in code.labels.items():
+                if label[0] == _SEGMENT_LABEL:
+                    continue
+                if label in assembler.labels:
+                    raise ValueError(f"duplicate label '{label}' on line "
+                                     f"{line}")
+                assembler.labels[label] = line
+            ir.extend(code.ir, _renumbering(assembler.macro_call_number,
+                                            assembler.current_address_count))
+            assembler.macro_call_number += code.macro_calls
+            assembler.current_address_count += code.current_addresses
+            assembler.word_ranges += code.word_ranges
@@ -0,0 +1,153 @@
+from fbuilder.emitter import (MOVR_W, JMPD, JZ, JC, CALL, PUSHRD_W,
+                              POPRD_W, PUSHRR_W, POPRR_W)
+from fbuilder.ir import INSTRUCTION
+
+
+def _is_instruction(ir, row, opcodes):
+    return ir.kinds[row] == INSTRUCTION and ir.opcodes[row] in opcodes
+
+
+def _jump_target(ir, row, opcodes=(JMPD, JZ, JC, CALL)):
+    """Return the label a jump or call goes to or None if the row isn't such
+    a jump"""
+    if not _is_instruction(ir, row, opcodes):
+        return None
+    return ir.fixup_label(row)
+
+
+def _is_push_pop_pair(ir, push, pop):
+    if ir.kinds[push] != INSTRUCTION or ir.kinds[pop] != INSTRUCTION:
+        return False
+    push_opcode = ir.opcodes[push]
+    return (push_opcode & 0xf8) in (PUSHRD_W, PUSHRR_W) and \
+        ir.opcodes[pop] == push_opcode | (POPRD_W - PUSHRD_W)
+
+
+def remove_push_pop_pairs(ir):
+    """Remove a push directly followed by a pop of the same register on the
+    same stack"""
+    labelled = set(ir.label_rows)
+    removed = bytearray(len(ir))
+    rewrites = 0
+
+    # rows kept so far and whether a label precedes them
+    kept = []
+    label_pending = False
+    for row in range(len(ir)):
+        if row in labelled:
+            label_pending = True
+        if kept and not label_pending and \
+                _is_push_pop_pair(ir, kept[-1][0], row):
+            push, label_pending = kept.pop()
+            removed[push] = removed[row] = 1
+            rewrites += 1
+            continue
+        kept.append((row, label_pending))
+        label_pending = False
+
+    if rewrites:
+        ir.remove_rows(removed)
+    return rewrites
+
+
+def remove_self_moves(ir):
+    """Remove word sized register direct moves of a register onto itself.
+    Narrow moves clear the upper bits of the register and are kept."""
+    removed = bytearray(len(ir))
+    rewrites = 0
+    for row in range(len(ir)):
+        if not _is_instruction(ir, row, (MOVR_W,)):
+            continue
+        operand = ir.operands[row]
+        if operand & 0x88 == 0 and (operand >> 4) & 0x7 == operand & 0x7:
+            removed[row] = 1
+            rewrites += 1
+
+    if rewrites:
+        ir.remove_rows(removed)
+    return rewrites
+
+
+def remove_jumps_to_next(ir):
+    """Remove jumps and conditional jumps whose target is the instruction
+    right after them"""
+    positions = ir.label_positions()
+    removed = bytearray(len(ir))
+    rewrites = 0
+    for row in range(len(ir)):
+        target = _jump_target(ir, row, (JMPD, JZ, JC))
+        if target is not None and positions.get(target) == row + 1:
+            removed[row] = 1
+            rewrites += 1
+
+    if rewrites:
+        ir.remove_rows(removed)
+    return rewrites
+
+
+def thread_jumps(ir):
+    """Let jumps and calls to an unconditional jump go directly to the final
+    destination of the jump chain"""
+    positions = ir.label_positions()
+    rewrites = 0
+    for row in range(len(ir)):
+        target = _jump_target(ir, row)
+        if target is None:
+            continue
+
+        final_target = target
+        visited = {target}
+        while positions.get(final_target, len(ir)) < len(ir):
+            destination = _jump_target(ir, positions[final_target], (JMPD,))
+            if destination is None:
+                break
+            final_target = destination
+            if final_target in visited:
+                # jump cycle, leave this one alone
+                final_target = target
+                break
+            visited.add(final_target)
+
+        if final_target != target:
+            ir.fixup_targets[ir.fixups[row]] = final_target
+            rewrites += 1
+    return rewrites
+
+
+DEFAULT_RULES = [
+    remove_push_pop_pairs,
+    remove_self_moves,
+    thread_jumps,
+    remove_jumps_to_next,
+]
+
+
+class PeepholeOptimizer:
+    """Applies peephole rewrites to the intermediate code of a complete
+    program. Rows are removed from the intermediate code and labels move along
+    with the remaining rows, so all label positions are recomputed when the
+    code is laid out."""
+    def __init__(self, rules=None):
+        if rules is None:
+            rules = DEFAULT_RULES
+        self.rules = rules
+
+        self.instructions_removed = 0
+        self.bytes_saved = 0
+
+    def optimize(self, ir):
+        def count(ir):
+            return sum(1 for kind in ir.kinds if kind == INSTRUCTION)
+
+        instructions_before = count(ir)
+        bytes_before = sum(ir.sizes)
+
+        changed = True
+        while changed:
+            changed = False
+            for rule in self.rules:
+                if rule(ir) > 0:
+                    changed = True
+
+        self.instructions_removed = instructions_before - count(ir)
+        self.bytes_saved = bytes_before - sum(ir.sizes)
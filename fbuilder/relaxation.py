@@ -0,0 +1,76 @@
+from fbuilder.emitter import JMPD, JZ, JC, CALL, JMPD_S, JZ_S, JC_S, CALL_S
+from fbuilder.ir import INSTRUCTION
+
+_SHORT_BRANCHES = {
+    JMPD: JMPD_S,
+    JZ: JZ_S,
+    JC: JC_S,
+    CALL: CALL_S,
+}
+_LONG_BRANCHES = {short: long for long, short in _SHORT_BRANCHES.items()}
+
+SHORT_BRANCH_SIZE = 2
+LONG_BRANCH_SIZE = 5
+
+
+def _make_short(ir, row):
+    fixup = ir.fixups[row]
+    ir.opcodes[row] = _SHORT_BRANCHES[ir.opcodes[row]]
+    ir.sizes[row] = SHORT_BRANCH_SIZE
+    ir.fixup_sizes[fixup] = 1
+    ir.fixup_relative[fixup] = True
+
+
+def _make_long(ir, row):
+    fixup = ir.fixups[row]
+    ir.opcodes[row] = _LONG_BRANCHES[ir.opcodes[row]]
+    ir.sizes[row] = LONG_BRANCH_SIZE
+    ir.fixup_sizes[fixup] = 4
+    ir.fixup_relative[fixup] = False
+
+
+def _reaches_target(ir, row, addresses, labels):
+    target = labels.get(ir.fixup_label(row))
+    if target is None:
+        return False
+    return -0x80 <= target - addresses[row + 1] <= 0x7f
+
+
+class BranchRelaxation:
+    """Replace jumps and calls to labels by their short relative encoding
+    wherever the target is within reach.
+
+    All candidates start out short. Branches that can't reach their target are
+    grown back to the absolute encoding until the label addresses are stable.
+    As branches only ever grow, this terminates after at most one pass per
+    branch.
+    """
+    def __init__(self):
+        self.branches_shortened = 0
+        self.bytes_saved = 0
+        self.passes = 0
+
+    def optimize(self, ir):
+        short = [row for row in range(len(ir))
+                 if ir.kinds[row] == INSTRUCTION
+                 and ir.opcodes[row] in _SHORT_BRANCHES
+                 and ir.fixup_label(row) is not None]
+        for row in short:
+            _make_short(ir, row)
+
+        self.passes = 0
+        while True:
+            self.passes += 1
+            addresses = ir.addresses()
+            labels = ir.resolve_labels(addresses)
+            out_of_reach = [row for row in short
+                            if not _reaches_target(ir, row, addresses, labels)]
+            if not out_of_reach:
+                break
+            for row in out_of_reach:
+                _make_long(ir, row)
+            out_of_reach = set(out_of_reach)
+            short = [row for row in short if row not in out_of_reach]
+
+        self.branches_shortened = len(short)
+        self.bytes_saved = len(short) * (LONG_BRANCH_SIZE - SHORT_BRANCH_SIZE)
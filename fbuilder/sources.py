@@ -0,0 +1,97 @@
+"""Parse trees of single source files, kept until the files change.
+
+Every source file is parsed on its own. The include statements are left in
+the parse trees as empty definitions, which are replaced by the definitions
+of the included files when the program is put together, so after an edit
+only the edited file has to be parsed again.
+"""
+from lark import Lark, Tree
+import functools
+import pathlib
+
+
+def grammar():
+    return (pathlib.Path(__file__).parent / "grammar.lark").read_text()
+
+
+class UnitParser:
+    """Parser of a single file, leaving its includes as empty definitions"""
+
+    def __init__(self):
+        self.parser = Lark(grammar(), parser='lalr',
+                           lexer_callbacks={"_INCLUDE": self._record_include})
+        self._includes = None
+
+    def _record_include(self, token):
+        name = token.value.split()[-1][1:-1]
+        self._includes.append(pathlib.Path(name))
+        return token
+
+    def parse(self, source_code):
+        """Return the parse tree and the paths of the included files"""
+        self._includes = []
+        # included files may end without a newline, that the file
+        # following them in the program provides otherwise
+        tree = self.parser.parse(source_code + "\n")
+        return tree, self._includes
+
+
+@functools.lru_cache(maxsize=None)
+def unit_parser():
+    return UnitParser()
+
+
+class SourceCache:
+    """Parse trees of source files, parsed again only when they change"""
+
+    def __init__(self):
+        # path -> (modification time, size, parse tree, included paths)
+        self.files = {}
+        # path -> modification time and size of the files of the last
+        # program, None for missing files
+        self.dependencies = {}
+        self.parsed = []
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            status = path.stat()
+        except OSError:
+            return None
+        return status.st_mtime_ns, status.st_size
+
+    def _parse(self, path):
+        stamp = self._stamp(path)
+        self.dependencies[path] = stamp
+        cached = self.files.get(path)
+        if cached is not None and cached[:2] == stamp:
+            return cached
+        tree, includes = unit_parser().parse(path.read_text())
+        self.files[path] = (*stamp, tree, includes)
+        self.parsed.append(path)
+        return self.files[path]
+
+    def _definitions(self, path, including):
+        if path in including:
+            raise ValueError(f"{path} includes itself")
+        _, _, tree, includes = self._parse(path)
+        included = iter(includes)
+        definitions = []
+        for definition in tree.children:
+            if definition.children:
+                definitions.append(definition)
+            else:
+                definitions += self._definitions(next(included),
+                                                 including + [path])
+        return definitions
+
+    def parse(self, path):
+        """Return the parse tree of the file with all included files"""
+        self.parsed = []
+        self.dependencies = {}
+        return Tree("start", self._definitions(pathlib.Path(path), []))
+
+    def changed(self):
+        """Return whether any file of the last parsed program changed"""
+        return any(self._stamp(path) != stamp
+                   for path, stamp in self.dependencies.items())
@@ -0,0 +1,167 @@
+"""Binary symbol files mapping address ranges to word names.
+
+The file starts with a header, followed by the symbol records sorted by start
+address, an optional interval index and the string table with the names. All
+numbers are little-endian and 32 bits wide, so the file can be memory-mapped
+and queried in place.
+
+The index stores one entry per record. The records sorted by start address
+are read as an implicit balanced binary search tree, where the middle record
+of a range is the root of the range and both halves are its subtrees. The
+index entry of a record is the largest end address in its subtree, so queries
+can skip subtrees that end before the searched address.
+"""
+from array import array
+import mmap
+import struct
+import sys
+
+MAGIC = b"FSYM"
+VERSION = 1
+FLAG_INDEX = 0x1
+
+# magic, version, flags, count, records, index, strings, strings size, unused
+_HEADER = struct.Struct("<4sHHIIIIII")
+_RECORD = struct.Struct("<IIII")  # start, end, name offset, name length
+
+
+def _words(view):
+    """Read little-endian 32 bit numbers, in place where possible"""
+    if sys.byteorder == "little":
+        return view.cast("I")
+    words = array("I", view.tobytes())
+    words.byteswap()
+    return words
+
+
+def is_symbol_file(data):
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def _fill_index(index, low, high):
+    if low >= high:
+        return 0
+    middle = (low + high) // 2
+    index[middle] = max(index[middle],
+                        _fill_index(index, low, middle),
+                        _fill_index(index, middle + 1, high))
+    return index[middle]
+
+
+def build_index(ends):
+    """Return the largest end address of every subtree of the implicit tree,
+    for records sorted by start address"""
+    index = array("I", ends)
+    _fill_index(index, 0, len(index))
+    return index
+
+
+def write_symbol_file(file_path, word_ranges, with_index=True):
+    """Write (name, start, end) tuples as binary symbol file"""
+    symbols = sorted(word_ranges, key=lambda symbol: (symbol[1], symbol[2]))
+
+    strings = bytearray()
+    records = bytearray()
+    for name, start, end in symbols:
+        encoded = name.encode("utf-8")
+        records += _RECORD.pack(start, end, len(strings), len(encoded))
+        strings += encoded
+
+    records_offset = _HEADER.size
+    index_offset = records_offset + len(records)
+    index = b""
+    flags = 0
+    if with_index:
+        index = build_index([symbol[2] for symbol in symbols])
+        if sys.byteorder != "little":
+            index.byteswap()
+        index = index.tobytes()
+        flags |= FLAG_INDEX
+    strings_offset = index_offset + len(index)
+
+    header = _HEADER.pack(MAGIC, VERSION, flags, len(symbols),
+                          records_offset, index_offset if with_index else 0,
+                          strings_offset, len(strings), 0)
+    with open(file_path, "wb") as symbol_file:
+        symbol_file.write(header)
+        symbol_file.write(records)
+        symbol_file.write(index)
+        symbol_file.write(strings)
+
+
+class SymbolFile:
+    """Memory-mapped binary symbol file answering address queries in place"""
+    def __init__(self, file_path):
+        with open(file_path, "rb") as symbol_file:
+            self._map = mmap.mmap(symbol_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        self._data = data = memoryview(self._map)
+
+        (magic, version, flags, count, records_offset, index_offset,
+         strings_offset, strings_size, _) = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{file_path} is no binary symbol file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported symbol file version {version}")
+
+        self._records = data[records_offset:
+                             records_offset + count * _RECORD.size]
+        self._strings = data[strings_offset:strings_offset + strings_size]
+        self._fields = _words(self._records)
+        self._count = count
+
+        if flags & FLAG_INDEX:
+            self._index = _words(data[index_offset:index_offset + count * 4])
+        else:
+            self._index = build_index(self.ends())
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        # views into the map must be released before it can be closed
+        for view in (self._index, self._fields, self._records, self._strings,
+                     self._data):
+            if isinstance(view, memoryview):
+                view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def starts(self):
+        return self._fields[0::4]
+
+    def ends(self):
+        return self._fields[1::4]
+
+    def name(self, record):
+        offset = self._fields[record * 4 + 2]
+        length = self._fields[record * 4 + 3]
+        return str(self._strings[offset:offset + length], "utf-8")
+
+    def records_at(self, address):
+        """Return the records containing the address, sorted by start"""
+        found = []
+        fields = self._fields
+        index = self._index
+        ranges = [(0, self._count)]
+        while ranges:
+            low, high = ranges.pop()
+            if low >= high:
+                continue
+            middle = (low + high) // 2
+            if index[middle] <= address:
+                continue
+            if fields[middle * 4] <= address:
+                if address < fields[middle * 4 + 1]:
+                    found.append(middle)
+                ranges.append((middle + 1, high))
+            ranges.append((low, middle))
+        return sorted(found)
+
+    def symbols_at(self, address):
+        return [self.name(record) for record in self.records_at(address)]
@@ -0,0 +1,139 @@
+from fbuilder.address_map import (AddressMap, NO_WORD, LINK, NAME, CODE)
+from fbuilder.app import Assembler
+from fbuilder.symbol_file import write_symbol_file
+from dataclasses import dataclass
+import pytest
+import random
+
+
+def assemble(source):
+    @dataclass
+    class DefaultOptions:
+        format: str = "bin"
+    asm = Assembler(DefaultOptions())
+    asm.assemble_source(source)
+    return asm
+
+
+WORDS = """
+def asm(code) DUP
+    nop
+    nop
+    nop
+end
+def asm(code) alias TXSTO TX!
+    nop
+    nop
+end
+"""
+
+
+class TestLookup:
+    def test_addresses_resolve_to_words_and_fields(self):
+        asm = assemble(WORDS)
+        address_map = AddressMap.from_assembler(asm)
+        labels = asm.symbol_table
+
+        word = address_map.lookup(labels["dup_cfa"])
+        assert address_map.names[word] == "dup"
+        assert address_map.field(word, labels["dup_cfa"]) == CODE
+        assert address_map.field(word, labels["dup_nfa"]) == NAME
+        assert address_map.field(word, labels["dup_nfa"] - 1) == LINK
+        assert address_map.nfas[word] == labels["dup_nfa"]
+        assert address_map.cfas[word] == labels["dup_cfa"]
+        assert address_map.ends[word] == labels["dup_end"]
+
+    def test_aliases_are_merged_into_one_word(self):
+        asm = assemble(WORDS)
+        address_map = AddressMap.from_assembler(asm)
+
+        assert len(address_map) == 2
+        word = address_map.lookup(asm.symbol_table["tx!_cfa"])
+        assert address_map.names[word] == "tx!"
+        assert address_map.aliases[word] == ["txsto"]
+
+    def test_describe_names_field_and_offset(self):
+        asm = assemble(WORDS)
+        address_map = AddressMap.from_assembler(asm)
+        cfa = asm.symbol_table["dup_cfa"]
+
+        assert address_map.describe(cfa) == "dup_cfa"
+        assert address_map.describe(cfa + 2) == "dup_cfa+0x2"
+        assert address_map.describe(cfa - 4) == "dup_nfa"
+        assert address_map.describe(0x100000) == "0x100000"
+
+    def test_nested_ranges_resolve_to_the_innermost_word(self):
+        address_map = AddressMap([("outer", 0x10, 0x40),
+                                  ("inner", 0x14, 0x18),
+                                  ("innermost", 0x15, 0x16),
+                                  ("next", 0x40, 0x50)])
+
+        names = [address_map.names[address_map.lookup(address)]
+                 for address in (0x10, 0x14, 0x15, 0x16, 0x18, 0x40)]
+        assert names == ["outer", "inner", "innermost", "inner", "outer",
+                         "next"]
+        assert address_map.lookup(0x0f) == NO_WORD
+        assert address_map.lookup(0x50) == NO_WORD
+
+    def test_partially_overlapping_ranges_are_rejected(self):
+        with pytest.raises(ValueError):
+            AddressMap([("first", 0x10, 0x20), ("second", 0x18, 0x28)])
+
+    @pytest.mark.parametrize("suffix", [".sym", ".csv"])
+    def test_maps_are_loaded_from_symbol_files(self, tmp_path, suffix):
+        word_ranges = [("dup", 0x10, 0x20), ("swap", 0x20, 0x30)]
+        path = tmp_path / ("test" + suffix)
+        if suffix == ".sym":
+            write_symbol_file(path, word_ranges)
+        else:
+            path.write_text('"dup",16,32\n"swap",32,48\n')
+
+        address_map = AddressMap.from_file(path)
+
+        assert address_map.names == ["dup", "swap"]
+        assert address_map.lookup(0x2f) == 1
+
+
+class TestArrayLookup:
+    np = pytest.importorskip("numpy")
+
+    def random_map(self):
+        generator = random.Random(3)
+        word_ranges = []
+        address = 0
+        for number in range(200):
+            start = address + generator.randrange(3)
+            end = start + generator.randrange(8, 64)
+            word_ranges.append((f"w{number}", start, end))
+            if number % 5 == 0:
+                word_ranges.append((f"n{number}", start + 5, start + 7))
+            address = end
+        return AddressMap(word_ranges), address
+
+    def test_array_lookup_matches_single_lookups(self):
+        address_map, size = self.random_map()
+        addresses = self.np.arange(size + 16, dtype=self.np.uint32)
+
+        words = address_map.lookup_array(addresses)
+
+        assert list(words) == [address_map.lookup(int(address))
+                               for address in addresses]
+
+    def test_fields_of_arrays_match_single_lookups(self):
+        address_map, size = self.random_map()
+        addresses = self.np.arange(size + 16, dtype=self.np.uint32)
+        words = address_map.lookup_array(addresses)
+
+        fields = address_map.fields_array(words, addresses)
+
+        assert [field for word, field in zip(words, fields) if word >= 0] \
+            == [address_map.field(int(word), int(address))
+                for word, address in zip(words, addresses) if word >= 0]
+
+    def test_empty_maps_find_no_words(self):
+        address_map = AddressMap([])
+        addresses = self.np.array([0, 4, 8], dtype=self.np.uint32)
+
+        assert list(address_map.lookup_array(addresses)) == [NO_WORD] * 3
+        assert list(address_map.fields_array([NO_WORD] * 3, addresses)) \
+            == [LINK] * 3
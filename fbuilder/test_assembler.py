@@ -1,14 +1,18 @@
 from fbuilder.assembler import aligned
-from fbuilder.app import Assembler
+from fbuilder.operands import register_operand, INDIRECT, POSTFIX, INCREMENT
+from fbuilder.app import Assembler, grammar
 from dataclasses import dataclass
+from lark import Lark
+import pickle
 import pytest
 
 
-def assemble(source):
+def assemble(source, thread_cells=32):
     @dataclass
     class DefaultOptions:
         format: str = "bin"
-    asm = Assembler(DefaultOptions())
+        thread_cells: int = 32
+    asm = Assembler(DefaultOptions(thread_cells=thread_cells))
     return asm.assemble_source(source)
 
 
@@ -350,6 +354,56 @@ class TestExpressions:
 
         assert binary == assemble(source)
 
+    def test_operators_bind_like_in_c(self):
+        source = """
+        codeblock
+        start:
+            dw #0x1
+        entry2:
+            dw :entry2 * #2 | #1
+            dw #1 << #4 + :entry2 >> #1
+            dw #0xff & :entry2 - #1
+            db #10 - #2 * #3
+            dw :entry2 / #3
+        end
+        """
+        binary = b"\x01\x00\x00\x00"
+        binary += b"\x09\x00\x00\x00"
+        binary += b"\x80\x00\x00\x00"
+        binary += b"\x03\x00\x00\x00"
+        binary += b"\x04"
+        binary += b"\x01\x00\x00\x00"
+
+        assert binary == assemble(source)
+
+    def test_constant_parts_are_calculated_while_assembling(self):
+        source = """
+        codeblock
+        start:
+            dw :start + #2 * #3 - #1 // comment after the expression
+        end
+        """
+        @dataclass
+        class DefaultOptions:
+            format: str = "bin"
+        asm = Assembler(DefaultOptions())
+        assert asm.assemble_source(source) == b"\x05\x00\x00\x00"
+        expression = asm.ir.fixup_targets[asm.ir.fixups[0]]
+        assert len(expression.program) == 5
+        assert expression.label_names == ("start",)
+
+    def test_division_by_zero_is_reported(self):
+        source = """
+        codeblock
+            dw #4 / #0
+        end
+        """
+
+        with pytest.raises(ValueError) as parsing_error:
+            assemble(source)
+        assert "on line 3" in str(parsing_error)
+        assert "division by zero" in str(parsing_error)
+
     def test_dollar_inside_macro_uses_the_address_at_insertion(self):
         source = """
         macro CURRENT_ADDRESS()
@@ -1464,6 +1518,50 @@ class TestALUInstruction:
 
         assert binary == assemble(source)
 
+    def test_multiplying_into_a_register_pair(self):
+        source = """
+        codeblock
+            mul %acc1, %acc2, %ret
+        end
+        """
+
+        binary = b"\x40\x45\x06"
+
+        assert binary == assemble(source)
+
+    def test_moving_a_memory_block(self):
+        source = """
+        codeblock
+            bmove %acc1, %acc2, %ret
+        end
+        """
+
+        binary = b"\x44\x45\x06"
+
+        assert binary == assemble(source)
+
+    def test_filling_a_memory_block(self):
+        source = """
+        codeblock
+            bfill %wp, %acc2, %ret
+        end
+        """
+
+        binary = b"\x46\x15\x06"
+
+        assert binary == assemble(source)
+
+    def test_dividing_a_register_pair(self):
+        source = """
+        codeblock
+            divmod.w %wp, %ret, %dsp
+        end
+        """
+
+        binary = b"\x42\x16\x03"
+
+        assert binary == assemble(source)
+
     def test_shift_right_arithmetically(self):
         source = """
         codeblock
@@ -1485,3 +1583,143 @@ class TestALUInstruction:
         binary = b"\x3e\x62"
 
         assert binary == assemble(source)
+
+
+class TestHalfwordInstructions:
+    def test_halfword_moves(self):
+        source = """
+        codeblock
+            mov.h %wp, %acc1
+            mov.h [%wp++], %acc1
+            mov.h %wp, [%ip++]
+        end
+        """
+
+        binary = b"\x28\x14"
+        binary += b"\x29\x0c"
+        binary += b"\x2a\x08"
+
+        assert binary == assemble(source)
+
+    def test_dh_inserts_16bit_values_and_labels(self):
+        source = """
+        codeblock
+        start:
+            dh #0x1234
+            dh :start
+        end
+        """
+
+        assert b"\x34\x12\x00\x00" == assemble(source)
+
+    def test_dh_values_outside_range_raise_exception(self):
+        source = """
+        codeblock
+            dh #0x12345
+        end
+        """
+
+        with pytest.raises(ValueError) as parsing_error:
+            assemble(source)
+        assert "on line 3" in str(parsing_error)
+
+    def test_halfword_push_is_not_allowed(self):
+        source = """
+        codeblock
+            pushd.h %acc1
+        end
+        """
+
+        with pytest.raises(ValueError):
+            assemble(source)
+
+
+class TestThreadCells:
+    source = """
+    codeblock
+        mov.t %wp, [%ip++]
+        mov %acc1, THREADCELL
+    end
+    def asm(code) WORD1
+    end
+    def word(colon) WORD2
+    target:
+        WORD1 :target 0x11223344
+    end
+    """
+
+    def test_32bit_thread_cells_are_the_default(self):
+        binary = assemble(self.source)
+
+        assert binary[0:2] == b"\x24\x08"
+        assert binary[2:7] == b"\x26\x04\x00\x00\x00"
+        # WORD1 starts at 7, its CFA at 17; the thread of WORD2 at 27
+        assert binary[27:39] == b"\x11\x00\x00\x00" \
+                                b"\x1b\x00\x00\x00" \
+                                b"\x44\x33\x22\x11"
+
+    def test_16bit_thread_cells(self):
+        binary = assemble(self.source, thread_cells=16)
+
+        assert binary[0:2] == b"\x2a\x08"
+        assert binary[2:7] == b"\x26\x02\x00\x00\x00"
+        # literals keep their full size
+        assert binary[27:35] == b"\x11\x00" \
+                                b"\x1b\x00" \
+                                b"\x44\x33\x22\x11"
+
+    def test_dt_uses_the_thread_cell_size(self):
+        source = """
+        codeblock
+        start:
+            dt :start
+        end
+        """
+
+        assert assemble(source) == b"\x00\x00\x00\x00"
+        assert assemble(source, thread_cells=16) == b"\x00\x00"
+
+    def test_addresses_beyond_16bit_cells_are_reported(self):
+        source = "codeblock\n    dt :far\n" + "    dw #0\n" * 0x4000 + \
+            "far:\nend\n"
+
+        with pytest.raises(ValueError) as error:
+            assemble(source, thread_cells=16)
+        assert "16-bit cell" in str(error)
+
+
+def test_streamed_definitions_assemble_like_the_whole_parse_tree():
+    source = """
+    codeblock
+    start:
+        jmp :start
+    end
+    def asm(code) FIRST
+        nop
+    end
+    def word(colon) SECOND
+        FIRST FIRST
+    end
+    """
+
+    @dataclass
+    class DefaultOptions:
+        format: str = "bin"
+    streamed = Assembler(DefaultOptions())
+    whole = Assembler(DefaultOptions())
+    tree = Lark(grammar(), parser="lalr").parse(source)
+
+    assert streamed.assemble_source(source) == whole.assemble_tree(tree)
+    assert streamed.symbol_table == whole.symbol_table
+    assert streamed.symbols.word_ranges == whole.symbols.word_ranges
+
+
+def test_register_operands_are_shared():
+    operand = register_operand("%acc1", INDIRECT | POSTFIX | INCREMENT)
+
+    assert operand is register_operand("%acc1",
+                                       INDIRECT | POSTFIX | INCREMENT)
+    assert operand is not register_operand("%acc1", INDIRECT)
+    assert pickle.loads(pickle.dumps(operand)) is operand
+    assert str(operand) == "[%acc1++]"
+    assert operand.encoding == 4
@@ -0,0 +1,93 @@
+from fbuilder.app import Assembler
+from fbuilder.build_cache import BuildCache, CacheEntry
+from dataclasses import dataclass
+import os
+import pathlib
+import pytest
+
+
+@dataclass
+class Options:
+    cache_directory: pathlib.Path
+    format: str = "bin"
+    thread_cells: int = 32
+    listing: bool = False
+
+
+SOURCE = """
+include "words.fvs"
+codeblock
+start:
+    dt :first_cfa
+end
+"""
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "words.fvs").write_text("def asm(code) FIRST\n    nop\nend\n")
+    return tmp_path
+
+
+def test_identical_builds_are_not_parsed_again(sources):
+    options = Options(sources / "cache", listing=True)
+    first = Assembler(options)
+    binary = first.assemble_source(SOURCE)
+    assert not first.cached
+
+    second = Assembler(options)
+    assert second.assemble_source(SOURCE) == binary
+    assert second.cached
+    assert second.symbols.word_ranges == first.symbols.word_ranges
+    assert second.symbol_table == first.symbol_table
+    assert second.listing_text() == first.listing_text()
+
+
+def test_changed_inputs_are_built_again(sources):
+    options = Options(sources / "cache")
+    Assembler(options).assemble_source(SOURCE)
+
+    (sources / "words.fvs").write_text(
+        "def asm(code) FIRST\n    nop\n    nop\nend\n")
+    assembler = Assembler(options)
+    assembler.assemble_source(SOURCE)
+    assert not assembler.cached
+
+    assembler = Assembler(Options(sources / "cache", thread_cells=16))
+    assembler.assemble_source(SOURCE)
+    assert not assembler.cached
+
+
+def test_keys_depend_on_the_included_files(sources):
+    cache = BuildCache(sources / "cache")
+    options = Options(None)
+    key = cache.key(SOURCE, options)
+    assert cache.key(SOURCE, options) == key
+
+    (sources / "words.fvs").write_text('include "more.fvs"\n')
+    assert cache.key(SOURCE, options) != key
+    key = cache.key(SOURCE, options)
+    (sources / "more.fvs").write_text("")
+    assert cache.key(SOURCE, options) != key
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = BuildCache(tmp_path, max_bytes=2500)
+    cache.store("a", CacheEntry(bytes(1000), [], {}))
+    cache.store("b", CacheEntry(bytes(1000), [], {}))
+    # "b" was used before "a"
+    os.utime(tmp_path / "b.pickle", (1, 1))
+    os.utime(tmp_path / "a.pickle", (2, 2))
+    cache.store("c", CacheEntry(bytes(1000), [], {}))
+
+    assert cache.load("a") is not None
+    assert cache.load("b") is None
+    assert cache.load("c") is not None
+
+
+def test_damaged_entries_are_ignored(tmp_path):
+    cache = BuildCache(tmp_path)
+    (tmp_path / "a.pickle").write_bytes(b"damaged")
+    assert cache.load("a") is None
+    assert not (tmp_path / "a.pickle").exists()
@@ -0,0 +1,168 @@
+from fbuilder.app import Assembler
+from fbuilder.backends import (generate_machine_code, generate_listing,
+                               collect_statistics)
+from fbuilder.ir import IRBuilder, INSTRUCTION, DATA, STRING
+from dataclasses import dataclass
+import pytest
+
+
+def build_ir(source, format="bin"):
+    @dataclass
+    class DefaultOptions:
+        format: str = "bin"
+    asm = Assembler(DefaultOptions(format=format))
+    output = asm.assemble_source(source)
+    return asm.ir, output
+
+
+class TestRows:
+    def test_instructions_are_split_into_opcode_and_operand(self):
+        source = """
+        codeblock
+            add %acc1, %acc2, %wp
+            mov %acc1, #0x12345678
+            nop
+        end
+        """
+        ir, _ = build_ir(source)
+
+        assert len(ir) == 3
+        assert list(ir.kinds) == [INSTRUCTION] * 3
+        assert list(ir.opcodes) == [0x30, 0x26, 0x00]
+        assert list(ir.operands) == [0x0145, 0x12345678, 0]
+        assert list(ir.sizes) == [3, 5, 1]
+
+    def test_data_and_strings_are_kept_in_their_own_rows(self):
+        source = """
+        codeblock
+            dw #0x11223344
+            db #0x55
+            db "text"
+        end
+        """
+        ir, _ = build_ir(source)
+
+        assert list(ir.kinds) == [DATA, DATA, STRING]
+        assert list(ir.operands[0:2]) == [0x11223344, 0x55]
+        assert ir.strings[ir.operands[2]] == b"text"
+        assert list(ir.sizes) == [4, 1, 4]
+
+    def test_label_references_are_recorded_as_fixups(self):
+        source = """
+        codeblock
+        start:
+            jz :start
+            dw :start+#2
+        end
+        """
+        ir, _ = build_ir(source)
+
+        assert ir.fixup_label(0) == "start"
+        assert ir.fixup_offsets[ir.fixups[0]] == 1
+        assert ir.fixup_label(1) is None
+        assert ir.fixup_sizes[ir.fixups[1]] == 4
+
+    def test_rows_with_more_than_one_label_are_rejected(self):
+        builder = IRBuilder()
+
+        def emit_two_jumps(first, second):
+            builder.encoder._insert_jump_marker(first)
+            builder.encoder._insert_jump_marker(second)
+        builder.encoder.emit_two_jumps = emit_two_jumps
+
+        with pytest.raises(ValueError):
+            builder._encode("emit_two_jumps", "first", "second")
+
+    def test_labels_point_to_the_following_row(self):
+        source = """
+        codeblock
+            nop
+        first:
+        second:
+            nop
+        end
+        """
+        ir, _ = build_ir(source)
+
+        assert ir.label_positions()["first"] == 1
+        assert ir.label_positions()["second"] == 1
+        assert ir.resolve_labels()["second"] == 1
+
+
+def test_removing_rows_moves_labels_and_addresses():
+    source = """
+    codeblock
+        add %acc1, %acc2, %wp
+    target:
+        nop
+        jmp :target
+    end
+    """
+    ir, _ = build_ir(source)
+
+    ir.remove_rows(bytearray([1, 0, 0]))
+
+    assert len(ir) == 2
+    assert ir.label_positions()["target"] == 0
+    assert generate_machine_code(ir) == b"\x00\x70\x00\x00\x00\x00"
+
+
+class TestBackends:
+    def test_machine_code_matches_assembler_output(self):
+        source = """
+        codeblock
+            jmp :finish
+            db #0x12
+            db "ab"
+        finish:
+            mov %acc2, :finish
+        end
+        """
+        ir, binary = build_ir(source)
+
+        assert generate_machine_code(ir) == binary
+        assert binary == b"\x70\x08\x00\x00\x00\x12ab" \
+                         b"\x27\x08\x00\x00\x00"
+
+    def test_listing_shows_resolved_code_and_labels(self):
+        source = """
+        codeblock
+        start:
+            mov %ip, [%ip++]
+            popd %acc1
+            call :start
+        end
+        """
+        _, listing = build_ir(source, format="disassembly")
+
+        assert listing == \
+            "    __last_cfa:\n" \
+            "    __last_end:\n" \
+            "    start:\n" \
+            "00000000: 24 00              mov.w %ip, [%ip++]\n" \
+            "00000002: ac                 popd %acc1\n" \
+            "00000003: 73 00 00 00 00     call :start\n"
+
+    def test_statistics_count_rows_and_mnemonics(self):
+        source = """
+        codeblock
+            pushd %acc1
+            pushd %acc2
+            dw #0x0
+        end
+        """
+        ir, _ = build_ir(source)
+
+        statistics = collect_statistics(ir)
+
+        assert statistics["instructions"] == 2
+        assert statistics["instruction_bytes"] == 2
+        assert statistics["data_bytes"] == 4
+        assert statistics["mnemonics"]["pushd"] == 2
+
+    def test_memory_usage_grows_with_the_program(self):
+        small, _ = build_ir("codeblock\n nop\nend\n")
+        large, _ = build_ir("codeblock\n" + " nop\n" * 1000 + "end\n")
+
+        assert large.memory_usage() > small.memory_usage()
+        assert generate_listing(large).count("nop") == 1000
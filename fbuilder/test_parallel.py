@@ -0,0 +1,105 @@
+from fbuilder.app import Assembler
+from dataclasses import dataclass
+import pytest
+
+
+@dataclass
+class Options:
+    format: str = "bin"
+    jobs: int = 1
+    optimize: bool = False
+    short_branches: bool = False
+
+
+MAIN_SOURCE = """
+include "macros.fvs"
+codeblock
+start:
+    jmp :main
+end
+include "words.fvs"
+def word(colon) alias DOUBLE TWICE
+    FIRST
+    FIRST
+end
+codeblock
+main:
+    STRING("main")
+    dw $ + CELL
+    dt :double_cfa
+end
+"""
+
+MACROS_SOURCE = """
+const CELL = 4
+macro NEXT()
+    mov %wp, [%ip++]
+    jmp [%wp]
+end
+macro STRING(text)
+    db :'end - :'start
+'start:
+    db @text
+'end:
+end
+macro __DEFCOLON_CFA()
+    dw :docol
+end
+"""
+
+WORDS_SOURCE = """
+include "code.fvs"
+def asm(code) FIRST
+    STRING("first")
+    mov %acc1, CELL
+    NEXT()
+end
+const CELL = 8
+"""
+
+CODE_SOURCE = """
+codeblock
+docol:
+    pushr %ip
+    mov %acc1, $
+    NEXT()
+end
+"""
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    # included files are found relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "macros.fvs").write_text(MACROS_SOURCE)
+    (tmp_path / "words.fvs").write_text(WORDS_SOURCE)
+    (tmp_path / "code.fvs").write_text(CODE_SOURCE)
+    return tmp_path
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_worker_processes_build_the_same_program(sources, optimize):
+    serial = Assembler(Options(optimize=optimize, short_branches=optimize))
+    parallel = Assembler(Options(jobs=2, optimize=optimize,
+                                 short_branches=optimize))
+
+    assert parallel.assemble_source(MAIN_SOURCE) == \
+        serial.assemble_source(MAIN_SOURCE)
+    assert parallel.symbols.word_ranges == serial.symbols.word_ranges
+    assert parallel.symbol_table == serial.symbol_table
+    assert parallel.listing_text() == serial.listing_text()
+
+
+def test_duplicate_labels_across_files_are_reported(sources):
+    (sources / "code.fvs").write_text(CODE_SOURCE.replace("docol:",
+                                                          "main:\ndocol:"))
+
+    with pytest.raises(ValueError, match="duplicate label 'main' on line 13"):
+        Assembler(Options(jobs=2)).assemble_source(MAIN_SOURCE)
+
+
+def test_including_a_file_from_itself_is_reported(sources):
+    (sources / "code.fvs").write_text('include "words.fvs"\n')
+
+    with pytest.raises(ValueError, match="includes itself"):
+        Assembler(Options(jobs=2)).assemble_source(MAIN_SOURCE)
@@ -0,0 +1,327 @@
+from fbuilder.app import Assembler
+from fbuilder.assembler import VmForthAssembler
+from fbuilder.backends import generate_machine_code
+from fbuilder.debug_symbols import WordCollection
+from fbuilder.ir import IRBuilder
+from fbuilder.peephole import (PeepholeOptimizer, remove_push_pop_pairs,
+                               remove_self_moves, remove_jumps_to_next,
+                               thread_jumps)
+from dataclasses import dataclass
+from lark import Lark
+import pathlib
+
+
+def assemble(source, optimize=True):
+    @dataclass
+    class DefaultOptions:
+        format: str = "bin"
+        optimize: bool = False
+    asm = Assembler(DefaultOptions(optimize=optimize))
+    return asm.assemble_source(source), asm.optimizer
+
+
+def assemble_with_rules(source, rules):
+    grammar_path = pathlib.Path(__file__).parent / "grammar.lark"
+    parser = Lark(grammar_path.read_text(), parser='lalr')
+    builder = IRBuilder(PeepholeOptimizer(rules))
+    VmForthAssembler(builder, WordCollection()).visit(parser.parse(source))
+    return generate_machine_code(builder.ir)
+
+
+class TestPushPopPairs:
+    def test_push_followed_by_pop_of_same_register_is_removed(self):
+        source = """
+        codeblock
+            pushd %acc1
+            popd %acc1
+            pushr %wp
+            popr %wp
+            nop
+        end
+        """
+        binary, optimizer = assemble(source)
+
+        assert binary == b"\x00"
+        assert optimizer.instructions_removed == 4
+        assert optimizer.bytes_saved == 4
+
+    def test_push_and_pop_of_different_registers_are_kept(self):
+        source = """
+        codeblock
+            pushd %acc1
+            popd %acc2
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\xa4\xad"
+
+    def test_push_and_pop_on_different_stacks_are_kept(self):
+        source = """
+        codeblock
+            pushd %acc1
+            popr %acc1
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\xa4\xbc"
+
+    def test_pop_followed_by_push_is_kept(self):
+        source = """
+        codeblock
+            popd %acc1
+            pushd %acc1
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\xac\xa4"
+
+    def test_label_between_push_and_pop_prevents_removal(self):
+        source = """
+        codeblock
+            pushd %acc1
+        target:
+            popd %acc1
+            jmp :target
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\xa4\xac\x70\x01\x00\x00\x00"
+
+    def test_pairs_uncovered_by_removing_a_pair_are_removed(self):
+        source = """
+        codeblock
+            pushd %acc1
+            pushd %acc2
+            popd %acc2
+            popd %acc1
+        end
+        """
+        binary, optimizer = assemble(source)
+
+        assert binary == b""
+        assert optimizer.instructions_removed == 4
+
+
+class TestSelfMoves:
+    def test_moving_a_register_to_itself_is_removed(self):
+        source = """
+        codeblock
+            mov %acc1, %acc1
+            mov.b %wp, %wp
+            nop
+        end
+        """
+        binary, optimizer = assemble(source)
+
+        # the byte sized move clears the upper bits of %wp
+        assert binary == b"\x21\x11\x00"
+        assert optimizer.bytes_saved == 2
+
+    def test_indirect_moves_to_the_same_register_are_kept(self):
+        source = """
+        codeblock
+            mov %acc1, [%acc1]
+            mov [%acc1], %acc1
+            mov %ip, [%ip++]
+        end
+        """
+        binary, optimizer = assemble(source)
+
+        assert binary == b"\x20\x4c\x20\xc4\x24\x00"
+        assert optimizer.instructions_removed == 0
+
+
+class TestJumpsToNext:
+    def test_jump_to_next_instruction_is_removed(self):
+        source = """
+        codeblock
+            jmp :next
+        next:
+            nop
+        end
+        """
+        binary, optimizer = assemble(source)
+
+        assert binary == b"\x00"
+        assert optimizer.bytes_saved == 5
+
+    def test_conditional_jumps_to_next_instruction_are_removed(self):
+        source = """
+        codeblock
+            jz :next
+            jc :next
+        next:
+            nop
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\x00"
+
+    def test_calls_to_next_instruction_are_kept(self):
+        source = """
+        codeblock
+            call :next
+        next:
+            nop
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\x73\x05\x00\x00\x00\x00"
+
+    def test_jump_over_an_instruction_is_kept(self):
+        source = """
+        codeblock
+            jmp :next
+            nop
+        next:
+            nop
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\x70\x06\x00\x00\x00\x00\x00"
+
+
+class TestJumpThreading:
+    def test_jump_to_jump_goes_to_final_destination(self):
+        source = """
+        codeblock
+            jz :first
+            nop
+        first:
+            jmp :second
+            nop
+        second:
+            nop
+        end
+        """
+        binary, optimizer = assemble(source)
+
+        assert binary[0:5] == b"\x71\x0c\x00\x00\x00"
+        assert optimizer.instructions_removed == 0
+
+    def test_call_to_jump_goes_to_final_destination(self):
+        source = """
+        codeblock
+            call :first
+        first:
+            jmp :second
+            nop
+        second:
+            nop
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary[0:5] == b"\x73\x0b\x00\x00\x00"
+
+    def test_jump_cycles_do_not_stall_the_optimizer(self):
+        source = """
+        codeblock
+            jmp :first
+        second:
+            jmp :first
+        first:
+            jmp :second
+        end
+        """
+        binary, _ = assemble(source)
+
+        # the middle jump goes to the next instruction and after removing it,
+        # the first one does too. What's left is the endless loop itself.
+        assert binary == b"\x70\x00\x00\x00\x00"
+
+    def test_threading_can_create_jumps_to_next_that_are_removed(self):
+        source = """
+        codeblock
+            jmp :first
+        second:
+            nop
+        first:
+            jmp :second
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\x00" \
+                         b"\x70\x00\x00\x00\x00"
+
+
+class TestLabelsAndWords:
+    def test_labels_after_removed_instructions_are_moved(self):
+        source = """
+        codeblock
+            pushd %acc1
+            popd %acc1
+            jmp :target
+        target:
+            dw :target
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\x00\x00\x00\x00"
+
+    def test_word_references_and_back_links_follow_removed_code(self):
+        source = """
+        def asm(code) WORD1
+            mov %acc1, %acc1
+        end
+        def word(colon) WORD2
+            WORD1
+        end
+        """
+        binary, _ = assemble(source)
+
+        # WORD1: back-link (4), length (1), name (5), code removed
+        assert binary[0:10] == b"\x00\x00\x00\x00\x05WORD1"
+        # WORD2: back-link to WORD1 and reference to the CFA of WORD1
+        assert binary[10:14] == b"\x00\x00\x00\x00"
+        assert binary[14:20] == b"\x05WORD2"
+        assert binary[20:24] == b"\x0a\x00\x00\x00"
+
+    def test_dollar_is_moved_with_the_code(self):
+        source = """
+        codeblock
+            mov %acc2, %acc2
+            dw $
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\x00\x00\x00\x00"
+
+    def test_without_optimization_nothing_is_removed(self):
+        source = """
+        codeblock
+            pushd %acc1
+            popd %acc1
+        end
+        """
+        binary, optimizer = assemble(source, optimize=False)
+
+        assert binary == b"\xa4\xac"
+        assert optimizer is None
+
+
+def test_rules_can_be_selected():
+    source = """
+    codeblock
+        pushd %acc1
+        popd %acc1
+        mov %acc1, %acc1
+    end
+    """
+
+    assert assemble_with_rules(source, []) == b"\xa4\xac\x20\x44"
+    assert assemble_with_rules(source, [remove_push_pop_pairs]) == \
+        b"\x20\x44"
+    assert assemble_with_rules(source, [remove_self_moves]) == b"\xa4\xac"
+    assert assemble_with_rules(source, [remove_jumps_to_next,
+                                        thread_jumps]) == b"\xa4\xac\x20\x44"
@@ -0,0 +1,126 @@
+from fbuilder.app import Assembler
+from fbuilder.backends import generate_listing
+from dataclasses import dataclass
+import pytest
+
+
+def assemble(source, short_branches=True):
+    @dataclass
+    class DefaultOptions:
+        format: str = "bin"
+        short_branches: bool = False
+    asm = Assembler(DefaultOptions(short_branches=short_branches))
+    return asm.assemble_source(source), asm
+
+
+class TestShortBranches:
+    def test_forward_jump_in_reach_is_shortened(self):
+        source = """
+        codeblock
+            jmp :target
+            nop
+        target:
+            nop
+        end
+        """
+        binary, asm = assemble(source)
+
+        assert binary == b"\x74\x01\x00\x00"
+        assert asm.relaxation.branches_shortened == 1
+        assert asm.relaxation.bytes_saved == 3
+
+    def test_backward_branches_are_shortened(self):
+        source = """
+        codeblock
+        loop:
+            nop
+            jz :loop
+            jc :loop
+            call :loop
+        end
+        """
+        binary, _ = assemble(source)
+
+        assert binary == b"\x00\x75\xfd\x76\xfb\x77\xf9"
+
+    def test_branches_are_kept_long_without_the_option(self):
+        source = """
+        codeblock
+            jmp :target
+        target:
+            nop
+        end
+        """
+        binary, asm = assemble(source, short_branches=False)
+
+        assert binary == b"\x70\x05\x00\x00\x00\x00"
+        assert asm.relaxation is None
+
+    def test_branches_out_of_reach_stay_long(self):
+        source = "codeblock\n    jmp :target\n" + "    db #0\n" * 128 + \
+            "target:\n    nop\nend\n"
+        binary, asm = assemble(source)
+
+        assert binary[:5] == b"\x70\x85\x00\x00\x00"
+        assert asm.relaxation.branches_shortened == 0
+
+    def test_growing_branches_push_other_branches_out_of_reach(self):
+        # the first jump only reaches its target while the second one is
+        # short, the second one can't reach its target across the data
+        source = "codeblock\n    jmp :first\n" + "    db #0\n" * 124 + \
+            "    jmp :second\nfirst:\n" + "    db #0\n" * 128 + \
+            "second:\n    nop\nend\n"
+        binary, asm = assemble(source)
+
+        assert binary[0] == 0x70
+        assert binary[5 + 124] == 0x70
+        assert asm.relaxation.branches_shortened == 0
+        assert asm.relaxation.passes == 3
+
+    def test_expressions_keep_the_absolute_encoding(self):
+        source = """
+        codeblock
+            jmp :target + #1
+        target:
+            nop
+            nop
+        end
+        """
+        binary, asm = assemble(source)
+
+        assert binary[:5] == b"\x70\x06\x00\x00\x00"
+        assert asm.relaxation.branches_shortened == 0
+
+    def test_labels_follow_the_shortened_code(self):
+        source = """
+        codeblock
+            jmp :target
+        target:
+            dw :target
+        end
+        """
+        binary, asm = assemble(source)
+
+        assert binary == b"\x74\x00\x02\x00\x00\x00"
+        assert asm.symbol_table["target"] == 2
+
+    def test_undefined_labels_still_fail(self):
+        source = """
+        codeblock
+            jmp :nowhere
+        end
+        """
+        with pytest.raises(KeyError):
+            assemble(source)
+
+    def test_listing_shows_short_branches_with_their_label(self):
+        source = """
+        codeblock
+        loop:
+            jmp :loop
+        end
+        """
+        _, asm = assemble(source)
+
+        assert "00000000: 74 fe              jmp :loop\n" in \
+            generate_listing(asm.ir)
@@ -0,0 +1,102 @@
+from fbuilder.app import Assembler
+from fbuilder.symbol_file import SymbolFile, write_symbol_file, MAGIC
+from dataclasses import dataclass
+import pytest
+import random
+
+
+@pytest.fixture
+def symbol_path(tmp_path):
+    return tmp_path / "test.sym"
+
+
+def linear_lookup(word_ranges, address):
+    return sorted((start, end, name) for name, start, end in word_ranges
+                  if start <= address < end)
+
+
+class TestSymbolFile:
+    def test_file_starts_with_magic(self, symbol_path):
+        write_symbol_file(symbol_path, [("DUP", 0x10, 0x20)])
+
+        assert symbol_path.read_bytes()[:4] == MAGIC
+
+    def test_addresses_resolve_to_their_symbol(self, symbol_path):
+        write_symbol_file(symbol_path, [("SWAP", 0x20, 0x30),
+                                        ("DUP", 0x10, 0x20)])
+
+        with SymbolFile(symbol_path) as symbols:
+            assert len(symbols) == 2
+            assert symbols.symbols_at(0x0f) == []
+            assert symbols.symbols_at(0x10) == ["DUP"]
+            assert symbols.symbols_at(0x1f) == ["DUP"]
+            assert symbols.symbols_at(0x20) == ["SWAP"]
+            assert symbols.symbols_at(0x30) == []
+
+    def test_nested_ranges_return_all_symbols(self, symbol_path):
+        write_symbol_file(symbol_path, [("inner", 0x14, 0x18),
+                                        ("outer", 0x10, 0x40),
+                                        ("next", 0x40, 0x50)])
+
+        with SymbolFile(symbol_path) as symbols:
+            assert symbols.symbols_at(0x15) == ["outer", "inner"]
+            assert symbols.symbols_at(0x20) == ["outer"]
+
+    def test_names_are_stored_as_utf8(self, symbol_path):
+        write_symbol_file(symbol_path, [("ÄÖÜ", 0x0, 0x4)])
+
+        with SymbolFile(symbol_path) as symbols:
+            assert symbols.symbols_at(0x2) == ["ÄÖÜ"]
+
+    @pytest.mark.parametrize("with_index", [True, False])
+    def test_queries_match_a_linear_scan(self, symbol_path, with_index):
+        generator = random.Random(1)
+        word_ranges = []
+        for number in range(500):
+            start = generator.randrange(0x10000)
+            word_ranges.append((f"w{number}", start,
+                                start + generator.randrange(1, 0x400)))
+        write_symbol_file(symbol_path, word_ranges, with_index)
+
+        with SymbolFile(symbol_path) as symbols:
+            for address in range(0, 0x10400, 0x41):
+                found = [(symbols.starts()[record], symbols.ends()[record],
+                          symbols.name(record))
+                         for record in symbols.records_at(address)]
+                assert found == linear_lookup(word_ranges, address)
+
+    def test_other_files_are_rejected(self, symbol_path):
+        symbol_path.write_text('"DUP",16,32\n' * 4)
+
+        with pytest.raises(ValueError):
+            SymbolFile(symbol_path)
+
+
+class TestAssemblerOutput:
+    @dataclass
+    class Options:
+        input: object
+        output: object
+        symbol_format: str = "bin"
+        format: str = "bin"
+        symbol_table: bool = True
+
+    def assemble(self, tmp_path, symbol_format):
+        source = tmp_path / "test.fvs"
+        source.write_text("""
+        def asm(code) DUP
+            nop
+        end
+        """)
+        options = self.Options(source, tmp_path / "test.bin", symbol_format)
+        Assembler(options).assemble_file()
+        return tmp_path / "test.sym"
+
+    def test_binary_symbol_file_is_written(self, tmp_path):
+        with SymbolFile(self.assemble(tmp_path, "bin")) as symbols:
+            assert symbols.symbols_at(symbols.starts()[0]) == ["dup"]
+
+    def test_csv_symbol_file_is_still_available(self, tmp_path):
+        symbol_path = self.assemble(tmp_path, "csv")
+
+        assert symbol_path.read_text().startswith('"dup",')
@@ -0,0 +1,64 @@
+from fbuilder.address_map import AddressMap
+import pytest
+
+np = pytest.importorskip("numpy")
+from fbuilder.trace import (TraceReader, symbolize, HEADER, RECORD,  # noqa
+                            MAGIC)
+
+
+def write_trace(path, pcs, capacity):
+    header = np.zeros(1, dtype=HEADER)
+    header["magic"] = MAGIC
+    header["version"] = 1
+    header["record_size"] = RECORD.itemsize
+    header["capacity"] = capacity
+    header["total"] = len(pcs)
+    records = np.zeros(capacity, dtype=RECORD)
+    for number, pc in enumerate(pcs):
+        records[number % capacity]["pc"] = pc
+        records[number % capacity]["opcode"] = number
+    with open(path, "wb") as trace_file:
+        trace_file.write(header.tobytes())
+        trace_file.write(records.tobytes())
+
+
+class TestTraceReader:
+    def test_records_are_read_in_chunks(self, tmp_path):
+        path = tmp_path / "test.trc"
+        write_trace(path, range(0, 40, 4), capacity=16)
+
+        trace = TraceReader(path)
+        chunks = list(trace.chunks(chunk_size=4))
+
+        assert len(trace) == 10
+        assert trace.dropped == 0
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+        assert list(np.concatenate(chunks)["pc"]) == list(range(0, 40, 4))
+
+    def test_wrapped_traces_start_with_the_oldest_record(self, tmp_path):
+        path = tmp_path / "test.trc"
+        write_trace(path, range(10), capacity=4)
+
+        trace = TraceReader(path)
+        records = np.concatenate(list(trace.chunks(chunk_size=3)))
+
+        assert len(trace) == 4
+        assert trace.dropped == 6
+        assert list(records["pc"]) == [6, 7, 8, 9]
+        assert list(records["opcode"]) == [6, 7, 8, 9]
+
+    def test_other_files_are_rejected(self, tmp_path):
+        path = tmp_path / "test.trc"
+        path.write_bytes(b"FSYM" + bytes(60))
+
+        with pytest.raises(ValueError):
+            TraceReader(path)
+
+    def test_records_are_symbolized_with_the_address_map(self, tmp_path):
+        path = tmp_path / "test.trc"
+        write_trace(path, [0x10, 0x24, 0x50], capacity=4)
+        address_map = AddressMap([("dup", 0x10, 0x20), ("swap", 0x20, 0x30)])
+
+        records = next(TraceReader(path).chunks())
+
+        assert list(symbolize(records, address_map)) == ["dup", "swap", None]
@@ -0,0 +1,93 @@
+from fbuilder.turnkey import build_turnkey_image, import_vm_module, \
+    AssemblerOptions
+from fbuilder.app import Assembler
+import pytest
+
+try:
+    forth_vm = import_vm_module()
+except ImportError:
+    forth_vm = None
+
+pytestmark = pytest.mark.skipif(forth_vm is None,
+                                reason="forth_vm module not built")
+
+# Defines a word for every character of its input, a stand in for the
+# compiler of the system
+SYSTEM_SOURCE = """
+include "eforth/vm_core.fvs"
+include "eforth/eforth_basics.fvs"
+
+codeblock
+start_word:
+    dt :grow_cfa
+end
+
+include "eforth/eforth_core.fvs"
+
+def word(colon) GROW
+grow_loop:
+    KEY                         // the name, before anything is changed
+    CONTEXT @ N>LINK HERE !     // link to the last word
+    doLIT 4 CP +!
+    HERE CONTEXT !              // the new name is found first
+    doLIT 1 HERE C!
+    HERE doLIT 1 + C!
+    doLIT 2 CP +!
+    BRANCH :grow_loop
+end
+"""
+
+
+def assembled_labels():
+    assembler = Assembler(AssemblerOptions())
+    binary = assembler.assemble_source(SYSTEM_SOURCE)
+    return binary, assembler.symbol_table
+
+
+def test_image_holds_the_words_defined_while_running():
+    binary, labels = assembled_labels()
+    image_end = labels["__last_end"]
+
+    turnkey = build_turnkey_image(SYSTEM_SOURCE, b"ab", forth_vm)
+
+    assert len(turnkey.binary) == image_end + 12
+    assert turnkey.binary[:labels["u_context"]] == \
+        binary[:labels["u_context"]]
+    assert turnkey.binary[image_end + 4:image_end + 6] == b"\x01a"
+    assert turnkey.binary[image_end + 10:image_end + 12] == b"\x01b"
+    assert ("a", image_end, image_end + 6) in turnkey.word_ranges
+    assert ("b", image_end + 6, image_end + 12) in turnkey.word_ranges
+    assert ("grow", labels["grow_nfa"] - 4, image_end) in turnkey.word_ranges
+
+
+def test_user_area_points_to_the_grown_dictionary():
+    _, labels = assembled_labels()
+    image_end = labels["__last_end"]
+
+    turnkey = build_turnkey_image(SYSTEM_SOURCE, b"ab", forth_vm)
+
+    def read32(address):
+        return int.from_bytes(turnkey.binary[address:address + 4], "little")
+    assert read32(labels["u_ctop"]) == image_end + 12
+    assert read32(labels["u_context"]) == image_end + 10
+    assert read32(image_end + 6) == image_end
+
+
+def test_image_starts_with_the_boot_word():
+    turnkey = build_turnkey_image(SYSTEM_SOURCE, b"ab", forth_vm,
+                                  boot_word="BYE")
+
+    vm = forth_vm.Vm()
+    vm.memory.load_image(turnkey.binary)
+    assert vm.interpret(max_steps=100) == forth_vm.Result.Finished
+
+
+def test_unknown_boot_words_are_rejected():
+    with pytest.raises(ValueError):
+        build_turnkey_image(SYSTEM_SOURCE, b"", forth_vm, boot_word="none")
+
+
+def test_systems_that_do_not_stop_are_reported():
+    with pytest.raises(RuntimeError):
+        build_turnkey_image(SYSTEM_SOURCE, b"abc" * 100, forth_vm,
+                            max_steps=100)
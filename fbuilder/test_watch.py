@@ -0,0 +1,90 @@
+from fbuilder.app import Assembler
+from fbuilder.sources import SourceCache
+from fbuilder.watch import WatchBuilder
+from dataclasses import dataclass
+import os
+import pathlib
+import pytest
+
+
+@dataclass
+class Options:
+    input: pathlib.Path
+    output: pathlib.Path
+    format: str = "bin"
+    symbol_table: bool = True
+    listing: bool = True
+
+
+MAIN_SOURCE = """
+include "words.fvs"
+codeblock
+start:
+    dt :second_cfa
+end
+"""
+
+WORDS_SOURCE = """
+def asm(code) FIRST
+    nop
+end
+def asm(code) SECOND
+    nop
+end"""
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    # included files are found relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "main.fvs").write_text(MAIN_SOURCE)
+    (tmp_path / "words.fvs").write_text(WORDS_SOURCE)
+    return tmp_path
+
+
+def edit(path, text):
+    # make the change visible even on file systems with coarse time stamps
+    status = path.stat()
+    path.write_text(text)
+    os.utime(path, ns=(status.st_atime_ns, status.st_mtime_ns + 10**9))
+
+
+def test_included_files_are_replaced_by_their_definitions(sources):
+    tree = SourceCache().parse(sources / "main.fvs")
+    expected = Assembler(Options(None, None)).assemble_source(MAIN_SOURCE)
+
+    assert Assembler(Options(None, None)).assemble_tree(tree) == expected
+
+
+def test_only_changed_files_are_parsed_again(sources):
+    cache = SourceCache()
+    cache.parse(sources / "main.fvs")
+    assert cache.parsed == [sources / "main.fvs", pathlib.Path("words.fvs")]
+    assert not cache.changed()
+
+    edit(sources / "words.fvs", WORDS_SOURCE.replace("nop", "nop\nnop"))
+    assert cache.changed()
+    cache.parse(sources / "main.fvs")
+    assert cache.parsed == [pathlib.Path("words.fvs")]
+
+
+def test_including_a_file_from_itself_is_reported(sources):
+    (sources / "words.fvs").write_text('include "main.fvs"\n')
+    with pytest.raises(ValueError):
+        SourceCache().parse(sources / "main.fvs")
+
+
+def test_outputs_are_written_again_after_changes(sources):
+    builder = WatchBuilder(Options(sources / "main.fvs",
+                                   sources / "main.bin"))
+    assert builder.build() > 0
+    binary = (sources / "main.bin").read_bytes()
+    assert (sources / "main.sym").exists()
+    assert (sources / "main.lst").exists()
+    assert builder.build_if_changed() is None
+
+    edit(sources / "words.fvs", WORDS_SOURCE.replace("nop", "nop\nnop", 1))
+    assert builder.build_if_changed() is not None
+    assert len((sources / "main.bin").read_bytes()) == len(binary) + 1
+    assert sorted(path.name for path in sources.iterdir()) == \
+        ["main.bin", "main.fvs", "main.lst", "main.sym", "words.fvs"]
@@ -0,0 +1,54 @@
+from fbuilder.address_map import AddressMap
+from fbuilder.word_profile import Profile
+import pytest
+
+ADDRESS_MAP = AddressMap([("outer", 0x100, 0x110), ("inner", 0x200, 0x210),
+                          ("exit", 0x300, 0x310)])
+
+
+@pytest.fixture
+def profile(tmp_path):
+    path = tmp_path / "test.prof"
+    path.write_text("# forth-vm-sim profile 1\n"
+                    "0 0 0x0 4 0\n"
+                    "1 0 0x10b 10 1\n"
+                    "2 1 0x20a 20 2\n"
+                    "3 2 0x10b 5 1\n"
+                    "4 1 0x30a 3 1\n")
+    return Profile.from_file(path)
+
+
+class TestProfile:
+    def test_nodes_are_named_after_their_words(self, profile):
+        assert profile.names(ADDRESS_MAP) == ["[vm]", "outer", "inner",
+                                              "outer", "exit"]
+
+    def test_word_statistics_are_sorted_by_own_instructions(self, profile):
+        statistics = profile.word_statistics(ADDRESS_MAP)
+
+        assert [(entry.name, entry.instructions, entry.dispatches)
+                for entry in statistics] == [
+            ("inner", 20, 2), ("outer", 15, 2), ("[vm]", 4, 0),
+            ("exit", 3, 1)]
+
+    def test_totals_count_recursive_words_once(self, profile):
+        totals = {entry.name: entry.total_instructions
+                  for entry in profile.word_statistics(ADDRESS_MAP)}
+
+        assert totals == {"[vm]": 42, "outer": 38, "inner": 25, "exit": 3}
+
+    def test_collapsed_stacks_have_one_line_per_path(self, profile):
+        assert list(profile.collapsed_stacks(ADDRESS_MAP)) == [
+            "[vm] 4",
+            "[vm];outer 10",
+            "[vm];outer;inner 20",
+            "[vm];outer;inner;outer 5",
+            "[vm];outer;exit 3",
+        ]
+
+    def test_malformed_profiles_are_rejected(self, tmp_path):
+        path = tmp_path / "test.prof"
+        path.write_text("# forth-vm-sim profile 1\n0 0 0x0 4\n")
+
+        with pytest.raises(ValueError, match="on line 2"):
+            Profile.from_file(path)
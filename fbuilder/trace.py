@@ -0,0 +1,70 @@
+"""Decoder for the binary instruction traces of the VM.
+
+The VM writes traces with `--trace-file` into a ring buffer file: a 32 byte
+header followed by fixed-size records, see `src/trace_file.h`. The reader maps
+the file with `numpy.memmap` and hands out the records in the order they were
+written, in chunks, so traces much larger than memory can be processed.
+"""
+import numpy as np
+
+MAGIC = b"FTRC"
+VERSION = 1
+HEADER_SIZE = 32
+
+HEADER = np.dtype([("magic", "S4"), ("version", "<u2"),
+                   ("record_size", "<u2"), ("capacity", "<u4"),
+                   ("unused", "<u4"), ("total", "<u8"), ("reserved", "V8")])
+RECORD = np.dtype([("pc", "<u4"), ("ip", "<u4"), ("wp", "<u4"),
+                   ("rsp", "<u4"), ("dsp", "<u4"), ("acc1", "<u4"),
+                   ("acc2", "<u4"), ("opcode", "u1"), ("flags", "u1"),
+                   ("reserved", "<u2")])
+FLAG_CARRY = 0x1
+
+
+class TraceReader:
+    def __init__(self, file_path):
+        header = np.fromfile(file_path, dtype=HEADER, count=1)
+        if len(header) != 1 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{file_path} is no trace file")
+        if header["version"][0] != VERSION:
+            raise ValueError(f"Unsupported trace version "
+                             f"{header['version'][0]}")
+        if header["record_size"][0] != RECORD.itemsize:
+            raise ValueError(f"Unexpected trace record size "
+                             f"{header['record_size'][0]}")
+
+        self.capacity = int(header["capacity"][0])
+        self.total = int(header["total"][0])
+        self.records = np.memmap(file_path, dtype=RECORD, mode="r",
+                                 offset=HEADER_SIZE, shape=(self.capacity,))
+
+    def __len__(self):
+        """Amount of records still in the trace"""
+        return min(self.total, self.capacity)
+
+    @property
+    def dropped(self):
+        """Amount of records overwritten by later ones"""
+        return self.total - len(self)
+
+    def chunks(self, chunk_size=1 << 16):
+        """Yield the records in chronological order, in arrays of at most
+        chunk_size records"""
+        if self.dropped:
+            oldest = self.total % self.capacity
+            ranges = ((oldest, self.capacity), (0, oldest))
+        else:
+            ranges = ((0, self.total),)
+        for start, end in ranges:
+            for chunk_start in range(start, end, chunk_size):
+                yield self.records[chunk_start:min(chunk_start + chunk_size,
+                                                   end)]
+
+
+def symbolize(records, address_map, register="pc"):
+    """Return the names of the innermost words containing a register of the
+    records, None outside of all words"""
+    words = address_map.lookup_array(records[register])
+    # NO_WORD (-1) picks the None at the end
+    names = np.array(address_map.names + [None], dtype=object)
+    return names[words]
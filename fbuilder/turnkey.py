@@ -0,0 +1,151 @@
+"""Boot an eForth system, let it compile Forth source and save the result.
+
+The system is assembled from its source and booted in the forth_vm module,
+which gets the Forth source as console input. Once the system has read all
+of it, or said BYE, the memory up to the top of the code dictionary, the
+value of CP, is saved as new image. It holds the user area at uzero and the
+words defined while running, which are added to the symbol file of the new
+image. With --boot the new image starts with that word instead of the one
+at start_word.
+
+    python -m fbuilder.turnkey eforth/eforth_system.fvs app.fs -o app.bin
+"""
+from fbuilder.app import Assembler
+from fbuilder.symbol_file import write_symbol_file
+from dataclasses import dataclass
+import argparse
+import pathlib
+import sys
+
+LENMASK = 0x1f
+DEFAULT_MAX_STEPS = 100_000_000
+
+
+@dataclass
+class AssemblerOptions:
+    format: str = "bin"
+    thread_cells: int = 32
+    optimize: bool = False
+    short_branches: bool = False
+
+
+@dataclass
+class TurnkeyImage:
+    binary: bytes
+    word_ranges: list
+
+
+def import_vm_module(build_directory="build-debug"):
+    """Import the forth_vm module, built into the build directory"""
+    if str(build_directory) not in sys.path:
+        sys.path.append(str(build_directory))
+    import forth_vm
+    return forth_vm
+
+
+def _read32(memory, address):
+    return int.from_bytes(memory[address:address + 4], "little")
+
+
+def defined_words(memory, labels):
+    """Return (name, lfa, nfa) of the words defined while running, oldest
+    first, by following the links from the newest word in CONTEXT"""
+    image_end = labels["__last_end"]
+    words = []
+    nfa = _read32(memory, labels["u_context"])
+    while nfa >= image_end + 4:
+        lfa = nfa - 4
+        length = memory[nfa] & LENMASK
+        name = bytes(memory[nfa + 1:nfa + 1 + length]).decode("latin-1")
+        words.append((name, lfa, nfa))
+        previous_lfa = _read32(memory, lfa)
+        # links always point back, anything else is no dictionary
+        if previous_lfa == 0 or previous_lfa >= lfa:
+            break
+        nfa = previous_lfa + 4
+    return words[::-1]
+
+
+def build_turnkey_image(system_source, forth_source, vm_module,
+                        boot_word=None, options=None,
+                        max_steps=DEFAULT_MAX_STEPS):
+    """Assemble the system, compile the Forth source in it and return the
+    saved image with the symbols of all its words"""
+    options = options or AssemblerOptions()
+    assembler = Assembler(options)
+    binary = assembler.assemble_source(system_source)
+    labels = assembler.symbol_table
+    word_ranges = list(assembler.symbols.word_ranges)
+
+    vm = vm_module.Vm()
+    vm.memory.load_image(binary)
+    vm.add_input(forth_source)
+    try:
+        result = vm.interpret(max_steps=max_steps)
+    except EOFError:
+        # waiting for more source
+        result = vm_module.Result.Finished
+    if result == vm_module.Result.Success:
+        raise RuntimeError(f"System still running after {max_steps} steps")
+    if result != vm_module.Result.Finished:
+        raise RuntimeError(f"System stopped with {result.name} at "
+                           f"{vm.registers[int(vm_module.Register.Pc)]:#x}")
+
+    memory = memoryview(vm.memory)
+    top = _read32(memory, labels["u_ctop"])
+    if top > len(memory):
+        raise RuntimeError(f"CP {top:#x} is beyond the memory")
+    image = bytearray(memory[:max(top, len(binary))])
+
+    words = defined_words(memory, labels)
+    ends = [lfa for _, lfa, _ in words[1:]] + [top]
+    for (name, lfa, _), end in zip(words, ends):
+        word_ranges.append((name.lower(), lfa, end))
+
+    if boot_word is not None:
+        cfa = labels.get(boot_word.lower() + "_cfa")
+        for name, _, nfa in words:
+            if name.lower() == boot_word.lower():
+                cfa = nfa + 1 + len(name)
+        if cfa is None:
+            raise ValueError(f"Unknown boot word {boot_word}")
+        cell_size = options.thread_cells // 8
+        start = labels["start_word"]
+        image[start:start + cell_size] = cfa.to_bytes(cell_size, "little")
+
+    return TurnkeyImage(bytes(image), word_ranges)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("system", type=pathlib.Path,
+                        help="FVS source of the eForth system")
+    parser.add_argument("source", type=pathlib.Path,
+                        help="Forth source compiled by the system")
+    parser.add_argument("-o", "--output", type=pathlib.Path, required=True,
+                        help="new image, its symbol file is written next "
+                             "to it")
+    parser.add_argument("--boot", metavar="WORD",
+                        help="word the new image starts with")
+    parser.add_argument("--thread-cells", type=int, choices=[16, 32],
+                        default=32,
+                        help="size in bits of the cells in threaded code")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS,
+                        help="instructions the system may run at most")
+    parser.add_argument("--build-directory", default="build-debug",
+                        help="directory holding the forth_vm module")
+    args = parser.parse_args()
+
+    vm_module = import_vm_module(args.build_directory)
+    turnkey = build_turnkey_image(
+        args.system.read_text(), args.source.read_bytes(), vm_module,
+        boot_word=args.boot,
+        options=AssemblerOptions(thread_cells=args.thread_cells),
+        max_steps=args.max_steps)
+    args.output.write_bytes(turnkey.binary)
+    write_symbol_file(args.output.with_suffix(".sym"), turnkey.word_ranges)
+    print(f"Saved {len(turnkey.binary)} bytes")
+
+
+if __name__ == "__main__":
+    main()
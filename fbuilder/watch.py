@@ -0,0 +1,54 @@
+"""Rebuild the outputs of the assembler whenever one of its sources changes.
+
+The parse trees of the source files are kept between builds, so after an
+edit only the edited file is parsed again. Laying out the code still
+assembles the whole program, as addresses of all following definitions move
+with every change.
+"""
+from .app import Assembler
+from .sources import SourceCache
+import time
+
+
+class WatchBuilder:
+    """Assembler keeping its sources parsed between builds"""
+
+    def __init__(self, options):
+        self.options = options
+        self.assembler = Assembler(options)
+        self.sources = SourceCache()
+
+    def build(self):
+        """Assemble the program and write its outputs, returning the time
+        taken in seconds"""
+        start = time.perf_counter()
+        tree = self.sources.parse(self.options.input)
+        self.assembler.write_outputs(self.assembler.assemble_tree(tree))
+        return time.perf_counter() - start
+
+    def build_if_changed(self):
+        """Build again if any source changed, None if nothing changed"""
+        if not self.sources.changed():
+            return None
+        return self.build()
+
+    def watch(self, interval=0.2):
+        """Build whenever a source changes, until interrupted"""
+        self._report(self.build)
+        print(f"Watching {len(self.sources.dependencies)} files")
+        while True:
+            time.sleep(interval)
+            self._report(self.build_if_changed)
+
+    def _report(self, build):
+        try:
+            duration = build()
+        except Exception as error:
+            # keep watching, the next change may fix the source
+            print(f"Build failed: {error}")
+            return None
+        if duration is not None:
+            parsed = ", ".join(path.name for path in self.sources.parsed)
+            print(f"Built {self.options.output.name} in "
+                  f"{duration * 1000:.0f} ms (parsed {parsed})")
+        return duration
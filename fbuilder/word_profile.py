@@ -0,0 +1,137 @@
+"""Turn profiles written by the VM with `--profile` into readable reports.
+
+The profile holds the call tree of the run: one node per word and call path,
+with the instructions run in the word itself and how often NEXT dispatched
+to it. Code field addresses are mapped to word names through the symbol file
+of the image. The report lists the words sorted by the instructions they ran
+themselves; collapsed stacks, one `caller;callee count` line per path, can be
+fed to flame graph tools.
+
+    python -m fbuilder.word_profile run.prof eforth/eforth_system.sym
+"""
+from fbuilder.address_map import AddressMap, NO_WORD
+from collections import defaultdict
+from dataclasses import dataclass
+import argparse
+
+HEADER = "# forth-vm-sim profile 1"
+
+
+@dataclass
+class WordStatistics:
+    name: str
+    instructions: int = 0
+    total_instructions: int = 0
+    dispatches: int = 0
+
+
+class Profile:
+    def __init__(self, parents, cfas, instructions, dispatches):
+        self.parents = parents
+        self.cfas = cfas
+        self.instructions = instructions
+        self.dispatches = dispatches
+
+    @classmethod
+    def from_file(cls, file_path):
+        parents, cfas, instructions, dispatches = [], [], [], []
+        with open(file_path) as profile_file:
+            if profile_file.readline().strip() != HEADER:
+                raise ValueError(f"{file_path} is no profile")
+            for line_number, line in enumerate(profile_file, start=2):
+                fields = line.split()
+                if len(fields) != 5 or int(fields[0]) != len(parents):
+                    raise ValueError(f"Malformed profile entry on line "
+                                     f"{line_number}")
+                parents.append(int(fields[1]))
+                cfas.append(int(fields[2], 16))
+                instructions.append(int(fields[3]))
+                dispatches.append(int(fields[4]))
+        return cls(parents, cfas, instructions, dispatches)
+
+    def __len__(self):
+        return len(self.parents)
+
+    def names(self, address_map):
+        """Return the name of the word of every node"""
+        names = []
+        for node, cfa in enumerate(self.cfas):
+            word = address_map.lookup(cfa) if node else NO_WORD
+            if node == 0:
+                names.append("[vm]")
+            elif word == NO_WORD:
+                names.append(f"{cfa:#x}")
+            else:
+                names.append(address_map.names[word])
+        return names
+
+    def paths(self, address_map):
+        """Return the call path of every node as tuple of names"""
+        names = self.names(address_map)
+        paths = [(names[0],)]
+        # parents always come before their children
+        for node in range(1, len(self)):
+            paths.append(paths[self.parents[node]] + (names[node],))
+        return paths
+
+    def word_statistics(self, address_map):
+        """Return the statistics per word, sorted by the instructions run in
+        the word itself"""
+        names = self.names(address_map)
+        statistics = {}
+        for node, name in enumerate(names):
+            entry = statistics.setdefault(name, WordStatistics(name))
+            entry.instructions += self.instructions[node]
+            entry.dispatches += self.dispatches[node]
+
+        # instructions including called words, counted once per word even
+        # for recursive paths
+        totals = defaultdict(int)
+        for path, instructions in zip(self.paths(address_map),
+                                      self.instructions):
+            for name in set(path):
+                totals[name] += instructions
+        for name, entry in statistics.items():
+            entry.total_instructions = totals[name]
+
+        return sorted(statistics.values(),
+                      key=lambda entry: (-entry.instructions, entry.name))
+
+    def collapsed_stacks(self, address_map):
+        """Yield `path count` lines with the instructions per call path"""
+        for path, instructions in zip(self.paths(address_map),
+                                      self.instructions):
+            if instructions:
+                yield f"{';'.join(path)} {instructions}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("profile", help="profile written by the VM")
+    parser.add_argument("symbols", help="symbol file of the profiled image")
+    parser.add_argument("-n", "--top", type=int, default=20,
+                        help="amount of words to list")
+    parser.add_argument("--collapsed", metavar="FILE",
+                        help="write collapsed stacks for flame graphs")
+    args = parser.parse_args()
+
+    profile = Profile.from_file(args.profile)
+    address_map = AddressMap.from_file(args.symbols)
+
+    statistics = profile.word_statistics(address_map)
+    total = sum(entry.instructions for entry in statistics) or 1
+    print(f"{'word':<20} {'self':>12} {'%':>6} {'total':>12} "
+          f"{'dispatches':>12}")
+    for entry in statistics[:args.top]:
+        print(f"{entry.name:<20} {entry.instructions:>12} "
+              f"{entry.instructions / total * 100:>6.1f} "
+              f"{entry.total_instructions:>12} {entry.dispatches:>12}")
+
+    if args.collapsed:
+        with open(args.collapsed, "w") as collapsed_file:
+            for line in profile.collapsed_stacks(address_map):
+                collapsed_file.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#include "breakpoints.h"
+#include <algorithm>
+#include <stdexcept>
+
+void AddressBitmap::insert(uint32_t address) {
+    if (page_numbers.empty()) {
+        page_numbers.resize(size_t(1) << (32 - PAGE_BITS));
+    }
+    uint32_t &page = page_numbers[address >> PAGE_BITS];
+    if (page == 0) {
+        pages.emplace_back();
+        page = pages.size();
+    }
+    pages[page - 1][(address >> 6) & 0x3f] |= uint64_t(1) << (address & 0x3f);
+}
+
+void AddressBitmap::clear() {
+    page_numbers.clear();
+    pages.clear();
+}
+
+void Breakpoints::add(uint32_t address) {
+    addresses.insert(address);
+    breakpoint_bits.insert(address);
+}
+
+bool Breakpoints::remove(uint32_t address) {
+    if (!addresses.erase(address)) {
+        return false;
+    }
+    breakpoint_bits.clear();
+    for (auto breakpoint: addresses) {
+        breakpoint_bits.insert(breakpoint);
+    }
+    return true;
+}
+
+void Breakpoints::watch(uint32_t start, uint32_t size) {
+    if ((size == 0) || (start + uint64_t(size) > (uint64_t(1) << 32))) {
+        throw std::invalid_argument("Watched range outside of the address space");
+    }
+    watched.push_back(Watchpoint{start, size});
+    for (uint64_t address=start; address<start + uint64_t(size); address++) {
+        watched_bits.insert(address);
+    }
+}
+
+bool Breakpoints::unwatch(uint32_t start) {
+    auto removed = std::remove_if(watched.begin(), watched.end(), [start](const Watchpoint &watchpoint) {
+        return watchpoint.start == start;
+    });
+    if (removed == watched.end()) {
+        return false;
+    }
+    watched.erase(removed, watched.end());
+    watched_bits.clear();
+    for (const auto &watchpoint: watched) {
+        for (uint64_t address=watchpoint.start; address<watchpoint.start + uint64_t(watchpoint.size); address++) {
+            watched_bits.insert(address);
+        }
+    }
+    return true;
+}
@@ -0,0 +1,75 @@
+#ifndef BREAKPOINTS_H
+#define BREAKPOINTS_H
+
+#include <stdint.h>
+#include <array>
+#include <set>
+#include <vector>
+
+// Set of addresses of the 32-bit address space, kept as bitmaps of the
+// 4 KiB pages holding any of them. A lookup is an index into the page table
+// and a bit test, without hashing.
+class AddressBitmap {
+public:
+    void insert(uint32_t address);
+    void clear();
+
+    bool empty() const { return pages.empty(); }
+    bool contains(uint32_t address) const {
+        if (pages.empty()) {
+            return false;
+        }
+        uint32_t page = page_numbers[address >> PAGE_BITS];
+        return (page != 0) && ((pages[page - 1][(address >> 6) & 0x3f] >> (address & 0x3f)) & 1);
+    }
+
+private:
+    static constexpr uint32_t PAGE_BITS = 12;
+
+    // number of the bitmap of every page plus 1, 0 for pages without any
+    // address
+    std::vector<uint32_t> page_numbers;
+    std::vector<std::array<uint64_t, 64>> pages;
+};
+
+// Breakpoints and watchpoints of the VM debugger.
+//
+// The VM stops before running an instruction at a breakpoint and after
+// running an instruction that changed the memory in a watched range.
+class Breakpoints {
+public:
+    struct Watchpoint {
+        uint32_t start;
+        uint32_t size;
+    };
+
+    void add(uint32_t address);
+    bool remove(uint32_t address);
+    void watch(uint32_t start, uint32_t size);
+    bool unwatch(uint32_t start);
+
+    bool empty() const { return addresses.empty() && watched.empty(); }
+    const std::set<uint32_t>& breakpoints() const { return addresses; }
+    const std::vector<Watchpoint>& watchpoints() const { return watched; }
+
+    bool isBreakpoint(uint32_t address) const { return breakpoint_bits.contains(address); }
+    bool isWatched(uint32_t address, uint32_t size) const {
+        if (watched_bits.empty()) {
+            return false;
+        }
+        for (uint32_t offset=0; offset<size; offset++) {
+            if (watched_bits.contains(address + offset)) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+private:
+    std::set<uint32_t> addresses;
+    std::vector<Watchpoint> watched;
+    AddressBitmap breakpoint_bits;
+    AddressBitmap watched_bits;
+};
+
+#endif
@@ -0,0 +1,144 @@
+#include "console.h"
+#include <cstdio>
+#include <iostream>
+#ifdef _WIN32
+#include <conio.h>
+#include <io.h>
+#else
+#include <cerrno>
+#include <curses.h>
+#include <poll.h>
+#include <unistd.h>
+#endif
+
+namespace {
+
+long read_fd(int fd, char *data, size_t count) {
+#ifdef _WIN32
+    return _read(fd, data, static_cast<unsigned int>(count));
+#else
+    return ::read(fd, data, count);
+#endif
+}
+
+void write_fd(int fd, const char *data, size_t count) {
+    while (count > 0) {
+#ifdef _WIN32
+        long written = _write(fd, data, static_cast<unsigned int>(count));
+#else
+        long written = ::write(fd, data, count);
+#endif
+        if (written <= 0) {
+            return;
+        }
+        data += written;
+        count -= written;
+    }
+}
+
+}
+
+int TerminalConsole::read() {
+    return getch();
+}
+
+void TerminalConsole::write(const char *data, size_t count) {
+    std::cout.write(data, count);
+}
+
+void TerminalConsole::flush() {
+    std::cout.flush();
+}
+
+HeadlessConsole::HeadlessConsole(int input_fd, int output_fd)
+: input_fd(input_fd)
+, output_fd(output_fd)
+, input_buffer(INPUT_BUFFER_SIZE) {
+    output_buffer.reserve(OUTPUT_BUFFER_SIZE);
+}
+
+HeadlessConsole::~HeadlessConsole() {
+    flush();
+}
+
+long HeadlessConsole::fill_input_buffer() {
+#ifndef _WIN32
+    // the output asking for the input must be visible before waiting for
+    // it. The input stays blocking, its flags belong to the open file, which
+    // is shared with std::cin and other processes using the same input
+    pollfd input_poll = {input_fd, POLLIN, 0};
+    if (poll(&input_poll, 1, 0) == 0) {
+        flush();
+    }
+#else
+    flush();
+#endif
+    while (true) {
+        // read() returns as soon as some data is available in the pipe, so
+        // interactive input through a pipe isn't held back by the buffer
+        auto count = read_fd(input_fd, input_buffer.data(), input_buffer.size());
+#ifndef _WIN32
+        if ((count < 0) && (errno == EINTR)) {
+            continue;
+        }
+#endif
+        return count;
+    }
+}
+
+int HeadlessConsole::read() {
+    if (input_position == input_count) {
+        auto count = fill_input_buffer();
+        if (count <= 0) {
+            return END_OF_INPUT;
+        }
+        input_position = 0;
+        input_count = count;
+    }
+    return static_cast<unsigned char>(input_buffer[input_position++]);
+}
+
+void HeadlessConsole::write(const char *data, size_t count) {
+    if (output_buffer.size() + count > OUTPUT_BUFFER_SIZE) {
+        flush();
+    }
+    if (count > OUTPUT_BUFFER_SIZE) {
+        write_fd(output_fd, data, count);
+        return;
+    }
+    output_buffer.insert(output_buffer.end(), data, data + count);
+}
+
+void HeadlessConsole::flush() {
+    // output written through std::cout or stdio before must come first
+    std::cout.flush();
+    std::fflush(stdout);
+    write_fd(output_fd, output_buffer.data(), output_buffer.size());
+    output_buffer.clear();
+}
+
+void BufferConsole::addInput(const std::string &data) {
+    input.erase(0, input_position);
+    input_position = 0;
+    input += data;
+}
+
+std::string BufferConsole::takeOutput() {
+    std::string taken;
+    taken.swap(output);
+    return taken;
+}
+
+int BufferConsole::read() {
+    if (input_position == input.size()) {
+        return END_OF_INPUT;
+    }
+    return static_cast<unsigned char>(input[input_position++]);
+}
+
+void BufferConsole::write(const char *data, size_t count) {
+    output.append(data, count);
+}
+
+void BufferConsole::flush() {
+}
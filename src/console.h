@@ -0,0 +1,81 @@
+#ifndef CONSOLE_H
+#define CONSOLE_H
+
+#include <stddef.h>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+// Thrown by the VM when reading from a console without further input or
+// when Ctrl-C was pressed, both end the run
+class end_of_input : public std::runtime_error {
+public:
+    using std::runtime_error::runtime_error;
+};
+
+// Character I/O of the VM, used by the ifkt console functions
+class Console {
+public:
+    static constexpr int END_OF_INPUT = -1;
+
+    virtual ~Console() = default;
+
+    // Returns the next character or END_OF_INPUT
+    virtual int read() = 0;
+    virtual void write(const char *data, size_t count) = 0;
+    virtual void flush() = 0;
+};
+
+// Interactive console reading single keys through curses
+class TerminalConsole : public Console {
+public:
+    int read() override;
+    void write(const char *data, size_t count) override;
+    void flush() override;
+};
+
+// Console for batch runs without a terminal; output is collected in a large
+// buffer, input is read from a pipe or file in chunks. The buffered output is
+// flushed whenever the VM has to wait for more input.
+class HeadlessConsole : public Console {
+public:
+    static constexpr size_t OUTPUT_BUFFER_SIZE = 1 << 20;
+    static constexpr size_t INPUT_BUFFER_SIZE = 4096;
+
+    explicit HeadlessConsole(int input_fd = 0, int output_fd = 1);
+    ~HeadlessConsole() override;
+
+    int read() override;
+    void write(const char *data, size_t count) override;
+    void flush() override;
+
+private:
+    long fill_input_buffer();
+
+    int input_fd;
+    int output_fd;
+    std::vector<char> output_buffer;
+    std::vector<char> input_buffer;
+    size_t input_position = 0;
+    size_t input_count = 0;
+};
+
+// Console reading its input from and writing its output to strings, for
+// running the VM embedded in other programs
+class BufferConsole : public Console {
+public:
+    void addInput(const std::string &data);
+    // Returns the output written since the last call
+    std::string takeOutput();
+
+    int read() override;
+    void write(const char *data, size_t count) override;
+    void flush() override;
+
+private:
+    std::string input;
+    size_t input_position = 0;
+    std::string output;
+};
+
+#endif
@@ -0,0 +1,51 @@
+#ifndef INTERVAL_INDEX_H
+#define INTERVAL_INDEX_H
+
+#include <stddef.h>
+#include <stdint.h>
+#include <algorithm>
+#include <vector>
+
+// Stabbing queries over half-open intervals sorted by their start.
+//
+// The sorted intervals are read as an implicit balanced binary tree, where the
+// middle interval of a range is the root and both halves are its subtrees.
+// For every interval the index stores the largest end within its subtree, so
+// a query skips all subtrees that end before the address. Lookups take
+// logarithmic time for intervals that don't overlap, plus the number of
+// intervals found.
+
+// Turns the ends of the intervals into the index, in place
+inline size_t buildSubtreeEnds(std::vector<size_t>& ends, size_t low, size_t high) {
+    if (low >= high) {
+        return 0;
+    }
+    size_t middle = low + (high - low) / 2;
+    ends[middle] = std::max({ends[middle],
+                             buildSubtreeEnds(ends, low, middle),
+                             buildSubtreeEnds(ends, middle + 1, high)});
+    return ends[middle];
+}
+
+// Calls visit for every interval containing the address, in sorted order.
+// start, end and subtree_end return the values of the interval at an index.
+template <typename Start, typename End, typename SubtreeEnd, typename Visit>
+void visitContaining(size_t low, size_t high, size_t address,
+                     const Start& start, const End& end, const SubtreeEnd& subtree_end, const Visit& visit) {
+    while (low < high) {
+        size_t middle = low + (high - low) / 2;
+        if (subtree_end(middle) <= address) {
+            return;
+        }
+        visitContaining(low, middle, address, start, end, subtree_end, visit);
+        if (start(middle) > address) {
+            return;
+        }
+        if (address < end(middle)) {
+            visit(middle);
+        }
+        low = middle + 1;
+    }
+}
+
+#endif
@@ -1,4 +1,8 @@
+#include "breakpoints.h"
+#include "console.h"
+#include "profiler.h"
 #include "symbols.h"
+#include "trace_file.h"
 #include "vm.h"
 #include "vm_memory.h"
 #include "ghc/filesystem.hpp"
@@ -7,6 +11,49 @@
 #include <fmt/core.h>
 #include <nlohmann/json.hpp>
 #include <iostream>
+#include <optional>
+
+namespace {
+
+// Parses sizes like 65536, 0x10000 or 64K, with K, M and G as binary units
+size_t parse_size(const std::string &text) {
+    size_t end;
+    uint64_t size = std::stoull(text, &end, 0);
+    std::string unit = text.substr(end);
+    if (unit == "K" || unit == "k") {
+        size <<= 10;
+    }
+    else if (unit == "M" || unit == "m") {
+        size <<= 20;
+    }
+    else if (unit == "G" || unit == "g") {
+        size <<= 30;
+    }
+    else if (!unit.empty()) {
+        throw std::invalid_argument("Unknown unit " + unit);
+    }
+    return size;
+}
+
+// Parses addresses like 4096 or 0x1000, or looks up the start of a symbol
+uint32_t parse_address(const std::string &text, const Symbols &symbols) {
+    try {
+        size_t end;
+        uint64_t address = std::stoull(text, &end, 0);
+        if ((end == text.size()) && (address <= 0xffffffff)) {
+            return address;
+        }
+    }
+    catch (const std::exception&) {
+    }
+    int32_t symbol = symbols.symbolByName(text);
+    if (Symbols::NO_SYMBOL == symbol) {
+        throw std::invalid_argument("Unknown address or symbol " + text);
+    }
+    return symbols.symbolStart(symbol);
+}
+
+}
 
 int main(int argc, char* argv[])
 {
@@ -15,6 +62,12 @@ int main(int argc, char* argv[])
     args::ValueFlag<std::string> binaryInput(parser, "binary", "Binary file containing byte code", {'i'});
     args::Flag debug(parser, "debug", "Start in debugging mode", {'d'});
     args::Flag trace(parser, "trace", "Print trace of instructions while running", {'t'});
+    args::ValueFlag<std::string> traceFile(parser, "trace-file", "Record a binary trace of all instructions into this file", {"trace-file"});
+    args::ValueFlag<uint32_t> traceRecords(parser, "trace-records", "Amount of instructions kept in the binary trace, older ones are overwritten", {"trace-records"}, TraceFile::DEFAULT_CAPACITY);
+    args::ValueFlag<std::string> profileFile(parser, "profile", "Count instructions per word and call path and write them to this file", {"profile"});
+    args::ValueFlag<std::string> memorySize(parser, "memory-size", "Size of the main memory in bytes, e.g. 0x100000 or 1M, up to 4G", {"memory-size"});
+    args::Flag sparseMemory(parser, "sparse-memory", "Allocate the main memory beyond the image in pages on their first access", {"sparse-memory"});
+    args::Flag headless(parser, "headless", "Use a buffered console without terminal, e.g. for batch runs with piped input", {"headless"});
     args::Flag dumpState(parser, "dump-state", "Dump the entire state of the CPU, including registers and stacks at the end of the run as one JSON line", {"dump-state"});
     try {
         parser.ParseCLI(argc, argv);
@@ -24,11 +77,40 @@ int main(int argc, char* argv[])
         return 0;
     }
 
+    size_t memory_size = MEMORY_SIZE;
+    if (memorySize) {
+        try {
+            memory_size = parse_size(args::get(memorySize));
+        }
+        catch (const std::exception&) {
+            memory_size = 0;
+        }
+        if ((memory_size == 0) || (memory_size > Memory::MAXIMUM_SIZE)) {
+            fmt::print("Invalid memory size {}\n", args::get(memorySize));
+            return 1;
+        }
+    }
+
     Symbols symbols;
-    Memory main_memory;
+    Memory main_memory(memory_size, sparseMemory);
     Memory data_stack;
     Memory return_stack;
     Vm vm{main_memory, data_stack, return_stack, symbols};
+    // constructed only for --headless, the debugger reads std::cin otherwise
+    std::optional<HeadlessConsole> headless_console;
+    if (headless) {
+        headless_console.emplace();
+        vm.setConsole(*headless_console);
+    }
+    TraceFile binary_trace;
+    if (traceFile) {
+        binary_trace.open(args::get(traceFile), args::get(traceRecords));
+        vm.setTraceFile(binary_trace);
+    }
+    Profiler profiler;
+    if (profileFile) {
+        vm.setProfiler(profiler);
+    }
 
     ghc::filesystem::path binaryInputPath(args::get(binaryInput));
     main_memory.loadImageFromFile(args::get(binaryInput));
@@ -41,6 +123,8 @@ int main(int argc, char* argv[])
         std::string input;
         Vm::Result result;
         Vm::State state;
+        Breakpoints breakpoints;
+        vm.setBreakpoints(breakpoints);
 
         do {
             state = vm.getState();
@@ -54,6 +138,7 @@ int main(int argc, char* argv[])
                 state.registers[Vm::Wp],
                 state.registers[Vm::Acc1]);
             fmt::print("Ret: {:>12x} | Acc2: {:>11x}\n",
+                state.registers[Vm::Ret],
                 state.registers[Vm::Acc2]);
             std::cout << "----------------------\n";
             auto wp_symbols = symbols.symbolsAtAddress(state.registers[Vm::Wp]);
@@ -75,23 +160,77 @@ int main(int argc, char* argv[])
 
             std::vector<std::string> parts = absl::StrSplit(input, ' ');
 
-            if ((input=="s") || (input=="step")) {
-                result = vm.singleStep();
-            }
-            else if ((parts[0]=="d") || (parts[0]=="dump")) {
-                auto start_address = std::stoul(parts[1], nullptr, 0);
-
-                int line_no = 0;
-                for (int i=0; i<3*16; i++) {
-                    if (i%16==0) {
-                        fmt::print("{:>8x} |", start_address+line_no*16);                        
+            try {
+                if ((input=="s") || (input=="step")) {
+                    result = vm.singleStep();
+                }
+                else if ((input=="c") || (input=="continue")) {
+                    result = vm.interpret(false);
+                    switch (result) {
+                        case Vm::Breakpoint:
+                            fmt::print("Breakpoint at {:x}\n", vm.getState().registers[Vm::Pc]);
+                            break;
+                        case Vm::Watchpoint:
+                            fmt::print("Watched memory changed\n");
+                            break;
+                        case Vm::Finished:
+                            fmt::print("Byte code interpretation successful\n");
+                            break;
+                        default:
+                            fmt::print("Byte code interpretation stopped with an error\n");
+                            break;
+                    }
+                }
+                else if (((parts[0]=="b") || (parts[0]=="break")) && (parts.size() == 2)) {
+                    breakpoints.add(parse_address(parts[1], symbols));
+                }
+                else if (((parts[0]=="del") || (parts[0]=="delete")) && (parts.size() == 2)) {
+                    if (!breakpoints.remove(parse_address(parts[1], symbols))) {
+                        fmt::print("No breakpoint at {}\n", parts[1]);
+                    }
+                }
+                else if (((parts[0]=="w") || (parts[0]=="watch")) && (parts.size() >= 2) && (parts.size() <= 3)) {
+                    uint32_t size = (parts.size() == 3) ? std::stoul(parts[2], nullptr, 0) : 4;
+                    breakpoints.watch(parse_address(parts[1], symbols), size);
+                }
+                else if ((parts[0]=="unwatch") && (parts.size() == 2)) {
+                    if (!breakpoints.unwatch(parse_address(parts[1], symbols))) {
+                        fmt::print("No watchpoint at {}\n", parts[1]);
+                    }
+                }
+                else if ((input=="l") || (input=="list")) {
+                    for (auto address: breakpoints.breakpoints()) {
+                        fmt::print("Breakpoint at {:x}\n", address);
                     }
-                    fmt::print("{:>3x}", main_memory[start_address+i]);
-                    if (i%16==15) {
-                        fmt::print("\n");
-                        line_no++;
+                    for (const auto &watchpoint: breakpoints.watchpoints()) {
+                        fmt::print("Watching {} bytes at {:x}\n", watchpoint.size, watchpoint.start);
                     }
                 }
+                else if ((parts[0]=="d") || (parts[0]=="dump")) {
+                    auto start_address = std::stoul(parts[1], nullptr, 0);
+
+                    int line_no = 0;
+                    for (int i=0; i<3*16; i++) {
+                        if (i%16==0) {
+                            fmt::print("{:>8x} |", start_address+line_no*16);                        
+                        }
+                        fmt::print("{:>3x}", main_memory[start_address+i]);
+                        if (i%16==15) {
+                            fmt::print("\n");
+                            line_no++;
+                        }
+                    }
+                }
+            }
+            catch (const memory_access_error &e) {
+                fmt::print("Memory access error; accessing {:#x} which is beyond {:#x}\n",
+                           e.access_address, e.maximum_address);
+            }
+            catch (const std::invalid_argument &e) {
+                fmt::print("{}\n", e.what());
+            }
+            catch (const end_of_input&) {
+                return 0;
             }
 
         } while ((input!="quit") && (input!="q"));
@@ -111,13 +250,27 @@ int main(int argc, char* argv[])
                 case Vm::IllegalInstruction:
                     std::cout << "Interpreter hit invalid instruction\n";
                     break;
+
+                default:
+                    break;
             }
         }
+        catch (const end_of_input&) {
+            // like the end of a session, neither a profile nor a state dump
+            return 0;
+        }
         catch (memory_access_error& e) {
+            if (headless_console) {
+                headless_console->flush();
+            }
             fmt::print("Memory access error during interpretation; accessing {:#x} which is beyond {:#x}\n",
                        e.access_address, e.maximum_address);
         }
 
+        if (profileFile) {
+            profiler.writeToFile(args::get(profileFile));
+        }
+
         if (dumpState) {
             auto vmState = vm.getState();
             nlohmann::json stateDump;
@@ -8,7 +8,44 @@
 #include "fmt/core.h"
 #include "vm.h"
 #include "vm_memory.h"
+#include "vm_runner.h"
 #include "symbols.h"
+#include <cstdlib>
+#include <string>
+
+namespace {
+
+const Uint32 FRAME_RATE = 30;
+const uint32_t MEMORY_VIEW_COLUMNS = 16;
+
+const char* mode_name(VmRunner::Mode mode) {
+    switch (mode) {
+        case VmRunner::Mode::Paused:
+            return "Paused";
+        case VmRunner::Mode::Running:
+            return "Running";
+        case VmRunner::Mode::Finished:
+            return "Finished";
+    }
+    return "";
+}
+
+// List box showing only the visible entries of a stack
+void stack_list_box(const char *label, const std::vector<uint32_t> &entries, const ImVec2 &size) {
+    if (ImGui::BeginListBox(label, size)) {
+        ImGuiListClipper clipper;
+        clipper.Begin(static_cast<int>(entries.size()));
+        while (clipper.Step()) {
+            for (int entry=clipper.DisplayStart; entry<clipper.DisplayEnd; entry++) {
+                std::string entry_text = fmt::format("{:>8x}", entries[entry]);
+                ImGui::Selectable(entry_text.c_str(), false);
+            }
+        }
+        ImGui::EndListBox();
+    }
+}
+
+}
 
 int main(int argc, char *argv[]) {
     Memory main_memory;
@@ -16,10 +53,9 @@ int main(int argc, char *argv[]) {
     Memory return_stack;
     Symbols symbols;
     Vm vm{main_memory, data_stack, return_stack, symbols};
+    VmRunner runner{vm, main_memory, data_stack, return_stack};
 
-    uint32_t dsp_top = 0x0;
-    uint32_t rsp_bottom = 0x0;
-    int current_item;
+    char breakpoint_text[9] = "";
 
     SDL_Window *window = nullptr;
 
@@ -40,6 +76,7 @@ int main(int argc, char *argv[]) {
     SDL_Event ev;
 
     while (isRunning) {
+        Uint32 frame_start = SDL_GetTicks();
         while (SDL_PollEvent(&ev) != 0) {
             ImGui_ImplSDL2_ProcessEvent(&ev);
 
@@ -47,7 +84,10 @@ int main(int argc, char *argv[]) {
                 isRunning = false;
         }
 
-        auto registers = vm.getState();
+        // the VM runs on the worker thread, the frame only shows its last
+        // snapshot
+        auto snapshot = runner.snapshot();
+        auto& registers = snapshot.state;
 
         ImGui_ImplSDLRenderer_NewFrame();
         ImGui_ImplSDL2_NewFrame();
@@ -80,24 +120,80 @@ int main(int argc, char *argv[]) {
             if (ImGuiFileDialog::Instance()->IsOk())
             {
                 std::string filePathName = ImGuiFileDialog::Instance()->GetFilePathName();
-                main_memory.loadImageFromFile(filePathName);
+                runner.whilePaused([&] {
+                    main_memory.loadImageFromFile(filePathName);
+                    vm.setState(Vm::State{false, {0, 0, 0, 0, 0, 0, 0, 0}});
+                });
             }
 
             ImGuiFileDialog::Instance()->Close();
         }
 
+        if (ImGui::Button("Run")) {
+            runner.run(false);
+        }
+        ImGui::SameLine();
+        if (ImGui::Button("Run to Breakpoint")) {
+            runner.run(true);
+        }
+        ImGui::SameLine();
+        if (ImGui::Button("Pause")) {
+            runner.pause();
+        }
+        ImGui::SameLine();
         if (ImGui::Button("Single Step")) {
-            vm.singleStep();
+            runner.step();
+        }
+        ImGui::SameLine();
+        ImGui::SetNextItemWidth(ImGui::GetFontSize() * 6);
+        ImGui::InputText("##breakpoint", breakpoint_text, sizeof(breakpoint_text), ImGuiInputTextFlags_CharsHexadecimal);
+        ImGui::SameLine();
+        if (ImGui::Button("Toggle Breakpoint") && breakpoint_text[0]) {
+            runner.toggleBreakpoint(std::strtoul(breakpoint_text, nullptr, 16));
         }
 
-        ImGui::Text("Next instruction: %s", vm.disassembleAtPc().c_str());
+        ImGui::Text("%s, %llu instructions, %.1f MIPS", mode_name(snapshot.mode),
+                    static_cast<unsigned long long>(snapshot.instructions),
+                    snapshot.instructions_per_second / 1e6);
+        if (!snapshot.error.empty()) {
+            ImGui::SameLine();
+            ImGui::Text("- %s", snapshot.error.c_str());
+        }
+        ImGui::Text("Next instruction: %s", snapshot.next_instruction.c_str());
 
         {
             ImGui::PushStyleVar(ImGuiStyleVar_ChildRounding, 5.0f);
-            ImGui::BeginChild("Console", ImVec2(ImGui::GetContentRegionAvail().x * 0.6,
-                                                ImGui::GetContentRegionAvail().y),
+            ImGui::BeginChild("Memory", ImVec2(ImGui::GetContentRegionAvail().x * 0.6,
+                                               ImGui::GetContentRegionAvail().y),
                             true, ImGuiWindowFlags_MenuBar);
-            //ImGui::Text("Content of this child window");
+
+            // only the visible rows are requested from the runner, they show
+            // up with the next snapshot
+            ImGuiListClipper clipper;
+            clipper.Begin(static_cast<int>((main_memory.size() + MEMORY_VIEW_COLUMNS - 1) / MEMORY_VIEW_COLUMNS));
+            uint32_t first_row = 0;
+            uint32_t last_row = 0;
+            while (clipper.Step()) {
+                first_row = clipper.DisplayStart;
+                last_row = clipper.DisplayEnd;
+                for (int row=clipper.DisplayStart; row<clipper.DisplayEnd; row++) {
+                    uint32_t address = row * MEMORY_VIEW_COLUMNS;
+                    std::string line = fmt::format("{:08x}:", address);
+                    for (uint32_t column=0; column<MEMORY_VIEW_COLUMNS; column++) {
+                        uint32_t offset = address + column - snapshot.memory_start;
+                        if ((address + column >= snapshot.memory_start) && (offset < snapshot.memory.size())) {
+                            line += fmt::format(" {:02x}", snapshot.memory[offset]);
+                        }
+                        else {
+                            line += " ..";
+                        }
+                    }
+                    ImGui::TextUnformatted(line.c_str());
+                }
+            }
+            clipper.End();
+            runner.setMemoryWindow(first_row * MEMORY_VIEW_COLUMNS, (last_row - first_row) * MEMORY_VIEW_COLUMNS);
+
             ImGui::EndChild();
             ImGui::PopStyleVar();
         }
@@ -111,24 +207,12 @@ int main(int argc, char *argv[]) {
                             true, ImGuiWindowFlags_MenuBar);
 
             ImGui::Text("Data Stack");
-            if (ImGui::BeginListBox("Data stack", ImVec2(ImGui::GetContentRegionAvail().x,
-                                                         ImGui::GetContentRegionAvail().y * 0.5))) {
-                for (uint32_t address=0; address<registers.registers[Vm::Dsp]; address+=4) {
-                    std::string entry_text = fmt::format("{:>8x}", data_stack.get32(address));
-                    ImGui::Selectable(entry_text.c_str(), false);
-                }
-                ImGui::EndListBox();
-            };
+            stack_list_box("Data stack", snapshot.data_stack,
+                           ImVec2(ImGui::GetContentRegionAvail().x, ImGui::GetContentRegionAvail().y * 0.5));
 
             ImGui::Text("Return Stack");
-            if (ImGui::BeginListBox("Return stack", ImVec2(ImGui::GetContentRegionAvail().x,
-                                                         ImGui::GetContentRegionAvail().y))) {
-                for (uint32_t address=0; address<registers.registers[Vm::Rsp]; address+=4) {
-                    std::string entry_text = fmt::format("{:>8x}", return_stack.get32(address));
-                    ImGui::Selectable(entry_text.c_str(), false);
-                }
-                ImGui::EndListBox();
-            };
+            stack_list_box("Return stack", snapshot.return_stack,
+                           ImVec2(ImGui::GetContentRegionAvail().x, ImGui::GetContentRegionAvail().y));
 
             ImGui::EndChild();
             ImGui::PopStyleVar();
@@ -158,7 +242,11 @@ int main(int argc, char *argv[]) {
             ImGui::TableNextColumn(); ImGui::Text("Pc"); ImGui::TableNextColumn(); ImGui::Text("%08x", registers.registers[Vm::Pc]);
             ImGui::EndTable();
 
-            //ImGui::Text("Registers");
+            ImGui::Text("Breakpoints");
+            for (auto address: runner.breakpoints()) {
+                ImGui::Text("%08x", address);
+            }
+
             ImGui::EndChild();
             ImGui::PopStyleVar();
         }
@@ -172,6 +260,11 @@ int main(int argc, char *argv[]) {
         SDL_RenderClear(renderer);
         ImGui_ImplSDLRenderer_RenderDrawData(ImGui::GetDrawData());
         SDL_RenderPresent(renderer);
+
+        Uint32 frame_time = SDL_GetTicks() - frame_start;
+        if (frame_time < 1000 / FRAME_RATE) {
+            SDL_Delay(1000 / FRAME_RATE - frame_time);
+        }
     }
 
     ImGui_ImplSDLRenderer_Shutdown();
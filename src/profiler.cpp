@@ -0,0 +1,50 @@
+#include "profiler.h"
+#include <fmt/core.h>
+#include <fstream>
+#include <stdexcept>
+
+Profiler::Profiler() {
+    // the root node collects everything run before the first dispatch
+    nodes.push_back(Node{0, 0, 0, 0});
+}
+
+uint32_t Profiler::child(uint32_t parent, uint32_t cfa) {
+    uint64_t key = (uint64_t(parent) << 32) | cfa;
+    auto found = children.find(key);
+    if (found != children.end()) {
+        return found->second;
+    }
+    uint32_t node = nodes.size();
+    nodes.push_back(Node{parent, cfa, 0, 0});
+    children.emplace(key, node);
+    return node;
+}
+
+void Profiler::enter(uint32_t cfa, uint32_t rsp) {
+    // frames left without EXIT, e.g. by resetting the return stack, end
+    // where the return stack is below them again
+    uint32_t frame_rsp = rsp - 4;
+    while (!frames.empty() && (frames.back().rsp >= frame_rsp)) {
+        frames.pop_back();
+    }
+    uint32_t parent = frames.empty() ? 0 : frames.back().node;
+    frames.push_back(Frame{child(parent, cfa), frame_rsp});
+}
+
+void Profiler::leave(uint32_t rsp) {
+    while (!frames.empty() && (frames.back().rsp >= rsp)) {
+        frames.pop_back();
+    }
+}
+
+void Profiler::writeToFile(const std::string& profile_file_path) const {
+    std::ofstream file(profile_file_path);
+    if (!file) {
+        throw std::runtime_error("Can't create profile " + profile_file_path);
+    }
+    file << "# forth-vm-sim profile 1\n";
+    for (size_t node=0; node<nodes.size(); node++) {
+        file << fmt::format("{} {} {:#x} {} {}\n", node, nodes[node].parent, nodes[node].cfa,
+                            nodes[node].instructions, nodes[node].dispatches);
+    }
+}
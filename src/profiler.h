@@ -0,0 +1,71 @@
+#ifndef PROFILER_H
+#define PROFILER_H
+
+#include <stdint.h>
+#include <array>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+// Counts instructions and NEXT dispatches per word and per call path.
+//
+// The current word is the code field address in %wp. Colon words enter with
+// `pushr %ip` in doLIST and leave with `popr %ip` in EXIT, so these
+// instructions push and pop the frames of the call path. Call paths are kept
+// as a tree of nodes, each node being one word called from the path of its
+// parent node.
+class Profiler {
+public:
+    struct Node {
+        uint32_t parent;
+        uint32_t cfa;
+        uint64_t instructions;
+        uint64_t dispatches;
+    };
+
+    Profiler();
+
+    // Call after every instruction with the registers after running it
+    void count(uint8_t opcode, const std::array<uint32_t, 8>& registers) {
+        nodes[current].instructions++;
+        switch (opcode) {
+            case JMPD_WP:
+                current = child(frames.empty() ? 0 : frames.back().node, registers[1]);
+                nodes[current].dispatches++;
+                break;
+            case PUSHRR_W_IP:
+                enter(registers[1], registers[2]);
+                break;
+            case POPRR_W_IP:
+                leave(registers[2]);
+                break;
+        }
+    }
+
+    const std::vector<Node>& callTree() const { return nodes; }
+
+    // One line per node: number, parent, code field address, instructions
+    // and dispatches
+    void writeToFile(const std::string& profile_file_path) const;
+
+private:
+    static constexpr uint8_t JMPD_WP = 0x69;
+    static constexpr uint8_t PUSHRR_W_IP = 0xB0;
+    static constexpr uint8_t POPRR_W_IP = 0xB8;
+
+    struct Frame {
+        uint32_t node;
+        uint32_t rsp;
+    };
+
+    uint32_t child(uint32_t parent, uint32_t cfa);
+    void enter(uint32_t cfa, uint32_t rsp);
+    void leave(uint32_t rsp);
+
+    std::vector<Node> nodes;
+    std::unordered_map<uint64_t, uint32_t> children;
+    std::vector<Frame> frames;
+    uint32_t current = 0;
+};
+
+#endif
@@ -0,0 +1,145 @@
+// Python module forth_vm running the VM within the Python process.
+//
+//     vm = forth_vm.Vm()
+//     vm.memory.load_image(binary_code)
+//     vm.add_input(b"2 3 + .\n")
+//     result = vm.interpret()
+//     output = vm.take_output()
+//
+// Memory supports the buffer protocol, so memoryview(vm.memory) reads and
+// writes the resident part of the memory in place.
+#include "console.h"
+#include "symbols.h"
+#include "vm.h"
+#include "vm_memory.h"
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+#include <optional>
+
+namespace py = pybind11;
+
+namespace {
+
+// The memories, symbols and console a Vm refers to, kept together with it
+struct Machine {
+    Machine(size_t memory_size, bool sparse)
+    : main_memory(memory_size, sparse)
+    , vm(main_memory, data_stack, return_stack, symbols) {
+        vm.setConsole(console);
+    }
+
+    // Runs up to max_steps instructions, Success when all of them ran
+    Vm::Result interpret(std::optional<uint64_t> max_steps) {
+        if (!max_steps) {
+            return vm.interpret(false);
+        }
+        if (0 == *max_steps) {
+            return Vm::Success;
+        }
+        return vm.interpret(false, *max_steps);
+    }
+
+    // Stack entries from the bottom up to the stack pointer
+    std::vector<uint32_t> stack(Memory &memory, Vm::Register pointer) const {
+        std::vector<uint32_t> entries;
+        uint32_t top = vm.getState().registers[pointer];
+        for (uint32_t address=0; (address + 4 <= top) && (address + 4 <= memory.size()); address+=4) {
+            entries.push_back(memory.get32(address));
+        }
+        return entries;
+    }
+
+    Memory main_memory;
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    BufferConsole console;
+    Vm vm;
+};
+
+}
+
+PYBIND11_MODULE(forth_vm, m) {
+    m.doc() = "Forth VM running within the Python process";
+    m.attr("MEMORY_SIZE") = MEMORY_SIZE;
+
+    py::register_exception<memory_access_error>(m, "MemoryAccessError", PyExc_IndexError);
+    py::register_exception<end_of_input>(m, "EndOfInput", PyExc_EOFError);
+
+    py::enum_<Vm::Result>(m, "Result")
+        .value("Success", Vm::Success)
+        .value("Finished", Vm::Finished)
+        .value("Error", Vm::Error)
+        .value("IllegalInstruction", Vm::IllegalInstruction)
+        .value("Breakpoint", Vm::Breakpoint)
+        .value("Watchpoint", Vm::Watchpoint);
+
+    py::enum_<Vm::Register>(m, "Register")
+        .value("Ip", Vm::Ip)
+        .value("Wp", Vm::Wp)
+        .value("Rsp", Vm::Rsp)
+        .value("Dsp", Vm::Dsp)
+        .value("Acc1", Vm::Acc1)
+        .value("Acc2", Vm::Acc2)
+        .value("Ret", Vm::Ret)
+        .value("Pc", Vm::Pc);
+
+    py::class_<Memory>(m, "Memory", py::buffer_protocol())
+        .def_buffer([](Memory &memory) {
+            // resident part only, loading a larger image into sparse memory
+            // reallocates it
+            return py::buffer_info(memory.data(), memory.residentSize());
+        })
+        .def("__len__", &Memory::size)
+        .def_property_readonly("resident_size", &Memory::residentSize)
+        .def("load_image", [](Memory &memory, py::buffer image) {
+            py::buffer_info info = image.request();
+            auto begin = static_cast<const uint8_t*>(info.ptr);
+            memory.loadImageFromIterator(begin, begin + info.size * info.itemsize);
+        }, py::arg("image"))
+        .def("get32", &Memory::get32, py::arg("address"))
+        .def("put32", &Memory::put32, py::arg("address"), py::arg("value"));
+
+    py::class_<Machine>(m, "Vm")
+        .def(py::init<size_t, bool>(), py::arg("memory_size")=MEMORY_SIZE, py::arg("sparse")=false)
+        .def_property_readonly("memory", [](Machine &machine) -> Memory& { return machine.main_memory; },
+                               py::return_value_policy::reference_internal)
+        .def_property_readonly("data_stack", [](Machine &machine) -> Memory& { return machine.data_stack; },
+                               py::return_value_policy::reference_internal)
+        .def_property_readonly("return_stack", [](Machine &machine) -> Memory& { return machine.return_stack; },
+                               py::return_value_policy::reference_internal)
+        .def_property("registers",
+                      [](const Machine &machine) { return machine.vm.getState().registers; },
+                      [](Machine &machine, const std::array<uint32_t, 8> &registers) {
+                          auto state = machine.vm.getState();
+                          state.registers = registers;
+                          machine.vm.setState(state);
+                      })
+        .def_property("carry",
+                      [](const Machine &machine) { return machine.vm.getState().carry; },
+                      [](Machine &machine, bool carry) {
+                          auto state = machine.vm.getState();
+                          state.carry = carry;
+                          machine.vm.setState(state);
+                      })
+        .def("data_stack_entries", [](Machine &machine) {
+            return machine.stack(machine.data_stack, Vm::Dsp);
+        })
+        .def("return_stack_entries", [](Machine &machine) {
+            return machine.stack(machine.return_stack, Vm::Rsp);
+        })
+        .def("load_symbols", [](Machine &machine, const std::string &path) {
+            machine.symbols.loadFromFile(path);
+        }, py::arg("path"))
+        .def("single_step", [](Machine &machine) { return machine.vm.singleStep(); },
+             py::call_guard<py::gil_scoped_release>())
+        .def("interpret", &Machine::interpret, py::arg("max_steps")=py::none(),
+             py::call_guard<py::gil_scoped_release>())
+        .def("disassemble", [](const Machine &machine) { return machine.vm.disassembleAtPc(); })
+        .def("add_input", [](Machine &machine, py::bytes data) {
+            machine.console.addInput(data);
+        }, py::arg("data"))
+        .def("take_output", [](Machine &machine) {
+            return py::bytes(machine.console.takeOutput());
+        });
+}
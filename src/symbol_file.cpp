@@ -0,0 +1,134 @@
+#include "symbol_file.h"
+#include <algorithm>
+#include <cstring>
+#include <fstream>
+#include <iterator>
+#include <stdexcept>
+#ifndef _WIN32
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+namespace {
+
+const char MAGIC[4] = {'F', 'S', 'Y', 'M'};
+const uint16_t VERSION = 1;
+const uint16_t FLAG_INDEX = 0x1;
+const size_t HEADER_SIZE = 32;
+const size_t RECORD_SIZE = 16;
+
+}
+
+SymbolFile::~SymbolFile() {
+    close();
+}
+
+bool SymbolFile::isSymbolFile(const std::string& symbol_file_path) {
+    std::ifstream file(symbol_file_path, std::ios::binary);
+    char magic[sizeof(MAGIC)] = {};
+    file.read(magic, sizeof(magic));
+    return file && (0 == std::memcmp(magic, MAGIC, sizeof(MAGIC)));
+}
+
+void SymbolFile::open(const std::string& symbol_file_path) {
+    close();
+#ifdef _WIN32
+    std::ifstream file(symbol_file_path, std::ios::binary);
+    contents.assign(std::istreambuf_iterator<char>(file), std::istreambuf_iterator<char>());
+    data = contents.data();
+    length = contents.size();
+#else
+    int fd = ::open(symbol_file_path.c_str(), O_RDONLY);
+    if (fd < 0) {
+        throw std::runtime_error("Can't open symbol file " + symbol_file_path);
+    }
+    struct stat file_status;
+    if ((0 == fstat(fd, &file_status)) && (file_status.st_size > 0)) {
+        void* mapping = mmap(nullptr, file_status.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+        if (MAP_FAILED != mapping) {
+            data = static_cast<const uint8_t*>(mapping);
+            length = file_status.st_size;
+        }
+    }
+    ::close(fd);
+#endif
+
+    if ((length < HEADER_SIZE) || (0 != std::memcmp(data, MAGIC, sizeof(MAGIC)))) {
+        close();
+        throw std::runtime_error(symbol_file_path + " is no binary symbol file");
+    }
+    uint16_t version = data[4] | (data[5] << 8);
+    uint16_t flags = data[6] | (data[7] << 8);
+    if (VERSION != version) {
+        close();
+        throw std::runtime_error("Unsupported symbol file version " + std::to_string(version));
+    }
+    count = word(8);
+    records_offset = word(12);
+    index_offset = word(16);
+    strings_offset = word(20);
+    strings_size = word(24);
+
+    if ((uint64_t(records_offset) + uint64_t(count) * RECORD_SIZE > length)
+        || ((flags & FLAG_INDEX) && (uint64_t(index_offset) + uint64_t(count) * 4 > length))
+        || (uint64_t(strings_offset) + strings_size > length)) {
+        close();
+        throw std::runtime_error(symbol_file_path + " is truncated");
+    }
+
+    if (!(flags & FLAG_INDEX)) {
+        index.resize(count);
+        for (size_t record=0; record<count; record++) {
+            index[record] = recordField(record, 1);
+        }
+        buildSubtreeEnds(index, 0, count);
+    }
+}
+
+void SymbolFile::close() {
+#ifdef _WIN32
+    contents.clear();
+#else
+    if (nullptr != data) {
+        munmap(const_cast<uint8_t*>(data), length);
+    }
+#endif
+    data = nullptr;
+    length = 0;
+    count = 0;
+    index.clear();
+}
+
+std::vector<std::string> SymbolFile::symbolsAtAddress(size_t address) const {
+    std::vector<std::string> symbols;
+    visitAtAddress(address, [&](size_t record) {
+        symbols.push_back(name(record));
+    });
+    return symbols;
+}
+
+uint32_t SymbolFile::word(size_t offset) const {
+    return data[offset] | (data[offset+1] << 8) | (data[offset+2] << 16) | (uint32_t(data[offset+3]) << 24);
+}
+
+uint32_t SymbolFile::recordField(size_t record, size_t field) const {
+    return word(records_offset + record * RECORD_SIZE + field * 4);
+}
+
+size_t SymbolFile::subtreeEnd(size_t record) const {
+    if (!index.empty()) {
+        return index[record];
+    }
+    return word(index_offset + record * 4);
+}
+
+std::string SymbolFile::name(size_t record) const {
+    uint32_t offset = recordField(record, 2);
+    uint32_t name_length = recordField(record, 3);
+    if (uint64_t(offset) + name_length > strings_size) {
+        return "";
+    }
+    return std::string(reinterpret_cast<const char*>(data + strings_offset + offset), name_length);
+}
@@ -0,0 +1,61 @@
+#ifndef SYMBOL_FILE_H
+#define SYMBOL_FILE_H
+
+#include <stdint.h>
+#include <string>
+#include <vector>
+#include "interval_index.h"
+
+// Read-only view of a binary symbol file written by fbuilder. The file is
+// memory-mapped and queried in place; see fbuilder/symbol_file.py for the
+// layout.
+class SymbolFile {
+public:
+    SymbolFile() = default;
+    ~SymbolFile();
+    SymbolFile(const SymbolFile&) = delete;
+    SymbolFile& operator=(const SymbolFile&) = delete;
+
+    static bool isSymbolFile(const std::string& symbol_file_path);
+
+    void open(const std::string& symbol_file_path);
+    void close();
+
+    size_t size() const { return count; }
+    uint32_t start(size_t record) const { return recordField(record, 0); }
+    uint32_t end(size_t record) const { return recordField(record, 1); }
+    std::string name(size_t record) const;
+
+    std::vector<std::string> symbolsAtAddress(size_t address) const;
+
+    // Calls visit with every record containing the address, sorted by start
+    template <typename Visit>
+    void visitAtAddress(size_t address, const Visit& visit) const {
+        visitContaining(0, count, address,
+            [this](size_t record) { return start(record); },
+            [this](size_t record) { return end(record); },
+            [this](size_t record) { return subtreeEnd(record); },
+            visit);
+    }
+
+private:
+    uint32_t word(size_t offset) const;
+    uint32_t recordField(size_t record, size_t field) const;
+    size_t subtreeEnd(size_t record) const;
+
+    const uint8_t* data = nullptr;
+    size_t length = 0;
+#ifdef _WIN32
+    std::vector<uint8_t> contents;
+#endif
+
+    uint32_t count = 0;
+    uint32_t records_offset = 0;
+    uint32_t index_offset = 0;
+    uint32_t strings_offset = 0;
+    uint32_t strings_size = 0;
+    // built on loading for files without prebuilt index
+    std::vector<size_t> index;
+};
+
+#endif
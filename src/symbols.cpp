@@ -1,10 +1,17 @@
 #include "symbols.h"
 #include <csv.hpp>
+#include <algorithm>
 
 Symbols::Symbols() {
 }
 
 void Symbols::loadFromFile(const std::string& symbol_file_path) {
+    if (SymbolFile::isSymbolFile(symbol_file_path)) {
+        symbol_file.open(symbol_file_path);
+        return;
+    }
+
+    // fallback for symbol tables written in the CSV format
     csv::CSVReader reader(symbol_file_path);
     
     for (const csv::CSVRow& row: reader) {
@@ -18,16 +25,112 @@ void Symbols::loadFromFile(const std::string& symbol_file_path) {
 
 void Symbols::addSymbol(const std::string& name, size_t start_address, size_t end_address) {
     intervals.emplace_back(Symbol{name, start_address, end_address});
+    index_valid = false;
 }
 
 std::vector<std::string> Symbols::symbolsAtAddress(size_t address) const {
-    std::vector<std::string> symbols;
+    std::vector<std::string> symbols = symbol_file.symbolsAtAddress(address);
 
-    for (const auto &symbol: intervals) {
-        if ((address >= symbol.start) && (address < symbol.end)) {
-            symbols.push_back(symbol.identifier);
-        }
+    updateIndex();
+    visitContaining(0, intervals.size(), address,
+        [this](size_t i) { return intervals[i].start; },
+        [this](size_t i) { return intervals[i].end; },
+        [this](size_t i) { return subtree_ends[i]; },
+        [&](size_t i) { symbols.push_back(intervals[i].identifier); });
+
+    return symbols;
+}
+
+size_t Symbols::size() const {
+    return symbol_file.size() + intervals.size();
+}
+
+std::string Symbols::symbolName(int32_t symbol) const {
+    if ((symbol < 0) || (static_cast<size_t>(symbol) >= size())) {
+        return "";
+    }
+    if (static_cast<size_t>(symbol) < symbol_file.size()) {
+        return symbol_file.name(symbol);
     }
+    updateIndex();
+    return intervals[symbol - symbol_file.size()].identifier;
+}
+
+int32_t Symbols::symbolAtAddress(size_t address) const {
+    int32_t found = NO_SYMBOL;
+    size_t found_start = 0;
+    size_t found_end = 0;
+    auto consider = [&](int32_t symbol, size_t start, size_t end) {
+        if ((NO_SYMBOL == found) || (start > found_start) || ((start == found_start) && (end < found_end))) {
+            found = symbol;
+            found_start = start;
+            found_end = end;
+        }
+    };
+
+    symbol_file.visitAtAddress(address, [&](size_t record) {
+        consider(record, symbol_file.start(record), symbol_file.end(record));
+    });
 
+    updateIndex();
+    size_t first_added = symbol_file.size();
+    visitContaining(0, intervals.size(), address,
+        [this](size_t i) { return intervals[i].start; },
+        [this](size_t i) { return intervals[i].end; },
+        [this](size_t i) { return subtree_ends[i]; },
+        [&](size_t i) { consider(first_added + i, intervals[i].start, intervals[i].end); });
+
+    return found;
+}
+
+std::vector<int32_t> Symbols::symbolsAtAddresses(const std::vector<uint32_t>& addresses) const {
+    // Traces and profiles hit the same few addresses over and over again,
+    // so a small direct mapped cache saves most of the lookups
+    constexpr size_t CACHE_SIZE = 4096;
+    std::vector<uint32_t> cached_addresses(CACHE_SIZE, 0xffffffff);
+    std::vector<int32_t> cached_symbols(CACHE_SIZE, NO_SYMBOL);
+    std::vector<int32_t> symbols;
+    symbols.reserve(addresses.size());
+
+    for (auto address: addresses) {
+        size_t slot = address % CACHE_SIZE;
+        if ((cached_addresses[slot] != address) || (0xffffffff == address)) {
+            cached_addresses[slot] = address;
+            cached_symbols[slot] = symbolAtAddress(address);
+        }
+        symbols.push_back(cached_symbols[slot]);
+    }
     return symbols;
 }
+
+int32_t Symbols::symbolByName(const std::string& name) const {
+    for (size_t symbol=0; symbol<size(); symbol++) {
+        if (symbolName(symbol) == name) {
+            return symbol;
+        }
+    }
+    return NO_SYMBOL;
+}
+
+size_t Symbols::symbolStart(int32_t symbol) const {
+    if (static_cast<size_t>(symbol) < symbol_file.size()) {
+        return symbol_file.start(symbol);
+    }
+    updateIndex();
+    return intervals[symbol - symbol_file.size()].start;
+}
+
+void Symbols::updateIndex() const {
+    if (index_valid) {
+        return;
+    }
+    std::stable_sort(intervals.begin(), intervals.end(), [](const Symbol& a, const Symbol& b) {
+        return a.start < b.start;
+    });
+    subtree_ends.resize(intervals.size());
+    for (size_t i=0; i<intervals.size(); i++) {
+        subtree_ends[i] = intervals[i].end;
+    }
+    buildSubtreeEnds(subtree_ends, 0, intervals.size());
+    index_valid = true;
+}
@@ -3,9 +3,12 @@
 #include <stdint.h>
 #include <string>
 #include <vector>
+#include "symbol_file.h"
 
 class Symbols {
 public:
+    static constexpr int32_t NO_SYMBOL = -1;
+
     Symbols();
 
     void loadFromFile(const std::string& symbol_file_path);
@@ -13,6 +16,17 @@ public:
 
     std::vector<std::string> symbolsAtAddress(size_t address) const;
 
+    // Symbols are numbered from 0 to size()-1, the numbers change when symbols
+    // are added. Lookups by number return the innermost symbol, i.e. the one
+    // starting last, for nested symbols.
+    size_t size() const;
+    std::string symbolName(int32_t symbol) const;
+    int32_t symbolAtAddress(size_t address) const;
+    std::vector<int32_t> symbolsAtAddresses(const std::vector<uint32_t>& addresses) const;
+    // Returns the first symbol of that name or NO_SYMBOL, searching all symbols
+    int32_t symbolByName(const std::string& name) const;
+    size_t symbolStart(int32_t symbol) const;
+
 private:
     struct Symbol {
         std::string identifier;
@@ -20,7 +34,14 @@ private:
         size_t end;
     };
 
-    std::vector<Symbol> intervals;
+    void updateIndex() const;
+
+    // added symbols are sorted by start address and indexed on the first
+    // query after they changed
+    mutable std::vector<Symbol> intervals;
+    mutable std::vector<size_t> subtree_ends;
+    mutable bool index_valid = true;
+    SymbolFile symbol_file;
 };
 
-#endif
\ No newline at end of file
+#endif
@@ -0,0 +1,91 @@
+#include "trace_file.h"
+#include <cstring>
+#include <fstream>
+#include <stdexcept>
+#ifndef _WIN32
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <unistd.h>
+#endif
+
+namespace {
+
+const char MAGIC[4] = {'F', 'T', 'R', 'C'};
+const uint16_t VERSION = 1;
+const size_t HEADER_SIZE = 32;
+const size_t TOTAL_OFFSET = 16;
+
+}
+
+TraceFile::~TraceFile() {
+    close();
+}
+
+void TraceFile::open(const std::string& trace_file_path, uint32_t record_capacity) {
+    close();
+    if (0 == record_capacity) {
+        throw std::invalid_argument("Trace needs room for at least one record");
+    }
+    length = HEADER_SIZE + size_t(record_capacity) * sizeof(Record);
+#ifdef _WIN32
+    path = trace_file_path;
+    contents.assign(length, 0);
+    data = contents.data();
+#else
+    int fd = ::open(trace_file_path.c_str(), O_RDWR | O_CREAT | O_TRUNC, 0644);
+    if (fd < 0) {
+        throw std::runtime_error("Can't create trace file " + trace_file_path);
+    }
+    if (0 != ftruncate(fd, length)) {
+        ::close(fd);
+        throw std::runtime_error("Can't resize trace file " + trace_file_path);
+    }
+    void* mapping = mmap(nullptr, length, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    ::close(fd);
+    if (MAP_FAILED == mapping) {
+        throw std::runtime_error("Can't map trace file " + trace_file_path);
+    }
+    data = static_cast<uint8_t*>(mapping);
+#endif
+
+    std::memcpy(data, MAGIC, sizeof(MAGIC));
+    data[4] = VERSION & 0xff;
+    data[5] = VERSION >> 8;
+    data[6] = sizeof(Record) & 0xff;
+    data[7] = sizeof(Record) >> 8;
+    for (int i=0; i<4; i++) {
+        data[8+i] = (record_capacity >> (8*i)) & 0xff;
+    }
+    records = reinterpret_cast<Record*>(data + HEADER_SIZE);
+    capacity = record_capacity;
+    next = 0;
+    total = 0;
+    sync();
+}
+
+void TraceFile::sync() {
+    if (nullptr == data) {
+        return;
+    }
+    for (int i=0; i<8; i++) {
+        data[TOTAL_OFFSET+i] = (total >> (8*i)) & 0xff;
+    }
+}
+
+void TraceFile::close() {
+    if (nullptr == data) {
+        return;
+    }
+    sync();
+#ifdef _WIN32
+    std::ofstream file(path, std::ios::binary);
+    file.write(reinterpret_cast<const char*>(contents.data()), contents.size());
+    contents.clear();
+#else
+    munmap(data, length);
+#endif
+    data = nullptr;
+    records = nullptr;
+    length = 0;
+    capacity = 0;
+}
@@ -0,0 +1,80 @@
+#ifndef TRACE_FILE_H
+#define TRACE_FILE_H
+
+#include <stdint.h>
+#include <array>
+#include <string>
+#include <vector>
+
+// Binary instruction trace kept in a memory-mapped ring buffer file.
+//
+// The file starts with a 32 byte header: magic "FTRC", 16-bit version, 16-bit
+// record size, the capacity in records, one unused word and the 64-bit count
+// of records written so far. The records follow; once the capacity is reached
+// the oldest records are overwritten. All numbers are little-endian; records
+// are stored as they are laid out in memory, which requires a little-endian
+// host.
+class TraceFile {
+public:
+    struct Record {
+        uint32_t pc;
+        uint32_t ip;
+        uint32_t wp;
+        uint32_t rsp;
+        uint32_t dsp;
+        uint32_t acc1;
+        uint32_t acc2;
+        uint8_t opcode;
+        uint8_t flags;      // bit 0: carry
+        uint16_t reserved;
+    };
+    static_assert(sizeof(Record) == 32, "trace records must be packed");
+
+    static constexpr uint32_t DEFAULT_CAPACITY = 1 << 20;
+
+    TraceFile() = default;
+    ~TraceFile();
+    TraceFile(const TraceFile&) = delete;
+    TraceFile& operator=(const TraceFile&) = delete;
+
+    void open(const std::string& trace_file_path, uint32_t capacity = DEFAULT_CAPACITY);
+    void close();
+
+    uint64_t recordsWritten() const { return total; }
+
+    // registers in the order of Vm::Register
+    void record(const std::array<uint32_t, 8>& registers, uint8_t opcode, bool carry) {
+        Record& entry = records[next];
+        entry.pc = registers[7];
+        entry.ip = registers[0];
+        entry.wp = registers[1];
+        entry.rsp = registers[2];
+        entry.dsp = registers[3];
+        entry.acc1 = registers[4];
+        entry.acc2 = registers[5];
+        entry.opcode = opcode;
+        entry.flags = carry ? 1 : 0;
+        entry.reserved = 0;
+        if (++next == capacity) {
+            next = 0;
+        }
+        total++;
+    }
+
+    // Stores the count of written records in the header
+    void sync();
+
+private:
+    uint8_t* data = nullptr;
+    size_t length = 0;
+#ifdef _WIN32
+    std::string path;
+    std::vector<uint8_t> contents;
+#endif
+    Record* records = nullptr;
+    uint32_t capacity = 0;
+    uint32_t next = 0;
+    uint64_t total = 0;
+};
+
+#endif
@@ -1,14 +1,11 @@
 #include "vm.h"
 #include "tools.h"
 #include "fmt/core.h"
+#include <algorithm>
+#include <cstdint>
 #include <iostream>
 #include <fstream>
 #include <map>
-#ifdef _WIN32
-#include <conio.h>
-#else
-#include <curses.h>
-#endif
 
 enum class Opcode {
     NOP = 0x0,
@@ -21,6 +18,9 @@ enum class Opcode {
     MOVS_DI_B = 0x25,
     MOVI_ACC1 = 0x26,
     MOVI_ACC2 = 0x27,
+    MOVR_H = 0x28,
+    MOVS_ID_H = 0x29,
+    MOVS_DI_H = 0x2A,
 
     ADDR_W = 0x30,
     SUBR_W = 0x32,
@@ -30,6 +30,11 @@ enum class Opcode {
     SRA_W = 0x3C,
     SLLR_W = 0x3E,
 
+    MULR_W = 0x40,
+    DIVMODR_W = 0x42,
+    BMOVE = 0x44,
+    BFILL = 0x46,
+
     JMPI_IP = 0x60,
     JMPI_WP = 0x61,
     JMPI_RSP = 0x62,
@@ -50,6 +55,10 @@ enum class Opcode {
     JZ = 0x71,
     JC = 0x72,
     CALL = 0x73,
+    JMPD_S = 0x74,
+    JZ_S = 0x75,
+    JC_S = 0x76,
+    CALL_S = 0x77,
 
     PUSHRD_W = 0xA0,
     PUSHRD_W_IP = 0xA0,
@@ -98,12 +107,92 @@ enum class Opcode {
 enum class IfktCodes {
     INPUT = 0x1,
     OUTPUT = 0x2,
+    WRITE = 0x3,
+    READ_LINE = 0x4,
 
     TERMINATE = 0xf0,
     DUMP = 0xf1,
     DUMP_M = 0xf2,
 };
 
+namespace {
+
+const uint32_t MAX_INSTRUCTION_SIZE = 5;
+
+inline uint32_t load32(const uint8_t *address) {
+    return address[0] | (address[1] << 8) | (address[2] << 16) | (static_cast<uint32_t>(address[3]) << 24);
+}
+
+inline void store32(uint8_t *address, uint32_t value) {
+    address[0] = value & 0xff;
+    address[1] = (value >> 8) & 0xff;
+    address[2] = (value >> 16) & 0xff;
+    address[3] = (value >> 24) & 0xff;
+}
+
+// Instructions with a handler in the fast loop, all others are run by
+// singleStep
+#define FAST_HANDLERS(HANDLER) \
+    HANDLER(Slow) HANDLER(Nop) \
+    HANDLER(AddrW) HANDLER(SubrW) HANDLER(OrrW) HANDLER(AndrW) HANDLER(XorrW) \
+    HANDLER(SraW) HANDLER(SllrW) HANDLER(MulrW) \
+    HANDLER(MovrW) HANDLER(MovrB) HANDLER(MovsIdW) HANDLER(MovsIdB) HANDLER(MovsDiW) HANDLER(MovsDiB) \
+    HANDLER(MoviAcc1) HANDLER(MoviAcc2) \
+    HANDLER(Jmpi) HANDLER(JmpdRegister) HANDLER(Jmpd) HANDLER(Jz) HANDLER(Jc) HANDLER(Call) \
+    HANDLER(JmpdS) HANDLER(JzS) HANDLER(JcS) HANDLER(CallS) \
+    HANDLER(PushrdW) HANDLER(PoprdW) HANDLER(PushrrW) HANDLER(PoprrW)
+
+#define HANDLER_ENUMERATOR(name) name,
+enum class Handler : uint8_t {
+    FAST_HANDLERS(HANDLER_ENUMERATOR)
+};
+#undef HANDLER_ENUMERATOR
+
+constexpr std::array<Handler, 256> make_opcode_handlers() {
+    std::array<Handler, 256> handlers{};
+    auto set = [&handlers](Opcode opcode, Handler handler) {
+        handlers[static_cast<uint8_t>(opcode)] = handler;
+    };
+    set(Opcode::NOP, Handler::Nop);
+    set(Opcode::ADDR_W, Handler::AddrW);
+    set(Opcode::SUBR_W, Handler::SubrW);
+    set(Opcode::ORR_W, Handler::OrrW);
+    set(Opcode::ANDR_W, Handler::AndrW);
+    set(Opcode::XORR_W, Handler::XorrW);
+    set(Opcode::SRA_W, Handler::SraW);
+    set(Opcode::SLLR_W, Handler::SllrW);
+    set(Opcode::MULR_W, Handler::MulrW);
+    set(Opcode::MOVR_W, Handler::MovrW);
+    set(Opcode::MOVR_B, Handler::MovrB);
+    set(Opcode::MOVS_ID_W, Handler::MovsIdW);
+    set(Opcode::MOVS_ID_B, Handler::MovsIdB);
+    set(Opcode::MOVS_DI_W, Handler::MovsDiW);
+    set(Opcode::MOVS_DI_B, Handler::MovsDiB);
+    set(Opcode::MOVI_ACC1, Handler::MoviAcc1);
+    set(Opcode::MOVI_ACC2, Handler::MoviAcc2);
+    set(Opcode::JMPD, Handler::Jmpd);
+    set(Opcode::JZ, Handler::Jz);
+    set(Opcode::JC, Handler::Jc);
+    set(Opcode::CALL, Handler::Call);
+    set(Opcode::JMPD_S, Handler::JmpdS);
+    set(Opcode::JZ_S, Handler::JzS);
+    set(Opcode::JC_S, Handler::JcS);
+    set(Opcode::CALL_S, Handler::CallS);
+    for (uint8_t reg=0; reg<8; reg++) {
+        handlers[static_cast<uint8_t>(Opcode::JMPI_IP) + reg] = Handler::Jmpi;
+        handlers[static_cast<uint8_t>(Opcode::JMPD_IP) + reg] = Handler::JmpdRegister;
+        handlers[static_cast<uint8_t>(Opcode::PUSHRD_W) + reg] = Handler::PushrdW;
+        handlers[static_cast<uint8_t>(Opcode::POPRD_W) + reg] = Handler::PoprdW;
+        handlers[static_cast<uint8_t>(Opcode::PUSHRR_W) + reg] = Handler::PushrrW;
+        handlers[static_cast<uint8_t>(Opcode::POPRR_W) + reg] = Handler::PoprrW;
+    }
+    return handlers;
+}
+
+constexpr std::array<Handler, 256> opcode_handlers = make_opcode_handlers();
+
+}
+
 const std::map<uint8_t, std::string> register_name_mapping = {
     {Vm::Ip, "%ip"},
     {Vm::Wp, "%wp"},
@@ -120,6 +209,8 @@ Vm::Vm(Memory &memory, Memory &data_stack, Memory &return_stack, Symbols &symbol
 , data_stack(data_stack)
 , return_stack(return_stack)
 , symbols(symbols) {
+    static TerminalConsole terminal_console;
+    console = &terminal_console;
     std::fill(state.registers.begin(), state.registers.end(), 0x0);
 }
 
@@ -222,6 +313,66 @@ Vm::Result Vm::singleStep() {
                 state.registers[reg] = (int32_t)state.registers[reg] << imm5;
             }
             break;
+        case Opcode::MULR_W:
+            {
+                param8 = fetch_op();
+                uint8_t low = (param8 & 0x70) >> 4;
+                uint8_t high = param8 & 0x7;
+
+                param8 = fetch_op();
+                uint8_t source = param8 & 0x7;
+
+                uint64_t product = static_cast<uint64_t>(state.registers[low]) * state.registers[source];
+                state.registers[low] = static_cast<uint32_t>(product);
+                state.registers[high] = static_cast<uint32_t>(product >> 32);
+            }
+            break;
+        case Opcode::DIVMODR_W:
+            {
+                param8 = fetch_op();
+                uint8_t low = (param8 & 0x70) >> 4;
+                uint8_t high = param8 & 0x7;
+
+                param8 = fetch_op();
+                uint8_t source = param8 & 0x7;
+
+                uint32_t divisor = state.registers[source];
+                if (divisor == 0 || state.registers[high] >= divisor) {
+                    // quotient doesn't fit into 32 bits
+                    state.registers[low] = 0xffffffff;
+                    state.registers[high] = 0xffffffff;
+                }
+                else {
+                    uint64_t dividend = (static_cast<uint64_t>(state.registers[high]) << 32) | state.registers[low];
+                    state.registers[low] = static_cast<uint32_t>(dividend / divisor);
+                    state.registers[high] = static_cast<uint32_t>(dividend % divisor);
+                }
+            }
+            break;
+        case Opcode::BMOVE:
+            {
+                param8 = fetch_op();
+                uint8_t target = (param8 & 0x70) >> 4;
+                uint8_t source = param8 & 0x7;
+
+                param8 = fetch_op();
+                uint8_t count = param8 & 0x7;
+
+                main_memory.copy(state.registers[target], state.registers[source], state.registers[count]);
+            }
+            break;
+        case Opcode::BFILL:
+            {
+                param8 = fetch_op();
+                uint8_t target = (param8 & 0x70) >> 4;
+                uint8_t value = param8 & 0x7;
+
+                param8 = fetch_op();
+                uint8_t count = param8 & 0x7;
+
+                main_memory.fill(state.registers[target], state.registers[value] & 0xff, state.registers[count]);
+            }
+            break;
         case Opcode::MOVR_W:
             param8 = fetch_op();
             movr_w(param8);
@@ -246,6 +397,18 @@ Vm::Result Vm::singleStep() {
             param8 = fetch_op();
             movs_di_b(param8);
             break;
+        case Opcode::MOVR_H:
+            param8 = fetch_op();
+            movr_h(param8);
+            break;
+        case Opcode::MOVS_ID_H:
+            param8 = fetch_op();
+            movs_id_h(param8);
+            break;
+        case Opcode::MOVS_DI_H:
+            param8 = fetch_op();
+            movs_di_h(param8);
+            break;
         case Opcode::MOVI_ACC1:
             param32 = main_memory.get32(state.registers[Pc]);
             state.registers[Pc] += 4;
@@ -303,6 +466,27 @@ Vm::Result Vm::singleStep() {
             state.registers[Ret] = state.registers[Pc]+4;
             state.registers[Pc] = param32;
             break;
+        case Opcode::JMPD_S:
+            param8 = fetch_op();
+            state.registers[Pc] += static_cast<int8_t>(param8);
+            break;
+        case Opcode::JZ_S:
+            param8 = fetch_op();
+            if (state.registers[Acc1]==0) {
+                state.registers[Pc] += static_cast<int8_t>(param8);
+            }
+            break;
+        case Opcode::JC_S:
+            param8 = fetch_op();
+            if (state.carry) {
+                state.registers[Pc] += static_cast<int8_t>(param8);
+            }
+            break;
+        case Opcode::CALL_S:
+            param8 = fetch_op();
+            state.registers[Ret] = state.registers[Pc];
+            state.registers[Pc] += static_cast<int8_t>(param8);
+            break;
         case Opcode::PUSHRD_W_IP:
         case Opcode::PUSHRD_W_WP:
         case Opcode::PUSHRD_W_RSP:
@@ -362,24 +546,29 @@ Vm::Result Vm::singleStep() {
             param16 |= (fetch_op() << 8);
             switch (static_cast<IfktCodes>(param16)) {
                 case IfktCodes::INPUT:
-                    ch = getch();
-                    if (0x3 == ch) {
-                        std::cout << "Ctrl-C\n";
-                        exit(0);
-                    }
+                    ch = read_key();
                     state.registers[Acc1] = ch;
-                    std::cout << ch;
+                    console->write(&ch, 1);
                     break;
                 case IfktCodes::OUTPUT:
                     ch = state.registers[Acc1] & 0xff;
-                    std::cout << ch;
+                    console->write(&ch, 1);
+                    break;
+                case IfktCodes::WRITE:
+                    write_text(state.registers[Acc1], state.registers[Acc2]);
+                    break;
+                case IfktCodes::READ_LINE:
+                    state.registers[Acc2] = read_line(state.registers[Acc1], state.registers[Acc2]);
                     break;
                 case IfktCodes::TERMINATE:
+                    console->flush();
                     return Finished;
                 case IfktCodes::DUMP:
+                    console->flush();
                     std::cout << "\nDump: " << main_memory.get32(state.registers[Dsp]) << "\n";
                     break;
                 case IfktCodes::DUMP_M:
+                    console->flush();
                     start_address = state.registers[Acc1];
                     end_address = state.registers[Acc2];
                     if (start_address > end_address)
@@ -402,18 +591,441 @@ Vm::Result Vm::singleStep() {
     return Success;
 }
 
-Vm::Result Vm::interpret(bool show_trace) {
-    Result result;
-    do {
-        if (show_trace) {
+Vm::Result Vm::interpret(bool show_trace, uint64_t max_steps) {
+    Result result = Success;
+    uint64_t limit = (0 == max_steps) ? UINT64_MAX : max_steps;
+    bool checked = (nullptr != breakpoints) && !breakpoints->empty();
+    // the instruction at the start never stops at its breakpoint
+    bool resuming = true;
+    steps_run = 0;
+    if ((nullptr != trace_file) || (nullptr != profiler)) {
+        while ((Success == result) && (steps_run < limit)) {
+            if (checked && !resuming && breakpoints->isBreakpoint(state.registers[Pc])) {
+                result = Breakpoint;
+                break;
+            }
+            resuming = false;
+            if (show_trace) {
+                show_trace_at_pc();
+            }
+            uint8_t opcode = main_memory[state.registers[Pc]];
+            if (nullptr != trace_file) {
+                trace_file->record(state.registers, opcode, state.carry);
+            }
+            steps_run++;
+            result = checked ? watched_single_step() : singleStep();
+            if (nullptr != profiler) {
+                profiler->count(opcode, state.registers);
+            }
+        }
+        if (nullptr != trace_file) {
+            trace_file->sync();
+        }
+    } else if (show_trace) {
+        while ((Success == result) && (steps_run < limit)) {
+            if (checked && !resuming && breakpoints->isBreakpoint(state.registers[Pc])) {
+                result = Breakpoint;
+                break;
+            }
+            resuming = false;
             show_trace_at_pc();
+            steps_run++;
+            result = checked ? watched_single_step() : singleStep();
         }
-        result = singleStep();
-    } while (Success == result);
+    } else if (checked) {
+        result = run_fast<true>(limit);
+    } else {
+        result = run_fast<false>(limit);
+    }
 
+    console->flush();
     return result;
 }
 
+// Runs the same instructions as singleStep, but keeps the registers in a
+// local copy and jumps from handler to handler without returning to a loop.
+// The program counter is checked once per instruction against the end of
+// the resident memory, so operands are read without bounds checks.
+// Instructions without a handler, at the end of the resident memory or
+// accessing memory outside of it are handed to singleStep, which also
+// handles sparse memory and reports errors exactly like it always did.
+//
+// When checked, every dispatch looks up the breakpoints first and stores
+// into watched memory are handed to singleStep, which compares the watched
+// memory before and after. Unchecked, these checks are compiled out.
+//
+// Every dispatch counts down the instructions left until the limit, the
+// count is stored in steps_run whenever the loop is left.
+template <bool checked>
+Vm::Result Vm::run_fast(uint64_t limit) {
+#if defined(__GNUC__)
+#define HANDLER_LABEL(name) &&handle_##name,
+    static const void* const handler_labels[] = {
+        FAST_HANDLERS(HANDLER_LABEL)
+    };
+#undef HANDLER_LABEL
+#define HANDLER(name) handle_##name:
+#define DISPATCH() \
+    do { \
+        if (checked && active_breakpoints->isBreakpoint(r[Pc])) goto breakpoint; \
+        if (0 == remaining) goto limit_reached; \
+        remaining--; \
+        if (r[Pc] > pc_limit) goto slow; \
+        pc = r[Pc]; \
+        code = memory + pc; \
+        goto *handler_labels[static_cast<uint8_t>(opcode_handlers[code[0]])]; \
+    } while (false)
+#else
+#define HANDLER(name) case Handler::name:
+#define DISPATCH() goto dispatch
+#endif
+
+    Result result;
+    const Breakpoints *active_breakpoints = breakpoints;
+    uint64_t remaining = limit;
+    if (checked && active_breakpoints->isBreakpoint(state.registers[Pc])) {
+        // resuming at a breakpoint
+        remaining--;
+        steps_run = 1;
+        result = watched_single_step();
+        if ((Success != result) || (0 == remaining)) {
+            return result;
+        }
+    }
+    size_t memory_end = main_memory.residentSize();
+    if ((memory_end < MAX_INSTRUCTION_SIZE) || (data_stack.residentSize() < 4) || (return_stack.residentSize() < 4)) {
+        do {
+            if (checked && active_breakpoints->isBreakpoint(state.registers[Pc])) {
+                return Breakpoint;
+            }
+            remaining--;
+            steps_run = limit - remaining;
+            result = checked ? watched_single_step() : singleStep();
+        } while ((Success == result) && (0 != remaining));
+        return result;
+    }
+    // every instruction starting at or below pc_limit lies completely within
+    // the resident memory
+    const uint32_t pc_limit = memory_end - MAX_INSTRUCTION_SIZE;
+    const uint32_t last_word_address = memory_end - 4;
+    const uint32_t last_byte_address = memory_end - 1;
+    const uint32_t data_stack_limit = data_stack.residentSize() - 4;
+    const uint32_t return_stack_limit = return_stack.residentSize() - 4;
+    uint8_t *memory = main_memory.data();
+    uint8_t *data_stack_memory = data_stack.data();
+    uint8_t *return_stack_memory = return_stack.data();
+    std::array<uint32_t, 8> r = state.registers;
+    bool carry = state.carry;
+    // address and bytes of the current instruction
+    uint32_t pc;
+    const uint8_t *code;
+
+    DISPATCH();
+
+#if !defined(__GNUC__)
+dispatch:
+    if (checked && active_breakpoints->isBreakpoint(r[Pc])) goto breakpoint;
+    if (0 == remaining) goto limit_reached;
+    remaining--;
+    if (r[Pc] > pc_limit) goto slow;
+    pc = r[Pc];
+    code = memory + pc;
+    switch (opcode_handlers[code[0]]) {
+#endif
+
+    HANDLER(Slow)
+        goto slow;
+    HANDLER(Nop)
+        r[Pc] = pc + 1;
+        DISPATCH();
+    HANDLER(AddrW)
+        {
+            r[Pc] = pc + 3;
+            uint32_t source1 = r[code[1] & 0x7];
+            uint32_t source2 = r[code[2] & 0x7];
+            carry = is_uint32_add_overflow(source1, source2);
+            r[(code[1] & 0x70) >> 4] = source1 + source2;
+        }
+        DISPATCH();
+    HANDLER(SubrW)
+        {
+            r[Pc] = pc + 3;
+            uint32_t source1 = r[code[1] & 0x7];
+            uint32_t source2 = r[code[2] & 0x7];
+            carry = source2 > source1;
+            r[(code[1] & 0x70) >> 4] = source1 - source2;
+        }
+        DISPATCH();
+    HANDLER(OrrW)
+        r[Pc] = pc + 3;
+        r[(code[1] & 0x70) >> 4] = r[code[1] & 0x7] | r[code[2] & 0x7];
+        DISPATCH();
+    HANDLER(AndrW)
+        r[Pc] = pc + 3;
+        r[(code[1] & 0x70) >> 4] = r[code[1] & 0x7] & r[code[2] & 0x7];
+        DISPATCH();
+    HANDLER(XorrW)
+        r[Pc] = pc + 3;
+        r[(code[1] & 0x70) >> 4] = r[code[1] & 0x7] ^ r[code[2] & 0x7];
+        DISPATCH();
+    HANDLER(SraW)
+        r[Pc] = pc + 2;
+        r[(code[1] >> 5) & 0x7] = static_cast<int32_t>(r[(code[1] >> 5) & 0x7]) >> (code[1] & 0x1f);
+        DISPATCH();
+    HANDLER(SllrW)
+        r[Pc] = pc + 2;
+        r[(code[1] >> 5) & 0x7] = r[(code[1] >> 5) & 0x7] << (code[1] & 0x1f);
+        DISPATCH();
+    HANDLER(MulrW)
+        {
+            r[Pc] = pc + 3;
+            uint64_t product = static_cast<uint64_t>(r[(code[1] & 0x70) >> 4]) * r[code[2] & 0x7];
+            r[(code[1] & 0x70) >> 4] = static_cast<uint32_t>(product);
+            r[code[1] & 0x7] = static_cast<uint32_t>(product >> 32);
+        }
+        DISPATCH();
+    HANDLER(MovrW)
+        {
+            r[Pc] = pc + 2;
+            uint8_t param = code[1];
+            uint8_t target = (param & 0x70) >> 4;
+            uint8_t source = param & 0x07;
+            if ((param & 0x08) && (r[source] > last_word_address)) goto bail;
+            if ((param & 0x80) && (r[target] > last_word_address)) goto bail;
+            if (checked && (param & 0x80) && active_breakpoints->isWatched(r[target], 4)) goto bail;
+
+            if ((param & 0x80) && (param & 0x08)) {
+                store32(memory + r[target], load32(memory + r[source]));
+            }
+            else if (param & 0x80) {
+                store32(memory + r[target], r[source]);
+            }
+            else if (param & 0x08) {
+                r[target] = load32(memory + r[source]);
+            }
+            else {
+                r[target] = r[source];
+            }
+        }
+        DISPATCH();
+    HANDLER(MovrB)
+        {
+            r[Pc] = pc + 2;
+            uint8_t param = code[1];
+            uint8_t target = (param & 0x70) >> 4;
+            uint8_t source = param & 0x07;
+            if ((param & 0x08) && (r[source] > last_byte_address)) goto bail;
+            if ((param & 0x80) && (r[target] > last_byte_address)) goto bail;
+            if (checked && (param & 0x80) && active_breakpoints->isWatched(r[target], 1)) goto bail;
+
+            if ((param & 0x80) && (param & 0x08)) {
+                memory[r[target]] = memory[r[source]];
+            }
+            else if (param & 0x80) {
+                memory[r[target]] = r[source];
+            }
+            else if (param & 0x08) {
+                r[target] = memory[r[source]];
+            }
+            else {
+                r[target] = r[source] & 0xff;
+            }
+        }
+        DISPATCH();
+    HANDLER(MovsIdW)
+        {
+            r[Pc] = pc + 2;
+            uint8_t param = code[1];
+            uint8_t target = (param & 0x38) >> 3;
+            uint8_t source = param & 0x07;
+            uint32_t step = (param & 0x80) ? -4 : 4;
+            uint32_t address = (param & 0x40) ? r[target] + step : r[target];
+            if (address > last_word_address) goto bail;
+            if (checked && active_breakpoints->isWatched(address, 4)) goto bail;
+
+            if (param & 0x40) {
+                r[target] = address;
+            }
+            store32(memory + address, r[source]);
+            if (!(param & 0x40)) {
+                r[target] += step;
+            }
+        }
+        DISPATCH();
+    HANDLER(MovsIdB)
+        {
+            r[Pc] = pc + 2;
+            uint8_t param = code[1];
+            uint8_t target = (param & 0x38) >> 3;
+            uint8_t source = param & 0x07;
+            uint32_t step = (param & 0x80) ? -1 : 1;
+            uint32_t address = (param & 0x40) ? r[target] + step : r[target];
+            if (address > last_byte_address) goto bail;
+            if (checked && active_breakpoints->isWatched(address, 1)) goto bail;
+
+            if (param & 0x40) {
+                r[target] = address;
+            }
+            memory[address] = r[source];
+            if (!(param & 0x40)) {
+                r[target] += step;
+            }
+        }
+        DISPATCH();
+    HANDLER(MovsDiW)
+        {
+            r[Pc] = pc + 2;
+            uint8_t param = code[1];
+            uint8_t target = (param & 0x38) >> 3;
+            uint8_t source = param & 0x07;
+            uint32_t step = (param & 0x80) ? -4 : 4;
+            uint32_t address = (param & 0x40) ? r[source] + step : r[source];
+            if (address > last_word_address) goto bail;
+
+            if ((param == ((Wp << 3) | Ip)) && (code[2] == static_cast<uint8_t>(Opcode::JMPD_WP))
+                && (0 != remaining) && (!checked || !active_breakpoints->isBreakpoint(pc + 2))) {
+                // NEXT, mov.t %wp,[%ip++] followed by jmp %wp, in one go
+                remaining--;
+                r[Wp] = load32(memory + address);
+                r[Ip] += 4;
+                r[Pc] = r[Wp];
+                DISPATCH();
+            }
+            if (param & 0x40) {
+                r[source] = address;
+            }
+            r[target] = load32(memory + address);
+            if (!(param & 0x40)) {
+                r[source] += step;
+            }
+        }
+        DISPATCH();
+    HANDLER(MovsDiB)
+        {
+            r[Pc] = pc + 2;
+            uint8_t param = code[1];
+            uint8_t target = (param & 0x38) >> 3;
+            uint8_t source = param & 0x07;
+            uint32_t step = (param & 0x80) ? -1 : 1;
+            uint32_t address = (param & 0x40) ? r[source] + step : r[source];
+            if (address > last_byte_address) goto bail;
+
+            if (param & 0x40) {
+                r[source] = address;
+            }
+            r[target] = memory[address];
+            if (!(param & 0x40)) {
+                r[source] += step;
+            }
+        }
+        DISPATCH();
+    HANDLER(MoviAcc1)
+        r[Pc] = pc + 5;
+        r[Acc1] = load32(code + 1);
+        DISPATCH();
+    HANDLER(MoviAcc2)
+        r[Pc] = pc + 5;
+        r[Acc2] = load32(code + 1);
+        DISPATCH();
+    HANDLER(Jmpi)
+        {
+            r[Pc] = pc + 1;
+            uint32_t address = r[code[0] & 0x7];
+            if (address > last_word_address) goto bail;
+            r[Pc] = load32(memory + address);
+        }
+        DISPATCH();
+    HANDLER(JmpdRegister)
+        r[Pc] = pc + 1;
+        r[Pc] = r[code[0] & 0x7];
+        DISPATCH();
+    HANDLER(Jmpd)
+        r[Pc] = load32(code + 1);
+        DISPATCH();
+    HANDLER(Jz)
+        r[Pc] = (r[Acc1] == 0) ? load32(code + 1) : pc + 5;
+        DISPATCH();
+    HANDLER(Jc)
+        r[Pc] = carry ? load32(code + 1) : pc + 5;
+        DISPATCH();
+    HANDLER(Call)
+        r[Ret] = pc + 5;
+        r[Pc] = load32(code + 1);
+        DISPATCH();
+    HANDLER(JmpdS)
+        r[Pc] = pc + 2 + static_cast<int8_t>(code[1]);
+        DISPATCH();
+    HANDLER(JzS)
+        r[Pc] = pc + 2 + ((r[Acc1] == 0) ? static_cast<int8_t>(code[1]) : 0);
+        DISPATCH();
+    HANDLER(JcS)
+        r[Pc] = pc + 2 + (carry ? static_cast<int8_t>(code[1]) : 0);
+        DISPATCH();
+    HANDLER(CallS)
+        r[Ret] = pc + 2;
+        r[Pc] = pc + 2 + static_cast<int8_t>(code[1]);
+        DISPATCH();
+    HANDLER(PushrdW)
+        if (r[Dsp] > data_stack_limit) goto slow;
+        r[Pc] = pc + 1;
+        store32(data_stack_memory + r[Dsp], r[code[0] & 0x7]);
+        r[Dsp] += 4;
+        DISPATCH();
+    HANDLER(PoprdW)
+        // an empty stack is reported by singleStep
+        if ((r[Dsp] < 4) || (r[Dsp] - 4 > data_stack_limit)) goto slow;
+        r[Pc] = pc + 1;
+        r[Dsp] -= 4;
+        r[code[0] & 0x7] = load32(data_stack_memory + r[Dsp]);
+        DISPATCH();
+    HANDLER(PushrrW)
+        if (r[Rsp] > return_stack_limit) goto slow;
+        r[Pc] = pc + 1;
+        store32(return_stack_memory + r[Rsp], r[code[0] & 0x7]);
+        r[Rsp] += 4;
+        DISPATCH();
+    HANDLER(PoprrW)
+        if ((r[Rsp] < 4) || (r[Rsp] - 4 > return_stack_limit)) goto slow;
+        r[Pc] = pc + 1;
+        r[Rsp] -= 4;
+        r[code[0] & 0x7] = load32(return_stack_memory + r[Rsp]);
+        DISPATCH();
+
+#if !defined(__GNUC__)
+    }
+#endif
+
+bail:
+    // undo the decoding of the instruction, nothing else has changed yet
+    r[Pc] = pc;
+slow:
+    state.registers = r;
+    state.carry = carry;
+    steps_run = limit - remaining;
+    result = checked ? watched_single_step() : singleStep();
+    if (Success != result) {
+        return result;
+    }
+    r = state.registers;
+    carry = state.carry;
+    DISPATCH();
+
+breakpoint:
+    state.registers = r;
+    state.carry = carry;
+    steps_run = limit - remaining;
+    return Breakpoint;
+
+limit_reached:
+    state.registers = r;
+    state.carry = carry;
+    steps_run = limit;
+    return Success;
+
+#undef HANDLER
+#undef DISPATCH
+}
+
 Vm::State Vm::getState() const {
     return state;
 }
@@ -422,6 +1034,53 @@ void Vm::setState(const Vm::State &new_state) {
     state = new_state;
 }
 
+void Vm::setConsole(Console &new_console) {
+    console = &new_console;
+}
+
+void Vm::setTraceFile(TraceFile &new_trace_file) {
+    trace_file = &new_trace_file;
+}
+
+void Vm::setProfiler(Profiler &new_profiler) {
+    profiler = &new_profiler;
+}
+
+void Vm::setBreakpoints(Breakpoints &new_breakpoints) {
+    breakpoints = &new_breakpoints;
+}
+
+// Runs one instruction and reports Watchpoint if it changed watched memory
+Vm::Result Vm::watched_single_step() {
+    const auto &watchpoints = breakpoints->watchpoints();
+    if (watchpoints.empty()) {
+        return singleStep();
+    }
+
+    watched_contents.clear();
+    for (const auto &watchpoint: watchpoints) {
+        for (uint64_t address=watchpoint.start;
+             (address < uint64_t(watchpoint.start) + watchpoint.size) && (address < main_memory.size());
+             address++) {
+            watched_contents.push_back(main_memory.get8(address));
+        }
+    }
+
+    Result result = singleStep();
+
+    size_t index = 0;
+    for (const auto &watchpoint: watchpoints) {
+        for (uint64_t address=watchpoint.start;
+             (address < uint64_t(watchpoint.start) + watchpoint.size) && (address < main_memory.size());
+             address++) {
+            if ((watched_contents[index++] != main_memory.get8(address)) && (Success == result)) {
+                return Watchpoint;
+            }
+        }
+    }
+    return result;
+}
+
 std::string Vm::disassembleAtPc() const {
     uint32_t param;
 
@@ -518,6 +1177,62 @@ std::string Vm::disassembleAtPc() const {
                     imm5
                 );
             }
+        case Opcode::MULR_W:
+            {
+                uint8_t param1 = main_memory[state.registers[Pc]+1];
+                uint8_t param2 = main_memory[state.registers[Pc]+2];
+
+                uint8_t low = (param1 & 0x70) >> 4;
+                uint8_t high = param1 & 0x7;
+                uint8_t source = param2 & 0x7;
+                return fmt::format("mul.w {}, {}, {}",
+                    register_name_mapping.at(low),
+                    register_name_mapping.at(high),
+                    register_name_mapping.at(source)
+                );
+            }
+        case Opcode::DIVMODR_W:
+            {
+                uint8_t param1 = main_memory[state.registers[Pc]+1];
+                uint8_t param2 = main_memory[state.registers[Pc]+2];
+
+                uint8_t low = (param1 & 0x70) >> 4;
+                uint8_t high = param1 & 0x7;
+                uint8_t source = param2 & 0x7;
+                return fmt::format("divmod.w {}, {}, {}",
+                    register_name_mapping.at(low),
+                    register_name_mapping.at(high),
+                    register_name_mapping.at(source)
+                );
+            }
+        case Opcode::BMOVE:
+            {
+                uint8_t param1 = main_memory[state.registers[Pc]+1];
+                uint8_t param2 = main_memory[state.registers[Pc]+2];
+
+                uint8_t target = (param1 & 0x70) >> 4;
+                uint8_t source = param1 & 0x7;
+                uint8_t count = param2 & 0x7;
+                return fmt::format("bmove {}, {}, {}",
+                    register_name_mapping.at(target),
+                    register_name_mapping.at(source),
+                    register_name_mapping.at(count)
+                );
+            }
+        case Opcode::BFILL:
+            {
+                uint8_t param1 = main_memory[state.registers[Pc]+1];
+                uint8_t param2 = main_memory[state.registers[Pc]+2];
+
+                uint8_t target = (param1 & 0x70) >> 4;
+                uint8_t value = param1 & 0x7;
+                uint8_t count = param2 & 0x7;
+                return fmt::format("bfill {}, {}, {}",
+                    register_name_mapping.at(target),
+                    register_name_mapping.at(value),
+                    register_name_mapping.at(count)
+                );
+            }
         case Opcode::MOVR_W:
             param = main_memory[state.registers[Pc]+1];
             return fmt::format("mov.w {}", disassemble_movr_parameters(param));
@@ -536,6 +1251,15 @@ std::string Vm::disassembleAtPc() const {
         case Opcode::MOVS_DI_B:
             param = main_memory[state.registers[Pc]+1];
             return fmt::format("mov.b {}", disassemble_movs_parameters(param, MoveTarget::Indirect));
+        case Opcode::MOVR_H:
+            param = main_memory[state.registers[Pc]+1];
+            return fmt::format("mov.h {}", disassemble_movr_parameters(param));
+        case Opcode::MOVS_ID_H:
+            param = main_memory[state.registers[Pc]+1];
+            return fmt::format("mov.h {}", disassemble_movs_parameters(param, MoveTarget::Direct));
+        case Opcode::MOVS_DI_H:
+            param = main_memory[state.registers[Pc]+1];
+            return fmt::format("mov.h {}", disassemble_movs_parameters(param, MoveTarget::Indirect));
         case Opcode::MOVI_ACC1:
             param = main_memory.get32(state.registers[Pc]+1);
             return fmt::format("mov %acc1, {:#x}", param);
@@ -586,6 +1310,18 @@ std::string Vm::disassembleAtPc() const {
         case Opcode::CALL:
             param = main_memory.get32(state.registers[Pc]+1);
             return fmt::format("call {:#x}", param);
+        case Opcode::JMPD_S:
+            param = short_branch_target();
+            return fmt::format("jmp {:#x}", param);
+        case Opcode::JZ_S:
+            param = short_branch_target();
+            return fmt::format("jz {:#x}", param);
+        case Opcode::JC_S:
+            param = short_branch_target();
+            return fmt::format("jc {:#x}", param);
+        case Opcode::CALL_S:
+            param = short_branch_target();
+            return fmt::format("call {:#x}", param);
         case Opcode::PUSHRD_W_IP:
             return "pushd %ip";
         case Opcode::PUSHRD_W_WP:
@@ -669,6 +1405,55 @@ uint8_t Vm::fetch_op() {
     return main_memory[state.registers[Pc]++];
 }
 
+char Vm::read_key() {
+    int ch = console->read();
+    if (Console::END_OF_INPUT == ch) {
+        console->flush();
+        throw end_of_input("End of input");
+    }
+    if (0x3 == ch) {
+        console->write("Ctrl-C\n", 7);
+        console->flush();
+        throw end_of_input("Ctrl-C");
+    }
+    return ch;
+}
+
+void Vm::write_text(uint32_t address, uint32_t count) {
+    // pages of sparse memory aren't contiguous, the text is copied in pieces
+    uint8_t buffer[Memory::PAGE_SIZE];
+    while (count > 0) {
+        uint32_t piece = std::min<uint32_t>(count, sizeof(buffer));
+        main_memory.get(address, buffer, piece);
+        console->write(reinterpret_cast<const char*>(buffer), piece);
+        address += piece;
+        count -= piece;
+    }
+}
+
+uint32_t Vm::read_line(uint32_t address, uint32_t size) {
+    uint32_t count = 0;
+
+    while (count < size) {
+        char ch = read_key();
+        if (('\r' == ch) || ('\n' == ch)) {
+            break;
+        }
+        if ('\b' == ch) {
+            if (count > 0) {
+                count--;
+                console->write("\b \b", 3);
+            }
+            continue;
+        }
+        uint8_t byte = ch;
+        main_memory.put(address + count, &byte, 1);
+        count++;
+        console->write(&ch, 1);
+    }
+    return count;
+}
+
 void Vm::movr_b(uint8_t param) {
     uint8_t target = (param & 0x70) >> 4;
     uint8_t source = param & 0x07;
@@ -683,7 +1468,25 @@ void Vm::movr_b(uint8_t param) {
         state.registers[target] = main_memory[state.registers[source]];
     }
     else {
-        state.registers[target] = state.registers[source];
+        state.registers[target] = state.registers[source] & 0xff;
+    }
+}
+
+void Vm::movr_h(uint8_t param) {
+    uint8_t target = (param & 0x70) >> 4;
+    uint8_t source = param & 0x07;
+
+    if ((param & 0x80) && (param & 0x08)) {
+        main_memory.put16(state.registers[target], main_memory.get16(state.registers[source]));
+    }
+    else if (param & 0x80) {
+        main_memory.put16(state.registers[target], state.registers[source]);
+    }
+    else if (param & 0x08) {
+        state.registers[target] = main_memory.get16(state.registers[source]);
+    }
+    else {
+        state.registers[target] = state.registers[source] & 0xffff;
     }
 }
 
@@ -817,6 +1620,62 @@ void Vm::movs_di_b(uint8_t param) {
     }
 }
 
+void Vm::movs_id_h(uint8_t param) {
+    uint8_t target = (param & 0x38) >> 3;
+    uint8_t source = param & 0x07;
+
+    bool decrement = (param & 0x80);
+    bool pre = (param & 0x40);
+
+    if (pre) {
+        if (decrement) {
+            state.registers[target] -= 2;
+        }
+        else {
+            state.registers[target] += 2;
+        }
+    }
+
+    main_memory.put16(state.registers[target], state.registers[source]);
+
+    if (!pre) {
+        if (decrement) {
+            state.registers[target] -= 2;
+        }
+        else {
+            state.registers[target] += 2;
+        }
+    }
+}
+
+void Vm::movs_di_h(uint8_t param) {
+    uint8_t target = (param & 0x38) >> 3;
+    uint8_t source = param & 0x07;
+
+    bool decrement = (param & 0x80);
+    bool pre = (param & 0x40);
+
+    if (pre) {
+        if (decrement) {
+            state.registers[source] -= 2;
+        }
+        else {
+            state.registers[source] += 2;
+        }
+    }
+
+    state.registers[target] = main_memory.get16(state.registers[source]);
+
+    if (!pre) {
+        if (decrement) {
+            state.registers[source] -= 2;
+        }
+        else {
+            state.registers[source] += 2;
+        }
+    }
+}
+
 void Vm::show_trace_at_pc() const {
     auto wp_symbols = symbols.symbolsAtAddress(state.registers[Vm::Wp]);
     auto ip_symbols = symbols.symbolsAtAddress(state.registers[Vm::Ip]);
@@ -829,6 +1688,11 @@ void Vm::show_trace_at_pc() const {
                wp_string, ip_string);
 }
 
+uint32_t Vm::short_branch_target() const {
+    int8_t displacement = static_cast<int8_t>(main_memory[state.registers[Pc]+1]);
+    return state.registers[Pc] + 2 + displacement;
+}
+
 std::string Vm::disassemble_movr_parameters(uint8_t parameter) const {
     uint8_t target = (parameter & 0x70) >> 4;
     uint8_t source = parameter & 0x07;
@@ -2,13 +2,18 @@
 #define VM_H
 
 #include <array>
+#include <vector>
+#include "breakpoints.h"
 #include "vm_memory.h"
 #include "symbols.h"
+#include "console.h"
+#include "profiler.h"
+#include "trace_file.h"
 
 class Vm {
 public:
     enum Result {
-        Success, Finished, Error, IllegalInstruction
+        Success, Finished, Error, IllegalInstruction, Breakpoint, Watchpoint
     };
 
     enum Register {
@@ -30,25 +35,49 @@ public:
     explicit Vm(Memory &main_memory, Memory &data_stack, Memory &return_stack, Symbols &symbols);
 
     Result singleStep();
-    Result interpret(bool show_trace);
+    // Runs until the program stops or, unless max_steps is 0, until
+    // max_steps instructions ran, which returns Success
+    Result interpret(bool show_trace, uint64_t max_steps = 0);
+    // Number of instructions run by the last interpret
+    uint64_t stepsRun() const { return steps_run; }
 
     State getState() const;
     void setState(const State &new_state);
 
     std::string disassembleAtPc() const;
 
+    // Replaces the default terminal console, the console must outlive the VM
+    void setConsole(Console &new_console);
+    // Records every instruction run by interpret into the binary trace
+    void setTraceFile(TraceFile &new_trace_file);
+    // Counts every instruction run by interpret per word and call path
+    void setProfiler(Profiler &new_profiler);
+    // Stops interpret at the breakpoints and after changes of watched memory,
+    // interpret runs the instruction at a breakpoint it starts at
+    void setBreakpoints(Breakpoints &new_breakpoints);
+
 private:
     uint8_t fetch_op();
+    char read_key();
+    void write_text(uint32_t address, uint32_t count);
+    uint32_t read_line(uint32_t address, uint32_t size);
 
     void movr_b(uint8_t param);
+    void movr_h(uint8_t param);
     void movr_w(uint8_t param);
     void movs_id_w(uint8_t param);
     void movs_id_b(uint8_t param);
     void movs_di_w(uint8_t param);
     void movs_di_b(uint8_t param);
+    void movs_id_h(uint8_t param);
+    void movs_di_h(uint8_t param);
 
     void show_trace_at_pc() const;
+    template <bool checked>
+    Result run_fast(uint64_t limit);
+    Result watched_single_step();
 
+    uint32_t short_branch_target() const;
     std::string disassemble_movr_parameters(uint8_t parameter) const;
     enum class MoveTarget { Direct, Indirect };
     std::string disassemble_movs_parameters(uint8_t parameter, MoveTarget move_target) const;
@@ -62,6 +91,12 @@ private:
     Memory& data_stack;
     Memory& return_stack;
     Symbols& symbols;
+    Console* console;
+    TraceFile* trace_file = nullptr;
+    Profiler* profiler = nullptr;
+    Breakpoints* breakpoints = nullptr;
+    std::vector<uint8_t> watched_contents;
+    uint64_t steps_run = 0;
 };
 
 #endif
\ No newline at end of file
@@ -2,61 +2,186 @@
 #include <fstream>
 #include <iostream>
 #include <cassert>
+#include <algorithm>
 
 memory_access_error::memory_access_error(
   const std::string &message, uint32_t access_address,
-  uint32_t maximum_address) 
+  uint64_t maximum_address) 
     : std::runtime_error(message)
     , access_address(access_address)
     , maximum_address(maximum_address)
 { }
 
-Memory::Memory() {}
+Memory::Memory() : Memory(MEMORY_SIZE) {}
+
+Memory::Memory(size_t size, bool sparse) :
+    memory_size(size),
+    sparse(sparse),
+    resident(sparse ? 0 : size)
+{
+    if (size > MAXIMUM_SIZE) {
+        throw std::invalid_argument("Memory can't be bigger than the 32-bit address space");
+    }
+}
 
 Memory::Memory(std::initializer_list<uint8_t> l) :
-    memory()
+    Memory()
 {
-    // TODO: This may not properly handle a size of l that
-    // is bigger than memory
-    uint32_t counter = 0;
-    std::copy(l.begin(), l.end(), memory.begin());
+    std::copy_n(l.begin(), std::min(l.size(), resident.size()), resident.begin());
+}
+
+uint8_t& Memory::page_byte(size_t address) {
+    if (address >= memory_size) {
+        throw memory_access_error("Access byte outside available memory", address, memory_size);
+    }
+    auto& page = pages[address / PAGE_SIZE];
+    if (page.empty()) {
+        page.resize(PAGE_SIZE);
+    }
+    return page[address % PAGE_SIZE];
+}
+
+uint8_t Memory::read_byte(size_t address) const {
+    if (address < resident.size()) {
+        return resident[address];
+    }
+    auto page = pages.find(address / PAGE_SIZE);
+    if (page == pages.end()) {
+        return 0;
+    }
+    return page->second[address % PAGE_SIZE];
+}
+
+void Memory::check_access(size_t address, size_t count, const char *message) const {
+    if (static_cast<uint64_t>(address) + count > memory_size) {
+        throw memory_access_error(message, address, memory_size);
+    }
 }
 
-uint8_t& Memory::operator[](size_t index) {
-    return memory[index];
+void Memory::make_resident(size_t count) {
+    count = std::min(memory_size, (count + PAGE_SIZE - 1) / PAGE_SIZE * PAGE_SIZE);
+    if (count <= resident.size()) {
+        return;
+    }
+    resident.resize(count);
+    for (auto page = pages.begin(); page != pages.end(); ) {
+        size_t start = static_cast<size_t>(page->first) * PAGE_SIZE;
+        if (start < count) {
+            std::copy_n(page->second.begin(), std::min(PAGE_SIZE, count - start), resident.begin() + start);
+            page = pages.erase(page);
+        }
+        else {
+            ++page;
+        }
+    }
+}
+
+uint8_t Memory::get8(size_t address) const {
+    check_access(address, 1, "Read byte outside available memory");
+    return read_byte(address);
 }
 
 uint16_t Memory::get16(size_t address) const {
-    if (address+1 > MEMORY_SIZE) {
-        throw memory_access_error("Read 2 bytes outside available memory", address, MEMORY_SIZE);
+    check_access(address, 2, "Read 2 bytes outside available memory");
+    if (address + 2 <= resident.size()) {
+        return (resident[address] | (resident[address+1] << 8));
     }
-    return (memory[address] | (memory[address+1] << 8));
+    return (read_byte(address) | (read_byte(address+1) << 8));
 }
 
 uint32_t Memory::get32(size_t address) const {
-    if (address+3 > MEMORY_SIZE) {
-        throw memory_access_error("Read 4 bytes outside available memory", address, MEMORY_SIZE);
+    check_access(address, 4, "Read 4 bytes outside available memory");
+    if (address + 4 <= resident.size()) {
+        return (resident[address] | (resident[address+1] << 8) | (resident[address+2] << 16) | (resident[address+3] << 24));
     }
-    return (memory[address] | (memory[address+1] << 8) | (memory[address+2] << 16) | (memory[address+3] << 24)); 
+    return (read_byte(address) | (read_byte(address+1) << 8) | (read_byte(address+2) << 16) | (read_byte(address+3) << 24));
+}
+
+void Memory::put16(uint32_t address, uint16_t value) {
+    check_access(address, 2, "Write 2 bytes outside available memory");
+    if (static_cast<uint64_t>(address) + 2 <= resident.size()) {
+        resident[address] = value & 0xff;
+        resident[address+1] = (value >> 8) & 0xff;
+        return;
+    }
+    (*this)[address] = value & 0xff;
+    (*this)[address+1] = (value >> 8) & 0xff;
 }
 
 void Memory::put32(uint32_t address, uint32_t value) {
-    if (address+3 > MEMORY_SIZE) {
-        throw memory_access_error("Write 4 bytes outside available memory", address, MEMORY_SIZE);
+    check_access(address, 4, "Write 4 bytes outside available memory");
+    if (static_cast<uint64_t>(address) + 4 <= resident.size()) {
+        resident[address] = value & 0xff;
+        resident[address+1] = (value >> 8) & 0xff;
+        resident[address+2] = (value >> 16) & 0xff;
+        resident[address+3] = (value >> 24) & 0xff;
+        return;
+    }
+    (*this)[address] = value & 0xff;
+    (*this)[address+1] = (value >> 8) & 0xff;
+    (*this)[address+2] = (value >> 16) & 0xff;
+    (*this)[address+3] = (value >> 24) & 0xff;
+}
+
+void Memory::copy(uint32_t target, uint32_t source, uint32_t count) {
+    check_access(source, count, "Copy from outside available memory");
+    check_access(target, count, "Copy to outside available memory");
+    bool is_resident = (static_cast<uint64_t>(source) + count <= resident.size())
+        && (static_cast<uint64_t>(target) + count <= resident.size());
+    if (!is_resident || (target > source && target < source + count)) {
+        // copy byte by byte from low to high addresses like CMOVE does, so
+        // overlapping areas repeat the start of the source
+        for (uint32_t i=0; i<count; ++i) {
+            (*this)[target+i] = read_byte(source+i);
+        }
+    }
+    else {
+        std::copy_n(resident.begin() + source, count, resident.begin() + target);
+    }
+}
+
+void Memory::fill(uint32_t target, uint8_t value, uint32_t count) {
+    check_access(target, count, "Fill outside available memory");
+    if (static_cast<uint64_t>(target) + count <= resident.size()) {
+        std::fill_n(resident.begin() + target, count, value);
+        return;
+    }
+    for (uint32_t i=0; i<count; ++i) {
+        (*this)[target+i] = value;
+    }
+}
+
+void Memory::get(uint32_t address, uint8_t *data, uint32_t count) const {
+    check_access(address, count, "Read block outside available memory");
+    if (static_cast<uint64_t>(address) + count <= resident.size()) {
+        std::copy_n(resident.begin() + address, count, data);
+        return;
+    }
+    for (uint32_t i=0; i<count; ++i) {
+        data[i] = read_byte(address+i);
+    }
+}
+
+void Memory::put(uint32_t address, const uint8_t *data, uint32_t count) {
+    check_access(address, count, "Write block outside available memory");
+    if (static_cast<uint64_t>(address) + count <= resident.size()) {
+        std::copy_n(data, count, resident.begin() + address);
+        return;
+    }
+    for (uint32_t i=0; i<count; ++i) {
+        (*this)[address+i] = data[i];
     }
-    memory[address] = value & 0xff;
-    memory[address+1] = (value >> 8) & 0xff;
-    memory[address+2] = (value >> 16) & 0xff;
-    memory[address+3] = (value >> 24) & 0xff; 
 }
 
 void Memory::loadImageFromFile(const std::string &image_path) {
     std::fstream image_file;
     image_file.open(image_path, std::ios::in | std::ios::binary | std::ios::ate);
-    auto filesize = image_file.tellg();
-    if (filesize <= sizeof(memory)) {
+    auto filesize = static_cast<size_t>(image_file.tellg());
+    if (filesize <= memory_size) {
+        // the loaded image is always resident, so running it is fast
+        make_resident(filesize);
         image_file.seekg(0);
-        image_file.read(reinterpret_cast<char*>(memory.data()), filesize);
+        image_file.read(reinterpret_cast<char*>(resident.data()), filesize);
     }
     else {
         std::cout << "ERROR!! Couldn't loading binary with a size bigger than available memory size\n";
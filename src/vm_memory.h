@@ -1,44 +1,87 @@
 #ifndef VM_MEMORY_H
 #define VM_MEMORY_H
 
-#include <array>
 #include <initializer_list>
+#include <iterator>
 #include <string>
 #include <stdexcept>
 #include <stdint.h>
+#include <unordered_map>
+#include <vector>
 
 const static size_t MEMORY_SIZE = 32768;
 
 class memory_access_error : public std::runtime_error {
 public:
     memory_access_error(const std::string &message, uint32_t access_address,
-                        uint32_t maximum_address);
+                        uint64_t maximum_address);
     
     uint32_t access_address;
-    uint32_t maximum_address;
+    uint64_t maximum_address;
 };
 
+// Byte addressable memory of a configurable size up to 4 GiB.
+//
+// The resident part starting at address 0 is allocated as one block. Dense
+// memory is resident completely, sparse memory only covers the loaded image
+// and allocates the pages above it on their first access; reading untouched
+// pages returns 0.
 class Memory {
 public:
+    static constexpr size_t PAGE_SIZE = 4096;
+    static constexpr size_t MAXIMUM_SIZE = 0x100000000;
+
     Memory();
+    explicit Memory(size_t size, bool sparse=false);
     Memory(std::initializer_list<uint8_t> l);
 
-    uint8_t& operator[](size_t index);
+    uint8_t& operator[](size_t index) {
+        if (index < resident.size()) {
+            return resident[index];
+        }
+        return page_byte(index);
+    }
+    // Reads without allocating pages of sparse memory
+    uint8_t get8(size_t address) const;
     uint16_t get16(size_t address) const;
     uint32_t get32(size_t address) const;
+    void put16(uint32_t address, uint16_t value);
     void put32(uint32_t address, uint32_t value);
+    void copy(uint32_t target, uint32_t source, uint32_t count);
+    void fill(uint32_t target, uint8_t value, uint32_t count);
+    // Copy count bytes between the memory and a buffer, also across pages
+    void get(uint32_t address, uint8_t *data, uint32_t count) const;
+    void put(uint32_t address, const uint8_t *data, uint32_t count);
+    // Unchecked access to the resident part for the fast interpreter loop,
+    // which checks the bounds itself
+    uint8_t* data() { return resident.data(); }
+
+    size_t size() const { return memory_size; }
+    size_t residentSize() const { return resident.size(); }
+    bool isSparse() const { return sparse; }
+    size_t allocatedPages() const { return pages.size(); }
 
     void loadImageFromFile(const std::string &image_path);
     template<typename Iterator>
     void loadImageFromIterator(Iterator begin, Iterator end) {
+        make_resident(std::distance(begin, end));
         uint32_t counter = 0;
         for (Iterator it=begin; it!=end; ++it) {
-            memory[counter++] = *it;
+            (*this)[counter++] = *it;
         }
     }
 
 private:
-    std::array<uint8_t, MEMORY_SIZE> memory;
+    uint8_t& page_byte(size_t address);
+    uint8_t read_byte(size_t address) const;
+    void check_access(size_t address, size_t count, const char *message) const;
+    void make_resident(size_t count);
+
+    size_t memory_size;
+    bool sparse = false;
+    std::vector<uint8_t> resident;
+    // pages above the resident part of sparse memory by page number
+    std::unordered_map<uint32_t, std::vector<uint8_t>> pages;
 };
 
 #endif
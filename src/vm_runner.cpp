@@ -0,0 +1,212 @@
+#include "vm_runner.h"
+
+VmRunner::VmRunner(Vm &vm, Memory &main_memory, Memory &data_stack, Memory &return_stack)
+: vm(vm)
+, main_memory(main_memory)
+, data_stack(data_stack)
+, return_stack(return_stack) {
+    published_time = std::chrono::steady_clock::now();
+    publish();
+    worker = std::thread(&VmRunner::work, this);
+}
+
+VmRunner::~VmRunner() {
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        quit = true;
+    }
+    changed.notify_all();
+    worker.join();
+}
+
+void VmRunner::run(bool stop_at_breakpoints) {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (mode == Mode::Finished) {
+        return;
+    }
+    mode = Mode::Running;
+    this->stop_at_breakpoints = stop_at_breakpoints;
+    resuming = true;
+    changed.notify_all();
+}
+
+void VmRunner::pause() {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (mode == Mode::Running) {
+        mode = Mode::Paused;
+    }
+    pending_steps = 0;
+    changed.notify_all();
+}
+
+void VmRunner::step() {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (mode == Mode::Paused) {
+        pending_steps++;
+        changed.notify_all();
+    }
+}
+
+void VmRunner::whilePaused(const std::function<void()> &function) {
+    std::unique_lock<std::mutex> lock(mutex);
+    if (mode == Mode::Running) {
+        mode = Mode::Paused;
+    }
+    pending_steps = 0;
+    changed.wait(lock, [this] { return !busy; });
+
+    function();
+
+    // the VM may start over, e.g. with a new image
+    mode = Mode::Paused;
+    result = Vm::Success;
+    error.clear();
+    publish();
+}
+
+void VmRunner::toggleBreakpoint(uint32_t address) {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (!breakpoint_addresses.erase(address)) {
+        breakpoint_addresses.insert(address);
+    }
+    breakpoints_changed = true;
+}
+
+std::set<uint32_t> VmRunner::breakpoints() const {
+    std::lock_guard<std::mutex> lock(mutex);
+    return breakpoint_addresses;
+}
+
+void VmRunner::setMemoryWindow(uint32_t start, uint32_t size) {
+    std::lock_guard<std::mutex> lock(mutex);
+    memory_window_start = start;
+    memory_window_size = size;
+    if (!busy) {
+        // a running worker publishes the window with its next snapshot
+        publish();
+    }
+}
+
+VmRunner::Snapshot VmRunner::snapshot() const {
+    std::lock_guard<std::mutex> lock(snapshot_mutex);
+    return published;
+}
+
+void VmRunner::work() {
+    std::unique_lock<std::mutex> lock(mutex);
+    while (!quit) {
+        if ((mode != Mode::Running) && (pending_steps == 0)) {
+            changed.wait(lock);
+            continue;
+        }
+
+        bool single_step = (mode != Mode::Running);
+        if (single_step) {
+            pending_steps--;
+        }
+        if (breakpoints_changed) {
+            active_breakpoints = Breakpoints();
+            for (auto address: breakpoint_addresses) {
+                active_breakpoints.add(address);
+            }
+            breakpoints_changed = false;
+        }
+        bool check_breakpoints = !single_step && stop_at_breakpoints && !active_breakpoints.empty();
+        bool skip_breakpoint = resuming;
+        resuming = false;
+        busy = true;
+        lock.unlock();
+
+        bool hit_breakpoint = false;
+        try {
+            if (single_step) {
+                result = vm.singleStep();
+                instructions++;
+            }
+            else if (check_breakpoints && !skip_breakpoint
+                     && active_breakpoints.isBreakpoint(vm.getState().registers[Vm::Pc])) {
+                // the last batch ended right in front of a breakpoint, which
+                // interpret would run as the instruction it starts with
+                hit_breakpoint = true;
+            }
+            else {
+                // runs at full speed, the breakpoints are only checked when
+                // there are any to stop at
+                vm.setBreakpoints(check_breakpoints ? active_breakpoints : no_breakpoints);
+                result = vm.interpret(false, BATCH_SIZE);
+                instructions += vm.stepsRun();
+                if (Vm::Breakpoint == result) {
+                    hit_breakpoint = true;
+                    result = Vm::Success;
+                }
+            }
+        }
+        catch (const memory_access_error &e) {
+            result = Vm::Error;
+            error = e.what();
+            instructions += single_step ? 1 : vm.stepsRun();
+        }
+        catch (const end_of_input &e) {
+            result = Vm::Finished;
+            error = e.what();
+            instructions += single_step ? 1 : vm.stepsRun();
+        }
+
+        lock.lock();
+        busy = false;
+        if (Vm::Success != result) {
+            mode = Mode::Finished;
+        }
+        else if (hit_breakpoint) {
+            mode = Mode::Paused;
+        }
+        if ((mode != Mode::Running)
+            || (std::chrono::steady_clock::now() - published_time >= PUBLISH_INTERVAL)) {
+            publish();
+        }
+        changed.notify_all();
+    }
+}
+
+void VmRunner::publish() {
+    Snapshot snapshot;
+    snapshot.mode = mode;
+    snapshot.result = result;
+    snapshot.state = vm.getState();
+    snapshot.error = error;
+    snapshot.instructions = instructions;
+
+    auto now = std::chrono::steady_clock::now();
+    std::chrono::duration<double> elapsed = now - published_time;
+    if ((mode == Mode::Running) && (elapsed.count() > 0.0)) {
+        snapshot.instructions_per_second = (instructions - published_instructions) / elapsed.count();
+    }
+    published_time = now;
+    published_instructions = instructions;
+
+    try {
+        snapshot.next_instruction = vm.disassembleAtPc();
+    }
+    catch (const memory_access_error &) {
+        snapshot.next_instruction = "-";
+    }
+
+    auto dsp = snapshot.state.registers[Vm::Dsp];
+    for (uint32_t address=0; (address + 4 <= dsp) && (address + 4 <= data_stack.size()); address+=4) {
+        snapshot.data_stack.push_back(data_stack.get32(address));
+    }
+    auto rsp = snapshot.state.registers[Vm::Rsp];
+    for (uint32_t address=0; (address + 4 <= rsp) && (address + 4 <= return_stack.size()); address+=4) {
+        snapshot.return_stack.push_back(return_stack.get32(address));
+    }
+
+    snapshot.memory_start = memory_window_start;
+    for (uint64_t address=memory_window_start;
+         (address < static_cast<uint64_t>(memory_window_start) + memory_window_size) && (address < main_memory.size());
+         address++) {
+        snapshot.memory.push_back(main_memory.get8(address));
+    }
+
+    std::lock_guard<std::mutex> lock(snapshot_mutex);
+    published = std::move(snapshot);
+}
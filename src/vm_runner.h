@@ -0,0 +1,99 @@
+#ifndef VM_RUNNER_H
+#define VM_RUNNER_H
+
+#include "vm.h"
+#include <stdint.h>
+#include <chrono>
+#include <condition_variable>
+#include <functional>
+#include <mutex>
+#include <set>
+#include <string>
+#include <thread>
+#include <vector>
+
+// Runs a VM on a worker thread while a user interface watches it.
+//
+// The worker owns the VM and its memories; all other threads only look at
+// snapshots of the state, published at a fixed rate while running and after
+// every pause. Access to the VM, like loading an image, goes through
+// whilePaused.
+class VmRunner {
+public:
+    enum class Mode { Paused, Running, Finished };
+
+    struct Snapshot {
+        Mode mode = Mode::Paused;
+        Vm::Result result = Vm::Success;
+        Vm::State state = {false, {0, 0, 0, 0, 0, 0, 0, 0}};
+        std::string next_instruction;
+        std::string error;
+        uint64_t instructions = 0;
+        double instructions_per_second = 0.0;
+        // stack entries from the bottom up to the stack pointers
+        std::vector<uint32_t> data_stack;
+        std::vector<uint32_t> return_stack;
+        // contents of the memory window set by setMemoryWindow
+        uint32_t memory_start = 0;
+        std::vector<uint8_t> memory;
+    };
+
+    // instructions run by one call of Vm::interpret while running, a few
+    // milliseconds at full speed
+    static constexpr uint64_t BATCH_SIZE = 1 << 20;
+    static constexpr std::chrono::milliseconds PUBLISH_INTERVAL{16};
+
+    VmRunner(Vm &vm, Memory &main_memory, Memory &data_stack, Memory &return_stack);
+    ~VmRunner();
+
+    void run(bool stop_at_breakpoints);
+    void pause();
+    void step();
+    // Calls function with the worker paused, e.g. to change the memory
+    void whilePaused(const std::function<void()> &function);
+
+    void toggleBreakpoint(uint32_t address);
+    std::set<uint32_t> breakpoints() const;
+    void setMemoryWindow(uint32_t start, uint32_t size);
+
+    Snapshot snapshot() const;
+
+private:
+    void work();
+    void publish();
+
+    Vm &vm;
+    Memory &main_memory;
+    Memory &data_stack;
+    Memory &return_stack;
+
+    // guards the fields below up to the worker
+    mutable std::mutex mutex;
+    std::condition_variable changed;
+    Mode mode = Mode::Paused;
+    bool stop_at_breakpoints = false;
+    // the instruction a run starts with doesn't stop at its breakpoint
+    bool resuming = false;
+    size_t pending_steps = 0;
+    bool busy = false;
+    bool quit = false;
+    std::set<uint32_t> breakpoint_addresses;
+    bool breakpoints_changed = false;
+    uint32_t memory_window_start = 0;
+    uint32_t memory_window_size = 0;
+    std::thread worker;
+
+    mutable std::mutex snapshot_mutex;
+    Snapshot published;
+
+    // only used by the worker, or while it is paused
+    Breakpoints active_breakpoints;
+    Breakpoints no_breakpoints;
+    Vm::Result result = Vm::Success;
+    std::string error;
+    uint64_t instructions = 0;
+    uint64_t published_instructions = 0;
+    std::chrono::steady_clock::time_point published_time;
+};
+
+#endif
@@ -0,0 +1,161 @@
+#include <catch2/catch_test_macros.hpp>
+#include "symbols.h"
+#include <cstdio>
+#include <fstream>
+#include <string>
+#include <tuple>
+#include <vector>
+
+namespace {
+
+void append32(std::string& data, uint32_t value) {
+    for (int i=0; i<4; i++) {
+        data.push_back(static_cast<char>((value >> (8*i)) & 0xff));
+    }
+}
+
+// Writes symbols, which must be sorted by start address, in the binary format
+std::string writeSymbolFile(const std::vector<std::tuple<std::string, uint32_t, uint32_t>>& symbols, bool with_index) {
+    std::string records, index, strings;
+    for (const auto& [name, start, end]: symbols) {
+        append32(records, start);
+        append32(records, end);
+        append32(records, strings.size());
+        append32(records, name.size());
+        strings += name;
+    }
+    if (with_index) {
+        // symbols don't overlap, so the last symbol of a subtree ends last
+        for (size_t record=0; record<symbols.size(); record++) {
+            size_t low = 0, high = symbols.size(), middle = (low + high) / 2;
+            while (middle != record) {
+                if (record < middle) {
+                    high = middle;
+                } else {
+                    low = middle + 1;
+                }
+                middle = (low + high) / 2;
+            }
+            append32(index, std::get<2>(symbols[high - 1]));
+        }
+    }
+    uint32_t records_offset = 32;
+    uint32_t index_offset = records_offset + records.size();
+    uint32_t strings_offset = index_offset + index.size();
+
+    std::string data = "FSYM";
+    append32(data, 1 | ((with_index ? 1 : 0) << 16));
+    append32(data, symbols.size());
+    append32(data, records_offset);
+    append32(data, with_index ? index_offset : 0);
+    append32(data, strings_offset);
+    append32(data, strings.size());
+    append32(data, 0);
+
+    std::string path = "test_symbols.sym";
+    std::ofstream file(path, std::ios::binary);
+    file << data << records << index << strings;
+    return path;
+}
+
+}
+
+TEST_CASE("Symbols from a binary symbol file", "[symbols]") {
+    for (bool with_index: {true, false}) {
+        auto path = writeSymbolFile({
+            {"dup", 0x10, 0x20},
+            {"outer", 0x20, 0x40},
+            {"swap", 0x40, 0x50},
+        }, with_index);
+        REQUIRE( SymbolFile::isSymbolFile(path) );
+
+        Symbols uut;
+        uut.loadFromFile(path);
+        uut.addSymbol("inner", 0x24, 0x28);
+
+        REQUIRE( uut.symbolsAtAddress(0x0f).empty() );
+        REQUIRE( std::vector<std::string>{"dup"} == uut.symbolsAtAddress(0x10) );
+        REQUIRE( std::vector<std::string>{"dup"} == uut.symbolsAtAddress(0x1f) );
+        REQUIRE( std::vector<std::string>{"outer", "inner"} == uut.symbolsAtAddress(0x24) );
+        REQUIRE( std::vector<std::string>{"swap"} == uut.symbolsAtAddress(0x4f) );
+        REQUIRE( uut.symbolsAtAddress(0x50).empty() );
+
+        REQUIRE( 0x40 == uut.symbolStart(uut.symbolByName("swap")) );
+        REQUIRE( 0x24 == uut.symbolStart(uut.symbolByName("inner")) );
+        REQUIRE( Symbols::NO_SYMBOL == uut.symbolByName("over") );
+
+        std::remove(path.c_str());
+    }
+}
+
+TEST_CASE("Symbols from a CSV symbol file", "[symbols]") {
+    std::string path = "test_symbols.sym";
+    {
+        std::ofstream file(path);
+        file << "\"dup\",16,32\n\"swap\",32,48\n";
+    }
+    REQUIRE_FALSE( SymbolFile::isSymbolFile(path) );
+
+    Symbols uut;
+    uut.loadFromFile(path);
+
+    REQUIRE( std::vector<std::string>{"dup"} == uut.symbolsAtAddress(0x10) );
+    REQUIRE( std::vector<std::string>{"swap"} == uut.symbolsAtAddress(0x20) );
+
+    std::remove(path.c_str());
+}
+
+TEST_CASE("Truncated binary symbol files are rejected", "[symbols]") {
+    std::string path = "test_symbols.sym";
+    {
+        std::ofstream file(path, std::ios::binary);
+        file << "FSYM";
+    }
+
+    SymbolFile uut;
+    REQUIRE_THROWS_AS( uut.open(path), std::runtime_error );
+
+    std::remove(path.c_str());
+}
+
+TEST_CASE("Nested symbols", "[symbols]") {
+    Symbols uut;
+    uut.addSymbol("next", 0x40, 0x50);
+    uut.addSymbol("outer", 0x10, 0x40);
+    uut.addSymbol("inner", 0x14, 0x18);
+
+    REQUIRE( std::vector<std::string>{"outer", "inner"} == uut.symbolsAtAddress(0x14) );
+    REQUIRE( std::vector<std::string>{"outer"} == uut.symbolsAtAddress(0x18) );
+    REQUIRE( "inner" == uut.symbolName(uut.symbolAtAddress(0x17)) );
+    REQUIRE( "outer" == uut.symbolName(uut.symbolAtAddress(0x3f)) );
+    REQUIRE( Symbols::NO_SYMBOL == uut.symbolAtAddress(0x50) );
+    REQUIRE( "" == uut.symbolName(Symbols::NO_SYMBOL) );
+}
+
+TEST_CASE("Looking up streams of addresses", "[symbols]") {
+    Symbols uut;
+    for (size_t word=0; word<10000; word++) {
+        uut.addSymbol("w" + std::to_string(word), word * 0x10, word * 0x10 + 0xc);
+    }
+    std::vector<uint32_t> addresses;
+    for (uint32_t address=0; address<0x30000; address+=3) {
+        addresses.push_back(address);
+        addresses.push_back(0x100);
+    }
+
+    auto symbols = uut.symbolsAtAddresses(addresses);
+
+    REQUIRE( symbols.size() == addresses.size() );
+    size_t mismatches = 0;
+    for (size_t i=0; i<addresses.size(); i++) {
+        auto address = addresses[i];
+        std::string expected;
+        if ((address < 10000 * 0x10) && ((address % 0x10) < 0xc)) {
+            expected = "w" + std::to_string(address / 0x10);
+        }
+        if (expected != uut.symbolName(symbols[i])) {
+            mismatches++;
+        }
+    }
+    REQUIRE( 0 == mismatches );
+}
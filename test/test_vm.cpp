@@ -2,12 +2,25 @@
 #include "vm.h"
 #include "vm_memory.h"
 #include "symbols.h"
+#include <cstdio>
+#include <cstring>
+#include <fstream>
+#include <iostream>
+#include <iterator>
+#include <sstream>
+#include <thread>
+#ifndef _WIN32
+#include <fcntl.h>
+#include <unistd.h>
+#endif
 
 CATCH_REGISTER_ENUM(Vm::Result,
     Vm::Result::Success,
     Vm::Result::Finished,
     Vm::Result::Error,
-    Vm::Result::IllegalInstruction
+    Vm::Result::IllegalInstruction,
+    Vm::Result::Breakpoint,
+    Vm::Result::Watchpoint
 )
 
 
@@ -29,6 +42,129 @@ TEST_CASE("Loading VM memory through iterator", "[memory]") {
     REQUIRE( uut[0x2] == 0x61 );
 }
 
+TEST_CASE("Copying memory blocks", "[memory]") {
+    Memory uut = {0x23, 0x53, 0x61, 0x00, 0x00, 0x00};
+
+    SECTION("Copying to a separate area") {
+        uut.copy(3, 0, 3);
+
+        REQUIRE( uut[0x3] == 0x23 );
+        REQUIRE( uut[0x4] == 0x53 );
+        REQUIRE( uut[0x5] == 0x61 );
+    }
+
+    SECTION("Copying to an overlapping higher area repeats the start") {
+        uut.copy(1, 0, 4);
+
+        REQUIRE( uut[0x1] == 0x23 );
+        REQUIRE( uut[0x2] == 0x23 );
+        REQUIRE( uut[0x3] == 0x23 );
+        REQUIRE( uut[0x4] == 0x23 );
+    }
+
+    SECTION("Copying to an overlapping lower area") {
+        uut.copy(0, 1, 2);
+
+        REQUIRE( uut[0x0] == 0x53 );
+        REQUIRE( uut[0x1] == 0x61 );
+        REQUIRE( uut[0x2] == 0x61 );
+    }
+
+    SECTION("Copying beyond the memory fails") {
+        REQUIRE_THROWS_AS( uut.copy(MEMORY_SIZE - 2, 0, 3), memory_access_error );
+        REQUIRE_THROWS_AS( uut.copy(0, MEMORY_SIZE - 2, 3), memory_access_error );
+        REQUIRE_THROWS_AS( uut.copy(0, 0xffffffff, 2), memory_access_error );
+    }
+}
+
+TEST_CASE("Filling memory blocks", "[memory]") {
+    Memory uut = {0x23, 0x53, 0x61, 0x72};
+
+    uut.fill(1, 0xaa, 2);
+
+    REQUIRE( uut[0x0] == 0x23 );
+    REQUIRE( uut[0x1] == 0xaa );
+    REQUIRE( uut[0x2] == 0xaa );
+    REQUIRE( uut[0x3] == 0x72 );
+    REQUIRE_THROWS_AS( uut.fill(MEMORY_SIZE - 1, 0, 2), memory_access_error );
+}
+
+TEST_CASE("Memory of a configured size", "[memory]") {
+    Memory uut(0x10000);
+
+    uut.put32(0xfffc, 0x12345678);
+
+    REQUIRE( 0x10000 == uut.size() );
+    REQUIRE( 0x12345678 == uut.get32(0xfffc) );
+    REQUIRE_THROWS_AS( uut.get32(0xfffd), memory_access_error );
+    REQUIRE_THROWS_AS( uut.put16(0xffff, 0), memory_access_error );
+    REQUIRE_THROWS_AS( uut[0x10000], memory_access_error );
+    REQUIRE_THROWS_AS( Memory(Memory::MAXIMUM_SIZE + 1), std::invalid_argument );
+}
+
+TEST_CASE("Sparse memory allocates touched pages only", "[memory]") {
+    Memory uut(Memory::MAXIMUM_SIZE, true);
+
+    REQUIRE( 0 == uut.residentSize() );
+    REQUIRE( 0 == uut.get32(0x80000000) );
+    REQUIRE( 0 == uut.allocatedPages() );
+
+    SECTION("Words across pages") {
+        uut.put32(0x80000ffe, 0x12345678);
+
+        REQUIRE( 2 == uut.allocatedPages() );
+        REQUIRE( 0x12345678 == uut.get32(0x80000ffe) );
+        REQUIRE( 0x5678 == uut.get16(0x80000ffe) );
+    }
+
+    SECTION("Words at the end of the address space") {
+        uut.put32(0xfffffffc, 0xcafe);
+
+        REQUIRE( 0xcafe == uut.get32(0xfffffffc) );
+        REQUIRE_THROWS_AS( uut.get32(0xfffffffd), memory_access_error );
+    }
+
+    SECTION("Copying and filling") {
+        uut.fill(0x10000ffc, 0xaa, 8);
+        uut.copy(0x20000000, 0x10000ffc, 8);
+
+        REQUIRE( 0xaaaaaaaa == uut.get32(0x20000004) );
+        REQUIRE( 0xaa == uut.get8(0x20000000) );
+    }
+
+    SECTION("Buffers across pages") {
+        const uint8_t text[] = "across";
+        uint8_t copied[sizeof(text)] = {};
+        uut.put(0x10000ffd, text, sizeof(text));
+        uut.get(0x10000ffd, copied, sizeof(copied));
+
+        REQUIRE( 2 == uut.allocatedPages() );
+        REQUIRE( std::string("across") == reinterpret_cast<const char*>(copied) );
+        REQUIRE_THROWS_AS( uut.get(0xfffffffd, copied, 4), memory_access_error );
+        REQUIRE_THROWS_AS( uut.put(0xfffffffd, text, 4), memory_access_error );
+    }
+}
+
+TEST_CASE("Loading an image into sparse memory", "[memory]") {
+    std::string path = "test_image.bin";
+    {
+        std::ofstream image(path, std::ios::binary);
+        image << std::string(0x1001, '\x2a');
+    }
+    Memory uut(0x100000, true);
+    uut.put32(0x1ffc, 0x12345678);
+
+    uut.loadImageFromFile(path);
+
+    // the image is resident, rounded up to whole pages
+    REQUIRE( 0x2000 == uut.residentSize() );
+    REQUIRE( 0 == uut.allocatedPages() );
+    REQUIRE( 0x2a2a2a2a == uut.get32(0xffc) );
+    REQUIRE( 0x2a == uut[0x1000] );
+    REQUIRE( 0x12345678 == uut.get32(0x1ffc) );
+    std::remove(path.c_str());
+}
+
 TEST_CASE("Illegal instructions return IllegalInstruction", "[opcode]") {
     Memory testdata = {
         0xfd            // just take come opcode that so far has no meaning ;-)
@@ -146,6 +282,144 @@ TEST_CASE("Register based move words instructions", "[opcode]") {
     REQUIRE( 0xd1201420 == testdata.get32(0x100) );
 }
 
+TEST_CASE("Register based move halfwords instructions", "[opcode]") {
+    Memory testdata = {
+        0x28, 0x14,     // mov.h %wp, %acc1
+        0x28, 0xd1,     // mov.h [%acc2], %wp
+        0x28, 0x4b,     // mov.h %acc1, [%dsp]
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    auto state = uut.getState();
+    state.registers[Vm::Acc1] = 0x12ab89dc;
+    state.registers[Vm::Acc2] = 0xff;
+    uut.setState(state);
+
+    // Register to register transfer only keeps the lower halfword
+    REQUIRE( Vm::Success == uut.singleStep() );
+    state = uut.getState();
+    REQUIRE( 0x89dc == state.registers[Vm::Wp] );
+
+    // Register to register indirect transfer only writes two bytes
+    testdata[0x101] = 0x77;
+    REQUIRE( Vm::Success == uut.singleStep() );
+    REQUIRE( 0x89dc == testdata.get16(0xff) );
+    REQUIRE( 0x77 == testdata[0x101] );
+
+    // Register indirect to register transfer
+    state = uut.getState();
+    state.registers[Vm::Dsp] = 0x2;
+    uut.setState(state);
+    REQUIRE( Vm::Success == uut.singleStep() );
+    state = uut.getState();
+    REQUIRE( 0xd128 == state.registers[Vm::Acc1] );
+}
+
+TEST_CASE("Byte sized register to register moves zero extend", "[opcode]") {
+    Memory testdata = {
+        0x21, 0x14,     // mov.b %wp, %acc1
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    auto state = uut.getState();
+    state.registers[Vm::Acc1] = 0x12ab89dc;
+    state.registers[Vm::Wp] = 0xffffffff;
+    uut.setState(state);
+
+    REQUIRE( Vm::Success == uut.singleStep() );
+    state = uut.getState();
+    REQUIRE( 0xdc == state.registers[Vm::Wp] );
+    REQUIRE( 0x12ab89dc == state.registers[Vm::Acc1] );
+}
+
+TEST_CASE("Halfword sized register to register moves zero extend", "[opcode]") {
+    Memory testdata = {
+        0x28, 0x14,     // mov.h %wp, %acc1
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    auto state = uut.getState();
+    state.registers[Vm::Acc1] = 0x12ab89dc;
+    state.registers[Vm::Wp] = 0xffffffff;
+    uut.setState(state);
+
+    REQUIRE( Vm::Success == uut.singleStep() );
+    state = uut.getState();
+    REQUIRE( 0x89dc == state.registers[Vm::Wp] );
+    REQUIRE( 0x12ab89dc == state.registers[Vm::Acc1] );
+}
+
+TEST_CASE("Stack based move halfword operations", "[opcode]") {
+    Memory testdata;
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    SECTION("Copy acc1 halfword to wp indirect with post increment") {
+        testdata = {
+            0x29, 0xc   // mov.h [%wp++], %acc1
+        };
+
+        Vm::State state = uut.getState();
+        state.registers[Vm::Wp] = 0x10;
+        state.registers[Vm::Acc1] = 0x561234;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep() );
+
+        state = uut.getState();
+        REQUIRE( 0x12 == state.registers[Vm::Wp] );
+        REQUIRE( 0x1234 == testdata.get32(0x10) );
+    }
+
+    SECTION("Fetch halfword thread cell with post increment") {
+        testdata = {
+            0x2a, 0x8,  // mov.h %wp, [%ip++]
+            0x34, 0x12, 0x78, 0x56
+        };
+
+        Vm::State state = uut.getState();
+        state.registers[Vm::Ip] = 0x2;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep() );
+
+        state = uut.getState();
+        REQUIRE( 0x4 == state.registers[Vm::Ip] );
+        REQUIRE( 0x1234 == state.registers[Vm::Wp] );
+    }
+
+    SECTION("Fetch halfword with pre decrement") {
+        testdata = {
+            0x2a, 0xcb, // mov.h %wp, [--%dsp]
+            0x34, 0x12, 0x78, 0x56
+        };
+
+        Vm::State state = uut.getState();
+        state.registers[Vm::Dsp] = 0x6;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep() );
+
+        state = uut.getState();
+        REQUIRE( 0x4 == state.registers[Vm::Dsp] );
+        REQUIRE( 0x5678 == state.registers[Vm::Wp] );
+    }
+}
+
 TEST_CASE("Stack based move operations", "[opcode]") {
     Memory testdata;
     Memory data_stack;
@@ -720,6 +994,143 @@ TEST_CASE("Register direct jumping based on carry flag", "[opcode]") {
     }
 }
 
+TEST_CASE("Short relative jumping", "[opcode]") {
+    Memory testdata = {
+        0x00,           // nop
+        0x74, 0x03,     // jmp +3
+        0x00,           // nop
+        0x00,           // nop
+        0x00,           // nop (forward jump target)
+        0x74, 0xfa,     // jmp -6
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    SECTION("Jumping forward") {
+        auto state = uut.getState();
+        state.registers[Vm::Pc] = 0x1;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 0x00000006 == state.registers[Vm::Pc] );
+    }
+
+    SECTION("Jumping backward") {
+        auto state = uut.getState();
+        state.registers[Vm::Pc] = 0x6;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 0x00000002 == state.registers[Vm::Pc] );
+    }
+}
+
+TEST_CASE("Short relative call", "[opcode]") {
+    Memory testdata = {
+        0x77, 0x03,     // call +3
+        0x00,           // nop
+        0x00,           // nop
+        0x00,           // nop
+        0x00,           // nop (call target)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    REQUIRE( Vm::Success == uut.singleStep());
+
+    Vm::State state = uut.getState();
+    REQUIRE( 0x00000005 == state.registers[Vm::Pc] );
+    REQUIRE( 0x00000002 == state.registers[Vm::Ret] );
+}
+
+TEST_CASE("Short relative jumping if accumulator is 0", "[opcode]") {
+    Memory testdata = {
+        0x75, 0x03,     // jz +3
+        0x00,           // nop
+        0x00,           // nop
+        0x00,           // nop
+        0x00,           // nop (jump target)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    SECTION("Should jump if acc1 is 0") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 0x0;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 0x00000005 == state.registers[Vm::Pc] );
+    }
+
+    SECTION("Should not jump if acc1 is != 0") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 0xff;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 0x00000002 == state.registers[Vm::Pc] );
+    }
+}
+
+TEST_CASE("Short relative jumping based on carry flag", "[opcode]") {
+    Memory testdata = {
+        0x32, 0x44, 0x5,    // sub %acc1, %acc1, %acc2
+        0x76, 0x02,         // jc +2
+        0x00,               // nop
+        0x00,               // nop
+        0x00,               // nop (jump target)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    SECTION("Should jump if carry is set") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 0x0;
+        state.registers[Vm::Acc2] = 0x10;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());  // sub
+        REQUIRE( Vm::Success == uut.singleStep());  // jc
+
+        state = uut.getState();
+        REQUIRE( 0x00000007 == state.registers[Vm::Pc] );
+    }
+
+    SECTION("Should not jump if carry is cleared") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 0x7f;
+        state.registers[Vm::Acc2] = 0x0;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());  // sub
+        REQUIRE( Vm::Success == uut.singleStep());  // jc
+
+        state = uut.getState();
+        REQUIRE( 0x00000005 == state.registers[Vm::Pc] );
+    }
+}
+
 TEST_CASE("Add instruction") {
     Memory testdata = {
         0x30, 0x01, 0x4,    // add.w %ip, %wp, %acc1
@@ -898,15 +1309,724 @@ TEST_CASE("Sll instruction") {
     REQUIRE( 0x2 == state.registers[Vm::Pc] );
 }
 
-TEST_CASE("Disassembling") {
+TEST_CASE("Mul instruction") {
     Memory testdata = {
-        0x00,               // nop
-        0xff,               // illegal
-        0xfe, 0x34, 0x12,   // ifkt 0x1234
-        0x60,               // jmp [%ip]
-        0x61,               // jmp [%wp]
-        0x64,               // jmp [%acc1]
-        0x65,               // jmp [%acc2]
+        0x40, 0x45, 0x6,    // mul.w %acc1, %acc2, %ret
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    SECTION("Small product only uses the low word") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 1234;
+        state.registers[Vm::Ret] = 4567;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 5635678 == state.registers[Vm::Acc1] );
+        REQUIRE( 0x0 == state.registers[Vm::Acc2] );
+        REQUIRE( 0x3 == state.registers[Vm::Pc] );
+    }
+
+    SECTION("Large product is unsigned and spreads over both words") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 0xffffffff;
+        state.registers[Vm::Ret] = 0xffffffff;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 0x00000001 == state.registers[Vm::Acc1] );
+        REQUIRE( 0xfffffffe == state.registers[Vm::Acc2] );
+    }
+}
+
+TEST_CASE("Divmod instruction") {
+    Memory testdata = {
+        0x42, 0x45, 0x6,    // divmod.w %acc1, %acc2, %ret
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    SECTION("Dividing a double word") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 0x00000005;
+        state.registers[Vm::Acc2] = 0x00000003;
+        state.registers[Vm::Ret] = 0x10;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 0x30000000 == state.registers[Vm::Acc1] );
+        REQUIRE( 0x5 == state.registers[Vm::Acc2] );
+        REQUIRE( 0x3 == state.registers[Vm::Pc] );
+    }
+
+    SECTION("Overflowing quotient sets both words") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 0x0;
+        state.registers[Vm::Acc2] = 0x10;
+        state.registers[Vm::Ret] = 0x10;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 0xffffffff == state.registers[Vm::Acc1] );
+        REQUIRE( 0xffffffff == state.registers[Vm::Acc2] );
+    }
+
+    SECTION("Dividing by zero sets both words") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 0x2a;
+        state.registers[Vm::Acc2] = 0x0;
+        state.registers[Vm::Ret] = 0x0;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+
+        state = uut.getState();
+        REQUIRE( 0xffffffff == state.registers[Vm::Acc1] );
+        REQUIRE( 0xffffffff == state.registers[Vm::Acc2] );
+    }
+}
+
+TEST_CASE("Block move instruction") {
+    Memory testdata = {
+        0x44, 0x45, 0x6,    // bmove %acc1, %acc2, %ret
+        0x00,
+        0x11, 0x22, 0x33,   // source
+        0x00, 0x00, 0x00,   // target
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    auto state = uut.getState();
+    state.registers[Vm::Acc1] = 7;
+    state.registers[Vm::Acc2] = 4;
+    state.registers[Vm::Ret] = 3;
+    uut.setState(state);
+
+    REQUIRE( Vm::Success == uut.singleStep());
+
+    state = uut.getState();
+    REQUIRE( 0x3 == state.registers[Vm::Pc] );
+    REQUIRE( 0x11 == testdata[7] );
+    REQUIRE( 0x22 == testdata[8] );
+    REQUIRE( 0x33 == testdata[9] );
+    REQUIRE( 7 == state.registers[Vm::Acc1] );
+    REQUIRE( 4 == state.registers[Vm::Acc2] );
+    REQUIRE( 3 == state.registers[Vm::Ret] );
+}
+
+TEST_CASE("Block fill instruction") {
+    Memory testdata = {
+        0x46, 0x15, 0x6,    // bfill %wp, %acc2, %ret
+        0x00, 0x00, 0x00, 0x00,
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    auto state = uut.getState();
+    state.registers[Vm::Wp] = 4;
+    state.registers[Vm::Acc2] = 0x1ab;
+    state.registers[Vm::Ret] = 2;
+    uut.setState(state);
+
+    REQUIRE( Vm::Success == uut.singleStep());
+
+    REQUIRE( 0x0 == testdata[3] );
+    REQUIRE( 0xab == testdata[4] );
+    REQUIRE( 0xab == testdata[5] );
+    REQUIRE( 0x0 == testdata[6] );
+}
+
+TEST_CASE("Writing a buffer through ifkt", "[ifkt]") {
+    Memory testdata = {
+        0xfe, 0x03, 0x00,   // ifkt 0x3 (write)
+        'H', 'e', 'l', 'l', 'o',
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    std::ostringstream output;
+    auto original_buffer = std::cout.rdbuf(output.rdbuf());
+
+    SECTION("Writing the whole buffer at once") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 3;
+        state.registers[Vm::Acc2] = 5;
+        uut.setState(state);
+
+        REQUIRE( Vm::Success == uut.singleStep());
+        REQUIRE( "Hello" == output.str() );
+    }
+
+    SECTION("Writing beyond the memory fails") {
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = MEMORY_SIZE - 2;
+        state.registers[Vm::Acc2] = 5;
+        uut.setState(state);
+
+        REQUIRE_THROWS_AS( uut.singleStep(), memory_access_error );
+    }
+
+    std::cout.rdbuf(original_buffer);
+}
+
+#ifndef _WIN32
+TEST_CASE("Headless console buffers the output until terminate", "[ifkt]") {
+    Memory testdata = {
+        0xfe, 0x01, 0x00,   // ifkt 0x1 (input)
+        0xfe, 0x03, 0x00,   // ifkt 0x3 (write)
+        0xfe, 0xf0, 0x00,   // ifkt 0xf0 (terminate)
+        'H', 'i',
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    int input_pipe[2];
+    int output_pipe[2];
+    REQUIRE( 0 == pipe(input_pipe) );
+    REQUIRE( 0 == pipe(output_pipe) );
+    REQUIRE( 1 == write(input_pipe[1], "x", 1) );
+    close(input_pipe[1]);
+
+    {
+        HeadlessConsole console{input_pipe[0], output_pipe[1]};
+        Vm uut{testdata, data_stack, return_stack, symbols};
+        uut.setConsole(console);
+
+        REQUIRE( Vm::Success == uut.singleStep() );
+        REQUIRE( 'x' == uut.getState().registers[Vm::Acc1] );
+
+        auto state = uut.getState();
+        state.registers[Vm::Acc1] = 9;
+        state.registers[Vm::Acc2] = 2;
+        uut.setState(state);
+        REQUIRE( Vm::Success == uut.singleStep() );
+
+        char output[8];
+        fcntl(output_pipe[0], F_SETFL, O_NONBLOCK);
+        REQUIRE( -1 == read(output_pipe[0], output, sizeof(output)) );
+
+        REQUIRE( Vm::Finished == uut.singleStep() );
+        REQUIRE( 3 == read(output_pipe[0], output, sizeof(output)) );
+        REQUIRE( "xHi" == std::string(output, 3) );
+
+        REQUIRE( Console::END_OF_INPUT == console.read() );
+    }
+
+    close(input_pipe[0]);
+    close(output_pipe[0]);
+    close(output_pipe[1]);
+}
+
+TEST_CASE("Headless console flushes the output while waiting for input", "[ifkt]") {
+    int input_pipe[2];
+    int output_pipe[2];
+    REQUIRE( 0 == pipe(input_pipe) );
+    REQUIRE( 0 == pipe(output_pipe) );
+
+    int input_flags = fcntl(input_pipe[0], F_GETFL);
+    {
+        HeadlessConsole console{input_pipe[0], output_pipe[1]};
+
+        std::thread typist([&]() {
+            // answers the prompt only once it was written
+            char prompt[2];
+            if (2 == read(output_pipe[0], prompt, sizeof(prompt))) {
+                write(input_pipe[1], prompt, sizeof(prompt));
+            }
+            close(input_pipe[1]);
+        });
+        console.write("ok", 2);
+        REQUIRE( 'o' == console.read() );
+        REQUIRE( 'k' == console.read() );
+        // the input is shared with std::cin, e.g. for the debugger
+        REQUIRE( input_flags == fcntl(input_pipe[0], F_GETFL) );
+        REQUIRE( Console::END_OF_INPUT == console.read() );
+        typist.join();
+    }
+
+    REQUIRE( input_flags == fcntl(input_pipe[0], F_GETFL) );
+
+    close(input_pipe[0]);
+    close(output_pipe[0]);
+    close(output_pipe[1]);
+}
+#endif
+
+TEST_CASE("Buffer console reads and writes strings", "[ifkt]") {
+    Memory testdata = {
+        0xfe, 0x01, 0x00,   // ifkt 0x1 (input)
+        0xfe, 0x03, 0x00,   // ifkt 0x3 (write)
+        0xfe, 0x01, 0x00,   // ifkt 0x1 (input)
+        'H', 'i',
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    BufferConsole console;
+    Vm uut{testdata, data_stack, return_stack, symbols};
+    uut.setConsole(console);
+
+    console.addInput("x");
+    REQUIRE( Vm::Success == uut.singleStep() );
+    REQUIRE( 'x' == uut.getState().registers[Vm::Acc1] );
+
+    auto state = uut.getState();
+    state.registers[Vm::Acc1] = 9;
+    state.registers[Vm::Acc2] = 2;
+    uut.setState(state);
+    REQUIRE( Vm::Success == uut.singleStep() );
+    REQUIRE( "xHi" == console.takeOutput() );
+    REQUIRE( "" == console.takeOutput() );
+
+    REQUIRE( Console::END_OF_INPUT == console.read() );
+    console.addInput("yz");
+    REQUIRE( 'y' == console.read() );
+    REQUIRE( 'z' == console.read() );
+}
+
+TEST_CASE("Reading and writing buffers across pages of sparse memory", "[ifkt]") {
+    std::vector<uint8_t> image = {
+        0xfe, 0x04, 0x00,   // ifkt 0x4 (read line)
+        0xfe, 0x03, 0x00,   // ifkt 0x3 (write)
+    };
+    Memory testdata(0x20000000, true);
+    testdata.loadImageFromIterator(image.begin(), image.end());
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    BufferConsole console;
+    Vm uut{testdata, data_stack, return_stack, symbols};
+    uut.setConsole(console);
+
+    auto state = uut.getState();
+    state.registers[Vm::Acc1] = 0x10000ffe;
+    state.registers[Vm::Acc2] = 80;
+    uut.setState(state);
+    console.addInput("hello\n");
+
+    REQUIRE( Vm::Success == uut.singleStep() );
+    REQUIRE( 5 == uut.getState().registers[Vm::Acc2] );
+    REQUIRE( 'l' == testdata.get8(0x10001001) );
+    REQUIRE( Vm::Success == uut.singleStep() );
+    REQUIRE( "hellohello" == console.takeOutput() );
+}
+
+namespace {
+
+void require_interpreting_like_single_stepping(Memory &testdata) {
+    Memory expected_memory = testdata;
+    Memory data_stack;
+    Memory return_stack;
+    Memory expected_data_stack;
+    Memory expected_return_stack;
+    Symbols symbols;
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+    Vm reference{expected_memory, expected_data_stack, expected_return_stack, symbols};
+
+    Vm::Result expected_result;
+    do {
+        expected_result = reference.singleStep();
+    } while (Vm::Success == expected_result);
+
+    REQUIRE( Vm::Finished == expected_result );
+    REQUIRE( Vm::Finished == uut.interpret(false) );
+    REQUIRE( reference.getState().registers == uut.getState().registers );
+    REQUIRE( reference.getState().carry == uut.getState().carry );
+    REQUIRE( 0 == std::memcmp(expected_memory.data(), testdata.data(), testdata.residentSize()) );
+    REQUIRE( 0 == std::memcmp(expected_data_stack.data(), data_stack.data(), MEMORY_SIZE) );
+    REQUIRE( 0 == std::memcmp(expected_return_stack.data(), return_stack.data(), MEMORY_SIZE) );
+}
+
+}
+
+TEST_CASE("Interpreting runs instructions like single stepping", "[interpret]") {
+    Memory testdata = {
+        0x26, 0x00, 0x10, 0x00, 0x00,   // 0x00: mov %acc1, 0x1000
+        0x27, 0x01, 0x00, 0x00, 0x80,   // 0x05: mov %acc2, 0x80000001
+        0x30, 0x64, 0x05,   // 0x0a: add %ret, %acc1, %acc2
+        0x32, 0x14, 0x05,   // 0x0d: sub %wp, %acc1, %acc2
+        0x76, 0x00,         // 0x10: jc.s +0
+        0x34, 0x11, 0x06,   // 0x12: or %wp, %wp, %ret
+        0x36, 0x11, 0x05,   // 0x15: and %wp, %wp, %acc2
+        0x38, 0x11, 0x04,   // 0x18: xor %wp, %wp, %acc1
+        0x3c, 0xa4,         // 0x1b: sra %acc2, 4
+        0x3e, 0xc3,         // 0x1d: sll %ret, 3
+        0x40, 0x41, 0x05,   // 0x1f: mul %acc1, %wp, %acc2
+        0x26, 0x00, 0x01, 0x00, 0x00,   // 0x22: mov %acc1, 0x100
+        0x22, 0x26,         // 0x27: mov [%acc1++], %ret
+        0x23, 0xe1,         // 0x29: mov.b [--%acc1], %wp
+        0x20, 0x1c,         // 0x2b: mov %wp, [%acc1]
+        0x21, 0xc6,         // 0x2d: mov.b [%acc1], %ret
+        0x24, 0x0c,         // 0x2f: mov %wp, [%acc1++]
+        0x25, 0x34,         // 0x31: mov.b %ret, [%acc1++]
+        0xa1, 0xb4,         // 0x33: pushd %wp, pushr %acc1
+        0xad, 0xb8,         // 0x35: popd %acc2, popr %ip
+        0x77, 0x03,         // 0x37: call.s +3
+        0xff, 0xff, 0xff,   // 0x39
+        0x70, 0x44, 0x00, 0x00, 0x00,   // 0x3c: jmp 0x44
+        0xff, 0xff, 0xff,   // 0x41
+        0x73, 0x4b, 0x00, 0x00, 0x00,   // 0x44: call 0x4b
+        0xff, 0xff,         // 0x49
+        0x26, 0x00, 0x00, 0x00, 0x00,   // 0x4b: mov %acc1, 0
+        0x71, 0x57, 0x00, 0x00, 0x00,   // 0x50: jz 0x57
+        0xff, 0xff,         // 0x55
+        0x75, 0x01,         // 0x57: jz.s +1
+        0xff,               // 0x59
+        0x27, 0x60, 0x00, 0x00, 0x00,   // 0x5a: mov %acc2, 0x60
+        0x65,               // 0x5f: jmp [%acc2]
+        0xfc, 0x7f, 0x00, 0x00,         // 0x60: .word 0x7ffc
+    };
+    // the last instructions are at the end of the memory
+    testdata[0x7ffc] = 0x00;    // nop
+    testdata[0x7ffd] = 0xfe;    // ifkt 0xf0 (terminate)
+    testdata[0x7ffe] = 0xf0;
+    testdata[0x7fff] = 0x00;
+
+    require_interpreting_like_single_stepping(testdata);
+}
+
+TEST_CASE("Interpreting threaded code like single stepping", "[interpret]") {
+    Memory testdata = {
+        0x27, 0x10, 0x00, 0x00, 0x00,   // 0x00: mov %acc2, 0x10
+        0x20, 0x05,         // 0x05: mov %ip, %acc2
+        0x24, 0x08, 0x69,   // 0x07: mov.t %wp, [%ip++]; jmp %wp
+        0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+        0x18, 0x00, 0x00, 0x00,         // 0x10: .word 0x18
+        0x1b, 0x00, 0x00, 0x00,         // 0x14: .word 0x1b
+        0x24, 0x08, 0x69,   // 0x18: mov.t %wp, [%ip++]; jmp %wp
+        0xfe, 0xf0, 0x00,   // 0x1b: ifkt 0xf0 (terminate)
+    };
+
+    require_interpreting_like_single_stepping(testdata);
+}
+
+TEST_CASE("Interpreting narrow register moves like single stepping", "[interpret]") {
+    Memory testdata = {
+        0x26, 0xdc, 0x89, 0xab, 0x12,   // 0x00: mov %acc1, 0x12ab89dc
+        0x21, 0x14,         // 0x05: mov.b %wp, %acc1
+        0x28, 0x64,         // 0x07: mov.h %ret, %acc1
+        0xfe, 0xf0, 0x00,   // 0x09: ifkt 0xf0 (terminate)
+    };
+
+    require_interpreting_like_single_stepping(testdata);
+}
+
+TEST_CASE("Interpreting a limited number of instructions", "[interpret]") {
+    Memory testdata = {
+        0x27, 0x10, 0x00, 0x00, 0x00,   // 0x00: mov %acc2, 0x10
+        0x20, 0x05,         // 0x05: mov %ip, %acc2
+        0x24, 0x08, 0x69,   // 0x07: mov.t %wp, [%ip++]; jmp %wp
+        0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+        0x18, 0x00, 0x00, 0x00,         // 0x10: .word 0x18
+        0x1b, 0x00, 0x00, 0x00,         // 0x14: .word 0x1b
+        0x24, 0x08, 0x69,   // 0x18: mov.t %wp, [%ip++]; jmp %wp
+        0xfe, 0xf0, 0x00,   // 0x1b: ifkt 0xf0 (terminate)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+
+    // every step of NEXT counts, also when both run as one
+    for (uint64_t limit=1; limit<=6; limit++) {
+        Memory stepped_memory = testdata;
+        Memory interpreted_memory = testdata;
+        Vm reference{stepped_memory, data_stack, return_stack, symbols};
+        Vm uut{interpreted_memory, data_stack, return_stack, symbols};
+        for (uint64_t step=0; step<limit; step++) {
+            REQUIRE( Vm::Success == reference.singleStep() );
+        }
+
+        REQUIRE( Vm::Success == uut.interpret(false, limit) );
+        REQUIRE( limit == uut.stepsRun() );
+        REQUIRE( reference.getState().registers == uut.getState().registers );
+    }
+
+    Vm uut{testdata, data_stack, return_stack, symbols};
+    REQUIRE( Vm::Finished == uut.interpret(false, 100) );
+    REQUIRE( 7 == uut.stepsRun() );
+}
+
+TEST_CASE("Interpreting code beyond the resident memory", "[interpret]") {
+    Memory testdata(0x100000, true);
+    const uint8_t code[] = {
+        0x26, 0x00, 0x00, 0x01, 0x00,   // 0x00: mov %acc1, 0x10000
+        0x27, 0x2a, 0x00, 0x00, 0x00,   // 0x05: mov %acc2, 0x2a
+        0x20, 0xc5,         // 0x0a: mov [%acc1], %acc2
+        0x26, 0x04, 0x00, 0x01, 0x00,   // 0x0c: mov %acc1, 0x10004
+        0x6c,               // 0x11: jmp %acc1
+    };
+    testdata.loadImageFromIterator(std::begin(code), std::end(code));
+    testdata[0x10004] = 0xfe;   // ifkt 0xf0 (terminate)
+    testdata[0x10005] = 0xf0;
+    testdata[0x10006] = 0x00;
+
+    REQUIRE( Memory::PAGE_SIZE == testdata.residentSize() );
+    require_interpreting_like_single_stepping(testdata);
+    REQUIRE( 0x2a == testdata.get32(0x10000) );
+}
+
+TEST_CASE("Interpreting reports memory access errors like single stepping", "[interpret]") {
+    Memory testdata = {
+        0x26, 0xfe, 0x7f, 0x00, 0x00,   // mov %acc1, 0x7ffe
+        0x20, 0x1c,         // mov %wp, [%acc1]
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    Vm uut{testdata, data_stack, return_stack, symbols};
+
+    REQUIRE_THROWS_AS( uut.interpret(false), memory_access_error );
+    REQUIRE( 0x7 == uut.getState().registers[Vm::Pc] );
+    REQUIRE( 0x7ffe == uut.getState().registers[Vm::Acc1] );
+}
+
+TEST_CASE("Breakpoints and watched ranges", "[breakpoints]") {
+    Breakpoints uut;
+    REQUIRE( uut.empty() );
+
+    uut.add(0x10);
+    uut.add(0xfffffffe);
+    REQUIRE( uut.isBreakpoint(0x10) );
+    REQUIRE( uut.isBreakpoint(0xfffffffe) );
+    REQUIRE_FALSE( uut.isBreakpoint(0x11) );
+    REQUIRE_FALSE( uut.isBreakpoint(0x1010) );
+
+    REQUIRE( uut.remove(0x10) );
+    REQUIRE_FALSE( uut.remove(0x10) );
+    REQUIRE_FALSE( uut.isBreakpoint(0x10) );
+    REQUIRE( uut.isBreakpoint(0xfffffffe) );
+
+    uut.watch(0x1ffe, 4);
+    REQUIRE( uut.isWatched(0x1ffc, 4) );
+    REQUIRE( uut.isWatched(0x2001, 1) );
+    REQUIRE_FALSE( uut.isWatched(0x1ff8, 4) );
+    REQUIRE_FALSE( uut.isWatched(0x2002, 4) );
+    REQUIRE_THROWS_AS( uut.watch(0xfffffffe, 4), std::invalid_argument );
+
+    REQUIRE( uut.unwatch(0x1ffe) );
+    REQUIRE_FALSE( uut.isWatched(0x1ffc, 4) );
+    REQUIRE( uut.watchpoints().empty() );
+}
+
+TEST_CASE("Interpreting up to breakpoints and watchpoints", "[breakpoints]") {
+    Memory testdata = {
+        0x26, 0x03, 0x00, 0x00, 0x00,   // 0x00: mov %acc1, 3
+        0x27, 0x01, 0x00, 0x00, 0x00,   // 0x05: mov %acc2, 1
+        0x32, 0x44, 0x05,   // 0x0a: sub %acc1, %acc1, %acc2
+        0x27, 0x00, 0x01, 0x00, 0x00,   // 0x0d: mov %acc2, 0x100
+        0x22, 0x2c,         // 0x12: mov [%acc2++], %acc1
+        0x27, 0x01, 0x00, 0x00, 0x00,   // 0x14: mov %acc2, 1
+        0x75, 0x02,         // 0x19: jz.s +2
+        0x74, 0xed,         // 0x1b: jmp.s 0x0a
+        0xfe, 0xf0, 0x00,   // 0x1d: ifkt 0xf0 (terminate)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    Breakpoints breakpoints;
+    Vm uut{testdata, data_stack, return_stack, symbols};
+    uut.setBreakpoints(breakpoints);
+
+    SECTION("Stopping at breakpoints") {
+        breakpoints.add(0x19);
+
+        REQUIRE( Vm::Breakpoint == uut.interpret(false) );
+        REQUIRE( 0x19 == uut.getState().registers[Vm::Pc] );
+        REQUIRE( 2 == uut.getState().registers[Vm::Acc1] );
+
+        // continues with the instruction at the breakpoint
+        REQUIRE( Vm::Breakpoint == uut.interpret(false) );
+        REQUIRE( 0x19 == uut.getState().registers[Vm::Pc] );
+        REQUIRE( 1 == uut.getState().registers[Vm::Acc1] );
+
+        breakpoints.remove(0x19);
+        REQUIRE( Vm::Finished == uut.interpret(false) );
+        REQUIRE( 0 == uut.getState().registers[Vm::Acc1] );
+    }
+
+    SECTION("Stopping after changes of watched memory") {
+        breakpoints.watch(0x100, 1);
+
+        REQUIRE( Vm::Watchpoint == uut.interpret(false) );
+        REQUIRE( 0x14 == uut.getState().registers[Vm::Pc] );
+        REQUIRE( 2 == testdata[0x100] );
+        REQUIRE( Vm::Watchpoint == uut.interpret(false) );
+        REQUIRE( 1 == testdata[0x100] );
+
+        // writing the same value again is no change
+        breakpoints.unwatch(0x100);
+        breakpoints.watch(0x101, 3);
+        REQUIRE( Vm::Finished == uut.interpret(false) );
+    }
+}
+
+TEST_CASE("Breakpoints within NEXT", "[breakpoints]") {
+    Memory testdata = {
+        0x27, 0x10, 0x00, 0x00, 0x00,   // 0x00: mov %acc2, 0x10
+        0x20, 0x05,         // 0x05: mov %ip, %acc2
+        0x24, 0x08, 0x69,   // 0x07: mov.t %wp, [%ip++]; jmp %wp
+        0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+        0x18, 0x00, 0x00, 0x00,         // 0x10: .word 0x18
+        0x1b, 0x00, 0x00, 0x00,         // 0x14: .word 0x1b
+        0x24, 0x08, 0x69,   // 0x18: mov.t %wp, [%ip++]; jmp %wp
+        0xfe, 0xf0, 0x00,   // 0x1b: ifkt 0xf0 (terminate)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    Breakpoints breakpoints;
+    Vm uut{testdata, data_stack, return_stack, symbols};
+    uut.setBreakpoints(breakpoints);
+    breakpoints.add(0x1a);
+
+    REQUIRE( Vm::Breakpoint == uut.interpret(false) );
+    REQUIRE( 0x1a == uut.getState().registers[Vm::Pc] );
+    REQUIRE( 0x1b == uut.getState().registers[Vm::Wp] );
+    REQUIRE( Vm::Finished == uut.interpret(false) );
+}
+
+TEST_CASE("Watching memory changed by instructions without fast handler", "[breakpoints]") {
+    Memory testdata = {
+        0x27, 0x00, 0x02, 0x00, 0x00,   // 0x00: mov %acc2, 0x200
+        0x20, 0x15,         // 0x05: mov %wp, %acc2
+        0x27, 0x2a, 0x00, 0x00, 0x00,   // 0x07: mov %acc2, 0x2a
+        0x26, 0x02, 0x00, 0x00, 0x00,   // 0x0c: mov %acc1, 2
+        0x20, 0x64,         // 0x11: mov %ret, %acc1
+        0x46, 0x15, 0x06,   // 0x13: bfill %wp, %acc2, %ret
+        0xfe, 0xf0, 0x00,   // 0x16: ifkt 0xf0 (terminate)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    Breakpoints breakpoints;
+    Vm uut{testdata, data_stack, return_stack, symbols};
+    uut.setBreakpoints(breakpoints);
+    breakpoints.watch(0x201, 1);
+
+    REQUIRE( Vm::Watchpoint == uut.interpret(false) );
+    REQUIRE( 0x16 == uut.getState().registers[Vm::Pc] );
+    REQUIRE( 0x2a == testdata[0x201] );
+    REQUIRE( Vm::Finished == uut.interpret(false) );
+}
+
+TEST_CASE("Binary trace of interpreted instructions", "[trace]") {
+    Memory testdata = {
+        0x00,               // nop
+        0x26, 0x11, 0x00, 0x00, 0x00,   // mov %acc1, 0x11
+        0x00,               // nop
+        0xfe, 0xf0, 0x00,   // ifkt 0xf0 (terminate)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    std::string path = "test_trace.trc";
+
+    {
+        TraceFile trace;
+        trace.open(path, 3);
+        Vm uut{testdata, data_stack, return_stack, symbols};
+        uut.setTraceFile(trace);
+
+        REQUIRE( Vm::Finished == uut.interpret(false) );
+        REQUIRE( 4 == trace.recordsWritten() );
+    }
+
+    std::ifstream file(path, std::ios::binary);
+    std::vector<char> data{std::istreambuf_iterator<char>(file), std::istreambuf_iterator<char>()};
+    REQUIRE( 32 + 3 * sizeof(TraceFile::Record) == data.size() );
+    REQUIRE( "FTRC" == std::string(data.data(), 4) );
+
+    uint64_t total;
+    std::memcpy(&total, data.data() + 16, sizeof(total));
+    REQUIRE( 4 == total );
+
+    // the fourth record overwrote the first one
+    TraceFile::Record records[3];
+    std::memcpy(records, data.data() + 32, sizeof(records));
+    REQUIRE( 0x7 == records[0].pc );
+    REQUIRE( 0xfe == records[0].opcode );
+    REQUIRE( 0x1 == records[1].pc );
+    REQUIRE( 0x26 == records[1].opcode );
+    REQUIRE( 0x6 == records[2].pc );
+    REQUIRE( 0x11 == records[2].acc1 );
+
+    file.close();
+    std::remove(path.c_str());
+}
+
+TEST_CASE("Profiling words and call paths", "[profile]") {
+    Profiler uut;
+    std::array<uint32_t, 8> registers{};
+    auto run = [&](uint8_t opcode, uint32_t wp, uint32_t rsp) {
+        registers[Vm::Wp] = wp;
+        registers[Vm::Rsp] = rsp;
+        uut.count(opcode, registers);
+    };
+
+    run(0x69, 0x100, 0);    // NEXT dispatches to colon word at 0x100
+    run(0x73, 0x100, 0);    // call :dolist_cfa
+    run(0xb0, 0x100, 4);    // pushr %ip in doLIST
+    run(0x69, 0x200, 4);    // NEXT dispatches to code word at 0x200
+    run(0x00, 0x200, 4);
+    run(0x69, 0x300, 4);    // NEXT dispatches to EXIT
+    run(0xb8, 0x300, 0);    // popr %ip in EXIT
+    run(0x69, 0x200, 0);    // NEXT dispatches to code word at 0x200 again
+
+    const auto& nodes = uut.callTree();
+    REQUIRE( 5 == nodes.size() );
+    // 0x100
+    REQUIRE( 0 == nodes[1].parent );
+    REQUIRE( 0x100 == nodes[1].cfa );
+    REQUIRE( 3 == nodes[1].instructions );
+    REQUIRE( 1 == nodes[1].dispatches );
+    // 0x100 -> 0x200
+    REQUIRE( 1 == nodes[2].parent );
+    REQUIRE( 0x200 == nodes[2].cfa );
+    REQUIRE( 2 == nodes[2].instructions );
+    // 0x100 -> 0x300
+    REQUIRE( 1 == nodes[3].parent );
+    REQUIRE( 2 == nodes[3].instructions );
+    // 0x200 after returning from 0x100
+    REQUIRE( 0 == nodes[4].parent );
+    REQUIRE( 0x200 == nodes[4].cfa );
+    REQUIRE( 1 == nodes[4].dispatches );
+}
+
+TEST_CASE("Disassembling") {
+    Memory testdata = {
+        0x00,               // nop
+        0xff,               // illegal
+        0xfe, 0x34, 0x12,   // ifkt 0x1234
+        0x60,               // jmp [%ip]
+        0x61,               // jmp [%wp]
+        0x64,               // jmp [%acc1]
+        0x65,               // jmp [%acc2]
         0x70, 0x07, 0x00, 0x00, 0x00,   // jmp 0x7
         0x26, 0x10, 0x41, 0x32, 0x22,   // mov %acc1, 0x22324110
         0x20, 0x14,         // mov.w %wp, %acc1
@@ -925,7 +2045,9 @@ TEST_CASE("Disassembling") {
         0x30, 0x01, 0x4,    // add.w %ip, %wp, %acc1
         0x32, 0x01, 0x4,    // sub.w %ip, %wp, %acc1
         0x38, 0x01, 0x4,    // xor.w %ip, %wp, %acc1
-        0x3c, 0x65          // sra.w %dsp, #5
+        0x3c, 0x65,         // sra.w %dsp, #5
+        0x28, 0x14,         // mov.h %wp, %acc1
+        0x2a, 0x8,          // mov.h %wp, [%ip++]
     };
     Memory data_stack;
     Memory return_stack;
@@ -1093,6 +2215,16 @@ TEST_CASE("Disassembling") {
         uut.setState(state);
         REQUIRE( "sra.w %dsp, 0x5" == uut.disassembleAtPc() );
     }
+
+    SECTION("Disassembling halfword moves") {
+        state.registers[Vm::Pc] = 59;
+        uut.setState(state);
+        REQUIRE( "mov.h %wp, %acc1" == uut.disassembleAtPc() );
+
+        state.registers[Vm::Pc] = 61;
+        uut.setState(state);
+        REQUIRE( "mov.h %wp, [%ip++]" == uut.disassembleAtPc() );
+    }
 }
 
 TEST_CASE("Detailed disassembly", "[disassembly]") {
@@ -1119,6 +2251,42 @@ TEST_CASE("Detailed disassembly", "[disassembly]") {
         REQUIRE( "and.w %ip, %wp, %acc1" == uut.disassembleAtPc() );
     }
 
+    SECTION("Mul") {
+        testdata = {
+            0x40, 0x45, 0x6,    // mul.w %acc1, %acc2, %ret
+        };
+        Vm uut{testdata, data_stack, return_stack, symbols};
+
+        REQUIRE( "mul.w %acc1, %acc2, %ret" == uut.disassembleAtPc() );
+    }
+
+    SECTION("Divmod") {
+        testdata = {
+            0x42, 0x16, 0x3,    // divmod.w %wp, %ret, %dsp
+        };
+        Vm uut{testdata, data_stack, return_stack, symbols};
+
+        REQUIRE( "divmod.w %wp, %ret, %dsp" == uut.disassembleAtPc() );
+    }
+
+    SECTION("Block move") {
+        testdata = {
+            0x44, 0x45, 0x6,    // bmove %acc1, %acc2, %ret
+        };
+        Vm uut{testdata, data_stack, return_stack, symbols};
+
+        REQUIRE( "bmove %acc1, %acc2, %ret" == uut.disassembleAtPc() );
+    }
+
+    SECTION("Block fill") {
+        testdata = {
+            0x46, 0x15, 0x6,    // bfill %wp, %acc2, %ret
+        };
+        Vm uut{testdata, data_stack, return_stack, symbols};
+
+        REQUIRE( "bfill %wp, %acc2, %ret" == uut.disassembleAtPc() );
+    }
+
     SECTION("Call direct, call") {
         testdata = {
             0x73, 0x15, 0x00, 0x00, 0x00,   // call 0x15
@@ -1137,6 +2305,31 @@ TEST_CASE("Detailed disassembly", "[disassembly]") {
         REQUIRE( "jc 0x15" == uut.disassembleAtPc() );
     }
 
+    SECTION("Short jumps and calls show their target address") {
+        testdata = {
+            0x00,           // nop
+            0x74, 0x10,     // jmp 0x13
+            0x75, 0xfb,     // jz 0x0
+            0x76, 0x00,     // jc 0x7
+            0x77, 0x7f,     // call 0x88
+        };
+        Vm uut{testdata, data_stack, return_stack, symbols};
+        auto state = uut.getState();
+
+        state.registers[Vm::Pc] = 1;
+        uut.setState(state);
+        REQUIRE( "jmp 0x13" == uut.disassembleAtPc() );
+        state.registers[Vm::Pc] = 3;
+        uut.setState(state);
+        REQUIRE( "jz 0x0" == uut.disassembleAtPc() );
+        state.registers[Vm::Pc] = 5;
+        uut.setState(state);
+        REQUIRE( "jc 0x7" == uut.disassembleAtPc() );
+        state.registers[Vm::Pc] = 7;
+        uut.setState(state);
+        REQUIRE( "call 0x88" == uut.disassembleAtPc() );
+    }
+
     SECTION("Disassembling jmp rsp indirect") {
         testdata = {
             0x62   // jmp [%rsp]
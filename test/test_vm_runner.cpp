@@ -0,0 +1,129 @@
+#include <catch2/catch_test_macros.hpp>
+#include "vm_runner.h"
+#include <chrono>
+#include <thread>
+
+namespace {
+
+// Polls the snapshots until the condition holds or a few seconds passed
+template <typename Condition>
+VmRunner::Snapshot wait_for(const VmRunner &runner, const Condition &condition) {
+    auto timeout = std::chrono::steady_clock::now() + std::chrono::seconds(5);
+    auto snapshot = runner.snapshot();
+    while (!condition(snapshot) && (std::chrono::steady_clock::now() < timeout)) {
+        std::this_thread::sleep_for(std::chrono::milliseconds(1));
+        snapshot = runner.snapshot();
+    }
+    return snapshot;
+}
+
+bool is_paused(const VmRunner::Snapshot &snapshot) {
+    return snapshot.mode == VmRunner::Mode::Paused;
+}
+
+bool is_finished(const VmRunner::Snapshot &snapshot) {
+    return snapshot.mode == VmRunner::Mode::Finished;
+}
+
+}
+
+TEST_CASE("Running the VM on a worker thread", "[runner]") {
+    Memory testdata = {
+        0x26, 0x00, 0x00, 0x01, 0x00,   // 0x00: mov %acc1, 0x10000
+        0x27, 0x01, 0x00, 0x00, 0x00,   // 0x05: mov %acc2, 1
+        0xa4,               // 0x0a: pushd %acc1
+        0x32, 0x44, 0x05,   // 0x0b: sub %acc1, %acc1, %acc2
+        0x75, 0x02,         // 0x0e: jz.s +2
+        0x74, 0xf9,         // 0x10: jmp.s 0x0b
+        0xfe, 0xf0, 0x00,   // 0x12: ifkt 0xf0 (terminate)
+    };
+    Memory data_stack;
+    Memory return_stack;
+    Symbols symbols;
+    Vm vm{testdata, data_stack, return_stack, symbols};
+    VmRunner uut{vm, testdata, data_stack, return_stack};
+
+    SECTION("Running until the end") {
+        uut.run(false);
+        auto snapshot = wait_for(uut, is_finished);
+
+        REQUIRE( VmRunner::Mode::Finished == snapshot.mode );
+        REQUIRE( Vm::Finished == snapshot.result );
+        REQUIRE( 3 + 3 * 0x10000 == snapshot.instructions );
+        REQUIRE( 1 == snapshot.data_stack.size() );
+        REQUIRE( 0x10000 == snapshot.data_stack[0] );
+    }
+
+    SECTION("Single steps") {
+        uut.step();
+        uut.step();
+        auto snapshot = wait_for(uut, [](const VmRunner::Snapshot &snapshot) {
+            return snapshot.instructions == 2;
+        });
+
+        REQUIRE( VmRunner::Mode::Paused == snapshot.mode );
+        REQUIRE( 0x0a == snapshot.state.registers[Vm::Pc] );
+        REQUIRE( "pushd %acc1" == snapshot.next_instruction );
+    }
+
+    SECTION("Running to breakpoints") {
+        uut.toggleBreakpoint(0x0e);
+        uut.run(true);
+        auto snapshot = wait_for(uut, [](const VmRunner::Snapshot &snapshot) {
+            return is_paused(snapshot) && (snapshot.instructions > 0);
+        });
+
+        REQUIRE( 0x0e == snapshot.state.registers[Vm::Pc] );
+        REQUIRE( 0xffff == snapshot.state.registers[Vm::Acc1] );
+
+        // continues from the breakpoint up to its next hit
+        uut.run(true);
+        snapshot = wait_for(uut, [](const VmRunner::Snapshot &snapshot) {
+            return is_paused(snapshot) && (snapshot.state.registers[Vm::Acc1] == 0xfffe);
+        });
+        REQUIRE( 0x0e == snapshot.state.registers[Vm::Pc] );
+
+        // runs through breakpoints without stopping at them
+        uut.run(false);
+        REQUIRE( VmRunner::Mode::Finished == wait_for(uut, is_finished).mode );
+    }
+
+    SECTION("Pausing and changing the memory") {
+        uut.whilePaused([&] {
+            testdata[0x0f] = 0x00;  // jz.s +0, never ending
+        });
+        uut.run(false);
+        wait_for(uut, [](const VmRunner::Snapshot &snapshot) {
+            return snapshot.instructions > 0x20000;
+        });
+        uut.pause();
+        auto snapshot = wait_for(uut, is_paused);
+
+        REQUIRE( VmRunner::Mode::Paused == snapshot.mode );
+        REQUIRE( snapshot.instructions > 0x20000 );
+        REQUIRE( Vm::Success == snapshot.result );
+    }
+
+    SECTION("Reporting the speed while running") {
+        uut.whilePaused([&] {
+            testdata[0x0f] = 0x00;  // jz.s +0, never ending
+        });
+        uut.run(false);
+        auto snapshot = wait_for(uut, [](const VmRunner::Snapshot &snapshot) {
+            return snapshot.instructions_per_second > 0.0;
+        });
+        uut.pause();
+
+        // batches run through interpret, far more than single steps
+        REQUIRE( snapshot.instructions >= VmRunner::BATCH_SIZE );
+        REQUIRE( snapshot.instructions_per_second > 0.0 );
+    }
+
+    SECTION("Memory windows") {
+        uut.setMemoryWindow(0x10, 4);
+        auto snapshot = uut.snapshot();
+
+        REQUIRE( 0x10 == snapshot.memory_start );
+        REQUIRE( std::vector<uint8_t>{0x74, 0xf9, 0xfe, 0xf0} == snapshot.memory );
+    }
+}